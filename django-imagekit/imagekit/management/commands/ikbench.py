@@ -0,0 +1,120 @@
+import os
+import random
+import resource
+import shutil
+import tempfile
+import time
+from multiprocessing import Process, Queue
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from imagekit.lib import Image
+from imagekit.management.commands.ikregen import get_model, get_specs
+from imagekit.utils import img_to_fobj
+
+# (name, size) of the photos generated when none are given: a 12-megapixel
+# camera shot both ways up, a typical web-sized upload and a small one
+FIXTURES = (
+    ('camera-landscape', (4000, 3000)),
+    ('camera-portrait', (3000, 4000)),
+    ('web', (1600, 1200)),
+    ('small', (640, 480)),
+)
+
+
+class Command(BaseCommand):
+    help = ('Times rendering each spec of an ImageKit model, decoding the '
+            'original in full and at reduced scale.')
+    args = 'app_label.Model [photo ...]'
+    requires_model_validation = True
+    can_import_settings = True
+
+    option_list = BaseCommand.option_list + (
+        make_option('--spec', action='append', dest='specs', default=[],
+            help='Only benchmark this spec; may be given more than once.'),
+        make_option('--runs', type='int', dest='runs', default=3,
+            help='How many times to render each spec; the best is reported.'),
+    )
+
+    def handle(self, label=None, *photos, **options):
+        if label is None:
+            raise CommandError('Please specify a model.')
+        model = get_model(label)
+        specs = get_specs(model, options['specs'])
+
+        tmpdir = None
+        if not photos:
+            tmpdir = tempfile.mkdtemp()
+            photos = make_fixtures(tmpdir)
+        try:
+            print '%-20s %-20s %-8s %9s %9s' % \
+                ('photo', 'spec', 'decode', 'seconds', 'peak MB')
+            for path in photos:
+                for spec in specs:
+                    for draft in (False, True):
+                        seconds, peak = measure(model, spec, path, draft,
+                                                options['runs'])
+                        print '%-20s %-20s %-8s %9.3f %9.1f' % \
+                            (os.path.basename(path)[:20], spec.name()[:20],
+                             'draft' if draft else 'full', seconds, peak)
+        finally:
+            if tmpdir:
+                shutil.rmtree(tmpdir)
+
+
+def make_fixtures(directory):
+    """ Writes out photo-like JPEGs of representative sizes
+
+    They're smooth noise rather than real photos, which is close enough for
+    timing decodes and resizes.
+
+    """
+    paths = []
+    for name, size in FIXTURES:
+        tile = Image.new('RGB', (size[0] // 10, size[1] // 10))
+        tile.putdata([(random.randint(0, 255), random.randint(0, 255),
+                       random.randint(0, 255))
+                      for i in xrange(tile.size[0] * tile.size[1])])
+        path = os.path.join(directory, '%s.jpg' % name)
+        tile.resize(size, Image.BILINEAR).save(path, 'JPEG', quality=90)
+        paths.append(path)
+    return paths
+
+
+def render(model, spec, path, draft):
+    img = Image.open(path)
+    if draft and img.format == 'JPEG':
+        size = spec.source_size(img.size)
+        if size is not None:
+            img.draft(img.mode, size)
+    img.load()
+    img, fmt = spec.process(img, model())
+    img_to_fobj(img, fmt or 'JPEG', quality=int(spec.quality)).close()
+
+
+def _measure_child(queue, model, spec, path, draft, runs):
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    best = None
+    for i in range(runs):
+        start = time.time()
+        render(model, spec, path, draft)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((best, (peak_rss - start_rss) / 1024.0))
+
+
+def measure(model, spec, path, draft, runs):
+    """ Returns the best time and the peak extra memory (in MB) for a spec
+
+    Each measurement runs in its own process, so the peak memory isn't
+    hidden by whatever the last one left behind.
+
+    """
+    queue = Queue()
+    child = Process(target=_measure_child,
+                    args=(queue, model, spec, path, draft, runs))
+    child.start()
+    result = queue.get()
+    child.join()
+    return result
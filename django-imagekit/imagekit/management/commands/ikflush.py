@@ -30,7 +30,6 @@ def flush_cache(apps, options):
                         prop = getattr(obj, spec.name(), None)
                         if prop is not None:
                             prop._delete()
-                        if spec.pre_cache:
-                            prop._create()
+                    obj._pre_cache()
     else:
         print 'Please specify on or more app names'
@@ -0,0 +1,202 @@
+import os
+import sys
+import time
+from multiprocessing import Pool
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models.loading import cache
+from imagekit.models import ImageModel
+
+
+class Command(BaseCommand):
+    help = ('Regenerates ImageKit cached files for the given models, '
+            'e.g. "media.ImageFile".')
+    args = '[app_label.Model ...]'
+    requires_model_validation = True
+    can_import_settings = True
+
+    option_list = BaseCommand.option_list + (
+        make_option('--spec', action='append', dest='specs', default=[],
+            help='Only regenerate this spec; may be given more than once.'),
+        make_option('--min-pk', type='int', dest='min_pk', default=None,
+            help='Skip objects with a primary key below this.'),
+        make_option('--max-pk', type='int', dest='max_pk', default=None,
+            help='Skip objects with a primary key above this.'),
+        make_option('--workers', type='int', dest='workers', default=1,
+            help='Number of worker processes to render with.'),
+        make_option('--checkpoint', dest='checkpoint', default=None,
+            help='File recording finished objects, so an interrupted run '
+                 'can pick up where it left off.'),
+        make_option('--throttle', type='float', dest='throttle', default=0,
+            help='Seconds each worker waits between objects.'),
+        make_option('--dry-run', action='store_true', dest='dry_run',
+            default=False,
+            help="Just say how much would be regenerated; don't do it."),
+    )
+
+    def handle(self, *labels, **options):
+        if not labels:
+            raise CommandError('Please specify one or more models.')
+        for label in labels:
+            regenerate(get_model(label), options)
+
+
+def get_model(label):
+    try:
+        app_label, model_name = label.split('.')
+    except ValueError:
+        raise CommandError('"%s" should look like app_label.Model' % label)
+    model = cache.get_model(app_label, model_name)
+    if model is None or not issubclass(model, ImageModel):
+        raise CommandError('"%s" is not an ImageKit model' % label)
+    return model
+
+
+def get_specs(model, names):
+    specs = model._ik.specs
+    if names:
+        specs = [spec for spec in specs if spec.name() in names]
+        missing = set(names) - set(spec.name() for spec in specs)
+        if missing:
+            raise CommandError('Unknown specs for %s: %s' %
+                               (model.__name__, ', '.join(sorted(missing))))
+    return specs
+
+
+def read_checkpoint(path, name, spec_names):
+    """ Returns the pks of `name` objects the checkpoint has down as done
+
+    Each line is "app_label.Model pk spec,spec,...", so one file can be
+    shared between models, and an object only counts as done if every one
+    of `spec_names` was regenerated for it.
+
+    """
+    if not path or not os.path.exists(path):
+        return set()
+    done = set()
+    for line in open(path):
+        fields = line.split()
+        if not fields:
+            continue
+        if len(fields) != 3:
+            raise CommandError('%s is not an ikregen checkpoint file' % path)
+        label, pk, specs = fields
+        if label == name and set(spec_names) <= set(specs.split(',')):
+            done.add(int(pk))
+    return done
+
+
+def checkpoint_line(name, pk, spec_names):
+    return '%s %d %s\n' % (name, pk, ','.join(sorted(spec_names)))
+
+
+def _regenerate_one(args):
+    """ Worker function: regenerates the given specs of one object
+
+    Takes plain data rather than model instances so it's cheap to hand to
+    another process. Returns the pk along with any error message.
+
+    """
+    app_label, model_name, pk, spec_names, throttle = args
+    model = cache.get_model(app_label, model_name)
+    try:
+        obj = model.objects.get(pk=pk)
+        if obj._imgfield:
+            props = [getattr(obj, name) for name in spec_names]
+            source = obj._source_image([prop.spec for prop in props])
+            for prop in props:
+                prop._delete()
+                if source is not None:
+                    prop._create(source)
+        error = None
+    except Exception, e:
+        error = '%s: %s' % (e.__class__.__name__, e)
+    if throttle:
+        time.sleep(throttle)
+    return pk, error
+
+
+def regenerate(model, options):
+    specs = get_specs(model, options['specs'])
+    name = '%s.%s' % (model._meta.app_label, model.__name__)
+
+    qs = model.objects.order_by('pk')
+    if options['min_pk'] is not None:
+        qs = qs.filter(pk__gte=options['min_pk'])
+    if options['max_pk'] is not None:
+        qs = qs.filter(pk__lte=options['max_pk'])
+    spec_names = [spec.name() for spec in specs]
+    done = read_checkpoint(options['checkpoint'], name, spec_names)
+    all_pks = list(qs.values_list('pk', flat=True))
+    pks = [pk for pk in all_pks if pk not in done]
+
+    if options['dry_run']:
+        return estimate(model, specs, pks, name)
+
+    print 'Regenerating %s for %d %s objects (%d already done)' % \
+        (', '.join(spec_names), len(pks), name, len(all_pks) - len(pks))
+    if not pks:
+        return
+
+    tasks = [(model._meta.app_label, model.__name__, pk, spec_names,
+              options['throttle']) for pk in pks]
+
+    workers = max(1, options['workers'])
+    if workers > 1:
+        # the children each need their own database connection
+        connection.close()
+        pool = Pool(workers)
+        results = pool.imap_unordered(_regenerate_one, tasks)
+    else:
+        pool = None
+        results = (_regenerate_one(task) for task in tasks)
+
+    checkpoint = open(options['checkpoint'], 'a') if options['checkpoint'] else None
+    start = time.time()
+    failures = 0
+    try:
+        for count, (pk, error) in enumerate(results, 1):
+            if error:
+                failures += 1
+                print >> sys.stderr, '%s %s failed: %s' % (name, pk, error)
+            elif checkpoint:
+                checkpoint.write(checkpoint_line(name, pk, spec_names))
+                checkpoint.flush()
+            if count % 50 == 0 or count == len(pks):
+                elapsed = time.time() - start
+                rate = count / elapsed if elapsed else 0
+                left = (len(pks) - count) / rate if rate else 0
+                print '%d/%d done, %.1f/sec, about %d seconds left' % \
+                    (count, len(pks), rate, left)
+    finally:
+        if checkpoint:
+            checkpoint.close()
+        if pool:
+            pool.close()
+            pool.join()
+    if failures:
+        print '%d objects failed; run again to retry them' % failures
+
+
+def estimate(model, specs, pks, name):
+    """ Prints how many files would be made and roughly how big they'd be
+
+    Sizes come from the currently cached files, so specs that were never
+    rendered are counted but not sized.
+
+    """
+    total = sized = 0
+    for obj in model.objects.filter(pk__in=pks).iterator():
+        if not obj._imgfield:
+            continue
+        for spec in specs:
+            metadata = getattr(obj, spec.name())._metadata()
+            if metadata['exists']:
+                total += metadata['size']
+                sized += 1
+    print 'Would regenerate %d files (%s for %d %s objects)' % \
+        (len(pks) * len(specs), ', '.join(spec.name() for spec in specs),
+         len(pks), name)
+    print '%d of them exist now, taking up %.1f MB' % \
+        (sized, total / (1024.0 * 1024))
@@ -1,5 +1,9 @@
+import logging
 import os
+import threading
 from datetime import datetime
+from multiprocessing.pool import ThreadPool
+from StringIO import StringIO
 from django.conf import settings
 from django.core.files.base import ContentFile
 from django.db import models
@@ -12,6 +16,8 @@ from imagekit.lib import *
 from imagekit.options import Options
 from imagekit.utils import img_to_fobj
 
+log = logging.getLogger('imagekit')
+
 # Modify image file buffer size.
 ImageFile.MAXBLOCK = getattr(settings, 'PIL_IMAGEFILE_MAXBLOCK', 256 * 2 ** 10)
 
@@ -98,16 +104,83 @@ class ImageModel(models.Model):
     def _storage(self):
         return getattr(self._ik, 'storage', self._imgfield.storage)
 
+    def _source_size(self):
+        """ Returns the original image's (width, height)
+
+        Comes from the image field's width_field and height_field if the
+        model has them, so it doesn't need to touch storage; otherwise the
+        image's header has to be read.
+
+        """
+        field = self._imgfield.field
+        if field.width_field and field.height_field:
+            size = (getattr(self, field.width_field),
+                    getattr(self, field.height_field))
+            if None not in size:
+                return size
+        return self._imgfield.width, self._imgfield.height
+
     def _clear_cache(self):
         for spec in self._ik.specs:
             prop = getattr(self, spec.name())
             prop._delete()
 
+    def _source_image(self, specs=()):
+        """ Opens and decodes the original image, or returns None
+
+        If every one of `specs` starts by shrinking the image, JPEGs are
+        decoded at a reduced scale that's still big enough for all of them,
+        which is much quicker and lighter than decoding the whole photo.
+
+        The result is loaded up front so that it can safely be shared between
+        the threads rendering different specs.
+
+        """
+        try:
+            fp = self._imgfield.storage.open(self._imgfield.name)
+        except IOError:
+            return None
+        fp.seek(0)
+        img = Image.open(StringIO(fp.read()))
+        fp.close()
+        if specs and img.format == 'JPEG':
+            sizes = [spec.source_size(img.size) for spec in specs]
+            if None not in sizes:
+                img.draft(img.mode, (max(w for w, h in sizes),
+                                     max(h for w, h in sizes)))
+        img.load()
+        return img
+
     def _pre_cache(self):
-        for spec in self._ik.specs:
-            if spec.pre_cache:
-                prop = getattr(self, spec.name())
-                prop._create()
+        accessors = [getattr(self, spec.name()) for spec in self._ik.specs
+                     if spec.pre_cache]
+        accessors = [prop for prop in accessors if not prop._exists()]
+        if not accessors:
+            return
+        source = self._source_image([prop.spec for prop in accessors])
+        if source is None:
+            return
+        workers = min(self._ik.pre_cache_workers, len(accessors))
+        if workers > 1:
+            # PIL releases the GIL while resampling and encoding, so threads
+            # are enough to put the resizes on separate cores
+            pool = ThreadPool(workers)
+            try:
+                pool.map(lambda prop: prop._create(source), accessors)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for prop in accessors:
+                prop._create(source)
+
+    def _pre_cache_logged(self):
+        # nobody's waiting on a background thread to hear about its errors
+        try:
+            self._pre_cache()
+        except Exception:
+            log.exception("Couldn't pre-cache specs for %s %s",
+                          self._meta.object_name, self._get_pk_val())
 
     def save_image(self, name, image, save=True, replace=True):
         if self._imgfield and replace:
@@ -142,7 +215,14 @@ class ImageModel(models.Model):
                 self._imgfield.storage.save(name, content)
         if clear_cache and self._imgfield:
             self._clear_cache()
-        self._pre_cache()
+        if not any(spec.pre_cache for spec in self._ik.specs):
+            return
+        if self._ik.pre_cache_in_background:
+            thread = threading.Thread(target=self._pre_cache_logged)
+            thread.setDaemon(True)
+            thread.start()
+        else:
+            self._pre_cache()
 
     def delete(self):
         assert self._get_pk_val() is not None, "%s object can't be deleted because its %s attribute is set to None." % (self._meta.object_name, self._meta.pk.attname)
@@ -12,10 +12,13 @@ class Options(object):
     crop_vert_field = 'crop_vert'
     preprocessor_spec = None
     cache_dir = 'cache'
+    spec_url = None
     save_count_as = None
     cache_filename_format = "%(filename)s_%(specname)s.%(extension)s"
     admin_thumbnail_spec = 'admin_thumbnail'
     spec_module = 'imagekit.defaults'
+    pre_cache_workers = 1
+    pre_cache_in_background = False
     #storage = defaults to image_field.storage
 
     def __init__(self, opts):
@@ -6,6 +6,7 @@ the class properties as settings. The process method can be overridden as well a
 own effects/processes entirely.
 
 """
+import math
 from imagekit.lib import *
 
 class ImageProcessor(object):
@@ -15,6 +16,15 @@ class ImageProcessor(object):
     def process(cls, img, fmt, obj):
         return img, fmt
 
+    @classmethod
+    def output_size(cls, size):
+        """ Returns the size `process` would turn an image of `size` into
+
+        None means it can't tell without actually doing it.
+
+        """
+        return None
+
 
 class Adjustment(ImageProcessor):
     color = 1.0
@@ -24,7 +34,8 @@ class Adjustment(ImageProcessor):
 
     @classmethod
     def process(cls, img, fmt, obj):
-        img = img.convert('RGB')
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
         for name in ['Color', 'Brightness', 'Contrast', 'Sharpness']:
             factor = getattr(cls, name.lower())
             if factor != 1.0:
@@ -34,6 +45,10 @@ class Adjustment(ImageProcessor):
                     pass
         return img, fmt
 
+    @classmethod
+    def output_size(cls, size):
+        return size
+
 
 class Format(ImageProcessor):
     format = 'JPEG'
@@ -43,6 +58,10 @@ class Format(ImageProcessor):
     def process(cls, img, fmt, obj):
         return img, cls.format
 
+    @classmethod
+    def output_size(cls, size):
+        return size
+
 
 class Reflection(ImageProcessor):
     background_color = '#FFFFFF'
@@ -93,13 +112,53 @@ class Resize(ImageProcessor):
     crop = False
     upscale = False
 
+    @classmethod
+    def _ratio(cls, cur_width, cur_height):
+        if cls.crop:
+            return max(float(cls.width)/cur_width, float(cls.height)/cur_height)
+        elif not cls.width is None and not cls.height is None:
+            return min(float(cls.width)/cur_width, float(cls.height)/cur_height)
+        elif cls.width is None:
+            return float(cls.height)/cur_height
+        else:
+            return float(cls.width)/cur_width
+
+    @classmethod
+    def source_size(cls, size):
+        """ Returns the smallest version of an image of `size` this needs
+
+        Used to decode JPEGs at a reduced scale when we're shrinking them a
+        lot anyway. None means the full-size image is needed.
+
+        """
+        cur_width, cur_height = size
+        ratio = cls._ratio(cur_width, cur_height)
+        if ratio >= 1:
+            return None
+        return (int(math.ceil(cur_width * ratio)),
+                int(math.ceil(cur_height * ratio)))
+
+    @classmethod
+    def output_size(cls, size):
+        if cls.crop:
+            return (cls.width, cls.height)
+        cur_width, cur_height = size
+        ratio = cls._ratio(cur_width, cur_height)
+        new_dimensions = (int(round(cur_width*ratio)),
+                          int(round(cur_height*ratio)))
+        if new_dimensions[0] > cur_width or \
+           new_dimensions[1] > cur_height:
+            if not cls.upscale:
+                return size
+        return new_dimensions
+
     @classmethod
     def process(cls, img, fmt, obj):
         cur_width, cur_height = img.size
+        ratio = cls._ratio(cur_width, cur_height)
         if cls.crop:
             crop_horz = getattr(obj, obj._ik.crop_horz_field, 1)
             crop_vert = getattr(obj, obj._ik.crop_vert_field, 1)
-            ratio = max(float(cls.width)/cur_width, float(cls.height)/cur_height)
             resize_x, resize_y = ((cur_width * ratio), (cur_height * ratio))
             crop_x, crop_y = (abs(cls.width - resize_x), abs(cls.height - resize_y))
             x_diff, y_diff = (int(crop_x / 2), int(crop_y / 2))
@@ -116,14 +175,6 @@ class Resize(ImageProcessor):
             box = (box_left, box_upper, box_right, box_lower)
             img = img.resize((int(resize_x), int(resize_y)), Image.ANTIALIAS).crop(box)
         else:
-            if not cls.width is None and not cls.height is None:
-                ratio = min(float(cls.width)/cur_width,
-                            float(cls.height)/cur_height)
-            else:
-                if cls.width is None:
-                    ratio = float(cls.height)/cur_height
-                else:
-                    ratio = float(cls.width)/cur_width
             new_dimensions = (int(round(cur_width*ratio)),
                               int(round(cur_height*ratio)))
             if new_dimensions[0] > cur_width or \
@@ -6,12 +6,17 @@ spec found.
 
 """
 import os
-from StringIO import StringIO
+import time
+from hashlib import sha1
 from imagekit import processors
 from imagekit.lib import *
 from imagekit.utils import img_to_fobj
+from django.core.cache import cache
 from django.core.files.base import ContentFile
 
+# how long to remember whether a spec exists and how big it is
+METADATA_TIMEOUT = 30 * 24 * 60 * 60
+
 
 class ImageSpec(object):
     pre_cache = False
@@ -23,6 +28,27 @@ class ImageSpec(object):
     def name(cls):
         return getattr(cls, 'access_as', cls.__name__.lower())
 
+    @classmethod
+    def source_size(cls, size):
+        """ How much of an image of `size` this spec needs decoded
+
+        Only known when the spec starts off by shrinking the image; None
+        means it needs the whole thing.
+
+        """
+        if cls.processors and issubclass(cls.processors[0], processors.Resize):
+            return cls.processors[0].source_size(size)
+        return None
+
+    @classmethod
+    def output_size(cls, size):
+        """ The size this spec makes of an image of `size`, or None if unknown """
+        for proc in cls.processors:
+            if size is None:
+                break
+            size = proc.output_size(size)
+        return size
+
     @classmethod
     def process(cls, image, obj):
         fmt = image.format
@@ -50,29 +76,80 @@ class Accessor(object):
                                   optimize=True)
         return imgfile
 
-    def _create(self):
+    def _create(self, source=None):
+        """ Renders and saves this spec if it isn't cached already
+
+        `source` may be an already-decoded copy of the original image, as
+        from ImageModel._source_image, so several specs can share one decode.
+
+        """
         if self._exists():
             return
-        # process the original image file
-        try:
-            fp = self._obj._imgfield.storage.open(self._obj._imgfield.name)
-        except IOError:
-            return
-        fp.seek(0)
-        fp = StringIO(fp.read())
-        self._img, self._fmt = self.spec.process(Image.open(fp), self._obj)
+        if source is None:
+            source = self._obj._source_image([self.spec])
+            if source is None:
+                return
+        self._img, self._fmt = self.spec.process(source, self._obj)
         # save the new image to the cache
         content = ContentFile(self._get_imgfile().read())
         self._obj._storage.save(self.name, content)
+        self._set_metadata({
+            'exists': True,
+            'width': self._img.size[0],
+            'height': self._img.size[1],
+            'size': content.size,
+            'mtime': time.time(),
+        })
 
     def _delete(self):
         self._obj._storage.delete(self.name)
+        self._set_metadata({'exists': False})
 
     def _exists(self):
-        return self._obj._storage.exists(self.name)
+        return self._metadata()['exists']
 
     @property
-    def name(self):
+    def _metadata_key(self):
+        return 'imagekit-meta-%s' % sha1(self.name).hexdigest()
+
+    def _set_metadata(self, metadata):
+        cache.set(self._metadata_key, metadata, METADATA_TIMEOUT)
+
+    def _metadata(self):
+        """ Returns what we know about the cached file, without touching storage
+
+        That's a dict with 'exists' and, if it does, 'width', 'height', 'size'
+        and 'mtime'. It's kept up to date by _create and _delete, and only
+        read from storage when it's fallen out of the cache.
+
+        """
+        metadata = cache.get(self._metadata_key)
+        if metadata is None:
+            storage = self._obj._storage
+            if storage.exists(self.name):
+                fp = storage.open(self.name)
+                try:
+                    width, height = Image.open(fp).size
+                finally:
+                    fp.close()
+                try:
+                    mtime = time.mktime(storage.modified_time(self.name).timetuple())
+                except NotImplementedError:
+                    mtime = None
+                metadata = {
+                    'exists': True,
+                    'width': width,
+                    'height': height,
+                    'size': storage.size(self.name),
+                    'mtime': mtime,
+                }
+            else:
+                metadata = {'exists': False}
+            self._set_metadata(metadata)
+        return metadata
+
+    def _cache_filename(self):
+        """ Returns the original's directory and the name to cache this under """
         filepath, basename = os.path.split(self._obj._imgfield.name)
         filename, extension = os.path.splitext(basename)
         for processor in self.spec.processors:
@@ -82,6 +159,11 @@ class Accessor(object):
             {'filename': filename,
              'specname': self.spec.name(),
              'extension': extension.lstrip('.')}
+        return filepath, cache_filename
+
+    @property
+    def name(self):
+        filepath, cache_filename = self._cache_filename()
         if callable(self._obj._ik.cache_dir):
             return self._obj._ik.cache_dir(self._obj, filepath,
                                            cache_filename)
@@ -91,6 +173,10 @@ class Accessor(object):
 
     @property
     def url(self):
+        spec_url = self._obj._ik.spec_url
+        if spec_url is not None and not self._exists():
+            # imagekit.views.serve_spec renders it and redirects to the file
+            return spec_url(self._obj, self.spec)
         self._create()
         if self.spec.increment_count:
             fieldname = self._obj._ik.save_count_as
@@ -113,13 +199,33 @@ class Accessor(object):
                 self._img = Image.open(self.file)
         return self._img
 
+    def _size(self):
+        """ Returns (width, height), rendering the spec only as a last resort
+
+        If it's cached we know from its metadata; otherwise the processors
+        can usually work it out from the original's dimensions (which don't
+        need the original opened if the model keeps them in fields; see
+        ImageModel._source_size).
+
+        """
+        metadata = self._metadata()
+        if not metadata['exists']:
+            size = None
+            if self._obj._imgfield:
+                size = self.spec.output_size(self._obj._source_size())
+            if size is not None:
+                return size
+            self._create()
+            metadata = self._metadata()
+        return metadata.get('width'), metadata.get('height')
+
     @property
     def width(self):
-        return self.image.size[0]
+        return self._size()[0]
 
     @property
     def height(self):
-        return self.image.size[1]
+        return self._size()[1]
 
 
 class Descriptor(object):
@@ -1,3 +1,4 @@
+import logging
 import os
 import tempfile
 import unittest
@@ -7,7 +8,7 @@ from django.db import models
 from django.test import TestCase
 
 from imagekit import processors
-from imagekit.models import ImageModel
+from imagekit.models import ImageModel, log
 from imagekit.specs import ImageSpec
 from imagekit.lib import Image
 
@@ -37,6 +38,16 @@ class TestResizeCropped(ImageSpec):
     access_as = 'cropped'
     processors = [ResizeCropped]
 
+class TestPreCachedWidth(ImageSpec):
+    access_as = 'pre_cached_width'
+    pre_cache = True
+    processors = [ResizeToWidth]
+
+class TestPreCachedHeight(ImageSpec):
+    access_as = 'pre_cached_height'
+    pre_cache = True
+    processors = [ResizeToHeight]
+
 class TestPhoto(ImageModel):
     """ Minimal ImageModel class for testing """
     image = models.ImageField(upload_to='images')
@@ -87,11 +98,99 @@ class IKTest(TestCase):
         self.assertEqual(self.p.cropped.width, 100)
         self.assertEqual(self.p.cropped.height, 100)
 
+    def test_pre_cache(self):
+        self.failUnless(self.p.pre_cached_width._exists())
+        self.failUnless(self.p.pre_cached_height._exists())
+        self.failIf(self.p.to_width._exists())
+
+    def test_pre_cache_workers(self):
+        self.p._clear_cache()
+        self.p._ik.pre_cache_workers = 2
+        try:
+            self.p._pre_cache()
+        finally:
+            self.p._ik.pre_cache_workers = 1
+        self.failUnless(self.p.pre_cached_width._exists())
+        self.failUnless(self.p.pre_cached_height._exists())
+
+    def test_pre_cache_logged(self):
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        log.addHandler(handler)
+        def fail():
+            raise IOError("disk full")
+        self.p._pre_cache = fail
+        try:
+            self.p._pre_cache_logged()
+        finally:
+            log.removeHandler(handler)
+            del self.p._pre_cache
+        self.assertEqual(len(records), 1)
+        self.failUnless(records[0].exc_info)
+
+    def test_source_size(self):
+        self.assertEqual(ResizeToWidth.source_size((800, 600)), (100, 75))
+        self.assertEqual(ResizeCropped.source_size((800, 600)), (134, 100))
+        self.assertEqual(ResizeToWidth.source_size((80, 60)), None)
+
+    def test_draft_source(self):
+        source = self.p._source_image([TestResizeToWidth, TestResizeToHeight])
+        self.failUnless(source.size[0] < 800)
+        self.failUnless(source.size[0] >= 134 and source.size[1] >= 100)
+        self.assertEqual(self.p._source_image().size, (800, 600))
+
+    def test_output_size(self):
+        self.assertEqual(TestResizeToWidth.output_size((800, 600)), (100, 75))
+        self.assertEqual(TestResizeCropped.output_size((800, 600)), (100, 100))
+        self.assertEqual(TestResizeToWidth.output_size((80, 60)), (80, 60))
+
+    def test_size_without_rendering(self):
+        self.assertEqual(self.p.to_height.width, 133)
+        self.failIf(self.p.to_height._exists())
+
+    def test_metadata(self):
+        self.p.to_width._create()
+        metadata = self.p.to_width._metadata()
+        self.failUnless(metadata['exists'])
+        self.assertEqual((metadata['width'], metadata['height']), (100, 75))
+        self.p._clear_cache()
+        self.failIf(self.p.to_width._exists())
+
     def test_url(self):
         tup = (settings.MEDIA_URL, self.p._ik.cache_dir,
                'images/test_to_width.jpeg')
         self.assertEqual(self.p.to_width.url, "%s%s/%s" % tup)
 
+    def test_spec_url(self):
+        self.p._ik.spec_url = lambda obj, spec: '/resized/%s/' % spec.name()
+        try:
+            self.assertEqual(self.p.to_width.url, '/resized/to_width/')
+            self.failIf(self.p.to_width._exists())
+            # once it's rendered, point straight at the file
+            self.p.to_width._create()
+            self.assertEqual(self.p.to_width.url,
+                             self.p._storage.url(self.p.to_width.name))
+        finally:
+            self.p._ik.spec_url = None
+
+    def test_checkpoint(self):
+        from imagekit.management.commands.ikregen import read_checkpoint, checkpoint_line
+        fd, path = tempfile.mkstemp()
+        try:
+            fp = os.fdopen(fd, 'w')
+            fp.write(checkpoint_line('imagekit.TestPhoto', 1, ['to_width', 'cropped']))
+            fp.write(checkpoint_line('imagekit.TestPhoto', 2, ['to_width']))
+            fp.write(checkpoint_line('other.Photo', 3, ['to_width']))
+            fp.close()
+            self.assertEqual(read_checkpoint(path, 'imagekit.TestPhoto', ['to_width']),
+                             set([1, 2]))
+            self.assertEqual(read_checkpoint(path, 'imagekit.TestPhoto', ['cropped']),
+                             set([1]))
+            self.assertEqual(read_checkpoint(path, 'other.Photo', ['cropped']), set())
+        finally:
+            os.remove(path)
+
     def tearDown(self):
         # make sure image file is deleted
         path = self.p.image.path
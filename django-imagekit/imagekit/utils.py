@@ -1,9 +1,28 @@
 """ ImageKit utility functions """
 
+import os
 import tempfile
+from hashlib import sha1
 
 def img_to_fobj(img, format, **kwargs):
     tmp = tempfile.TemporaryFile()
     img.save(tmp, format, **kwargs)
     tmp.seek(0)
     return tmp
+
+
+def sharded_cache_dir(base, levels=2):
+    """ Returns a cache_dir callable spreading cached files over subdirectories
+
+    Each file goes under `levels` directories named from the hash of its path,
+    e.g. base/3f/a2/9c0e51d7-photo_thumbnail.jpg, so no one directory gets too
+    big. The rest of the hash prefixes the name to keep same-named uploads
+    from different days apart.
+
+    """
+    def cache_dir(obj, filepath, cache_filename):
+        digest = sha1(os.path.join(filepath, cache_filename)).hexdigest()
+        shards = [digest[2*i:2*i+2] for i in range(levels)]
+        name = '%s-%s' % (digest[2*levels:2*levels+8], cache_filename)
+        return os.path.join(base, *(shards + [name]))
+    return cache_dir
@@ -0,0 +1,66 @@
+""" ImageKit views
+
+Serves rendered specs on demand, so that templates only ever need to emit a
+URL and the image processing happens the first time a browser asks for it.
+
+"""
+import time
+from hashlib import sha1
+from django.core.cache import cache
+from django.http import HttpResponseRedirect, Http404
+from django.shortcuts import get_object_or_404
+from django.utils.http import http_date
+
+from imagekit.specs import Accessor
+
+# how long browsers and proxies may keep the redirect to a rendered spec
+REDIRECT_MAX_AGE = 24 * 60 * 60
+
+# how long one process may hold the lock on rendering a spec
+LOCK_TIMEOUT = 60
+LOCK_WAIT = 0.1
+
+
+def _create_locked(prop):
+    """ Renders `prop` unless another process is already doing it
+
+    The lock lives in the Django cache, so it holds across processes as long
+    as the cache backend is shared. If somebody else has it, waits for their
+    copy to show up instead of rendering it a second time.
+
+    """
+    key = 'imagekit-lock-%s' % sha1(prop.name).hexdigest()
+    waited = 0
+    while not cache.add(key, 1, LOCK_TIMEOUT):
+        time.sleep(LOCK_WAIT)
+        waited += LOCK_WAIT
+        if prop._exists():
+            return
+        if waited >= LOCK_TIMEOUT:
+            break
+    try:
+        prop._create()
+    finally:
+        cache.delete(key)
+
+
+def serve_spec(request, model, pk, spec_name):
+    """ Redirects to spec `spec_name` of the `model` instance with key `pk`
+
+    Renders it first if it isn't cached yet; after that the file itself is
+    served by whatever serves the storage, not by Django.
+
+    """
+    obj = get_object_or_404(model, pk=pk)
+    prop = getattr(obj, spec_name, None)
+    if not isinstance(prop, Accessor) or not obj._imgfield:
+        raise Http404
+    if not prop._exists():
+        _create_locked(prop)
+        if not prop._exists():
+            raise Http404
+
+    response = HttpResponseRedirect(obj._storage.url(prop.name))
+    response['Cache-Control'] = 'public, max-age=%d' % REDIRECT_MAX_AGE
+    response['Expires'] = http_date(time.time() + REDIRECT_MAX_AGE)
+    return response
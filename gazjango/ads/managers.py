@@ -1,8 +1,12 @@
 from django.db import models, IntegrityError
 from django.conf import settings
 
+from gazjango.scrapers.fetch import fetch
+
+from cStringIO import StringIO
 import datetime
 import random
+import time
 import urllib2
 try:
     from xml.etree import cElementTree as etree
@@ -17,9 +21,16 @@ class TextLinkAdsManager(models.Manager):
         return orig.filter(source=self.source) if self.source else orig
     
     def update(self):
-        "Replace the ad objects for this source with ones from the web feed."
+        """
+        Replace the ad objects for this source with ones from the web feed,
+        unless the feed is just the same as last time.
+        """
         try:
-            ads = self._get_ads()
+            fetched = fetch(self.SOURCE_URL)
+            if not fetched.changed and self.all().exists():
+                return True
+            
+            ads = self._get_ads(body=fetched.body)
             if not ads:
                 return False
                 
@@ -34,29 +45,36 @@ class TextLinkAdsManager(models.Manager):
                 if ad['before'] or ad['after']:
                     a.override = "%(before)s<a href='%(url)s'>%(text)s</a>%(after)s" % ad
                     a.save()
+            fetched.remember()
             return True
         except urllib2.URLError:
             return False
         except SyntaxError: # happens from etree if the feed is blank (?)
             return False
     
-    def _get_ads(self, url=None):
+    def _get_ads(self, url=None, body=None):
         """
-        Gets the ads from the web feed. Subclasses supporting this operation should
-        override this function to return a list of dictionaries like
+        Gets the ads from the web feed (or from `body`, if it's already been
+        fetched). Subclasses supporting this operation should override this
+        function to return a list of dictionaries like
         
         { 'url': 'http://example.com', 'text': 'Some Ad',
           'before': '', 'after': '' }
         """
         raise NotImplemented
     
+    def _get_feed(self, url=None, body=None):
+        if body is None:
+            return etree.parse(urllib2.urlopen(url or self.SOURCE_URL))
+        return etree.parse(StringIO(body))
+    
 
 class TLAAdsManager(TextLinkAdsManager):
     source = 't'
     
     SOURCE_URL = "http://www.text-link-ads.com/xml.php?inventory_key=N085BPUAZXJB74O3QZ06"
-    def _get_ads(self, url=None):
-        feed = etree.parse(urllib2.urlopen(url or self.SOURCE_URL))
+    def _get_ads(self, url=None, body=None):
+        feed = self._get_feed(url, body)
         process = lambda link: {
             'before': link.find('BeforeText').text,
             'url': link.find('URL').text,
@@ -70,8 +88,8 @@ class LinkWorthAdsManager(TextLinkAdsManager):
     source = 'l'
     
     SOURCE_URL = "http://feeds.plawr.com/?0d478e5d5257f22428aa8e72b2e2d19e831"
-    def _get_ads(self, url=None):
-        feed = etree.parse(urllib2.urlopen(url or self.SOURCE_URL))
+    def _get_ads(self, url=None, body=None):
+        feed = self._get_feed(url, body)
         process = lambda item: {
             'before': '',
             'url': item.find('link').text,
@@ -113,27 +131,90 @@ class BannerAdsManager(models.Manager):
         return self.filter(date_start__lte=date, date_end__gte=date)
     
     def pick(self, date=None, allow_zero_priority=True):
-        "Pick an ad running at `date`/now according to their priorities."
-        # get the candidates and their weights
-        candidates = self.get_running(date=date)
-        nonzero_priority = candidates.exclude(priority=0)
-        zero_priority = candidates.filter(priority=0)
+        """
+        Pick an ad running at `date`/now according to their priorities.
         
-        # choose a "priority index" and go to it in the cand list
-        total_priority = sum(cand.priority for cand in nonzero_priority)
-        if total_priority == 0:
-            if not allow_zero_priority:
-                return None
-            try:
-                return random.choice(zero_priority)
-            except IndexError:
-                return None
+        The ads running in this space on that day are looked up once and
+        kept, with an AliasSampler for their priorities, until an ad is
+        saved or deleted (or SAMPLER_TIMEOUT runs out, for changes made
+        by other processes), so picking doesn't usually take any queries.
+        """
+        if not date:
+            date = datetime.date.today()
+        key = (self.space, date)
         
-        pri_left = random.random() * total_priority # in [0, total_priority)
-        for cand in candidates:
-            if cand.priority >= pri_left:
-                return cand
-            pri_left -= cand.priority
+        entry = _samplers.get(key)
+        if entry is None or time.time() - entry[0] > SAMPLER_TIMEOUT:
+            entry = (time.time(), BannerSampler(self.get_running(date=date)
+                                    .select_related('image', 'outside')))
+            for old in [k for k in _samplers.keys() if k[1] < date]:
+                _samplers.pop(old, None)
+            _samplers[key] = entry
+        return entry[1].pick(allow_zero_priority)
+    
+
+# how long (in seconds) a process keeps its picture of the running ads;
+# saves in this process clear it straight away, but not in other ones
+SAMPLER_TIMEOUT = 5 * 60
+
+# (space, date) => (when it was made, BannerSampler)
+_samplers = {}
+
+def clear_pick_cache(**kwargs):
+    "Forgets the running ads, so the next pick() looks them up again."
+    _samplers.clear()
+
+
+class AliasSampler(object):
+    """
+    Picks one of `items` at random, each in proportion to its weight, in
+    constant time no matter how many there are, by Walker's alias method:
+    each of n equal slots holds (at most) two items, splitting the slot
+    between them, so a pick is a choice of slot and then of one of its two.
+    """
+    def __init__(self, items, weights):
+        n = len(items)
+        total = float(sum(weights))
+        self.items = list(items)
+        self.prob = [1.0] * n
+        self.alias = range(n)
+        
+        scaled = [weight * n / total for weight in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1 - scaled[less]
+            (small if scaled[more] < 1 else large).append(more)
+        # anything left over has a whole slot, give or take rounding
+    
+    def pick(self):
+        i = int(random.random() * len(self.items))
+        if random.random() < self.prob[i]:
+            return self.items[i]
+        return self.items[self.alias[i]]
+    
+
+class BannerSampler(object):
+    """
+    Picks from `ads` according to their priorities, or if none of them
+    has any priority, from the zero-priority ones with equal chances.
+    """
+    def __init__(self, ads):
+        ads = list(ads)
+        weighted = [ad for ad in ads if ad.priority > 0]
+        self.weighted = weighted and \
+                        AliasSampler(weighted, [ad.priority for ad in weighted])
+        self.zero = [ad for ad in ads if ad.priority == 0]
+    
+    def pick(self, allow_zero_priority=True):
+        if self.weighted:
+            return self.weighted.pick()
+        if not allow_zero_priority or not self.zero:
+            return None
+        return random.choice(self.zero)
     
 
 class FrontPageAdsManager(BannerAdsManager):
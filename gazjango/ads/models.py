@@ -94,3 +94,6 @@ class BannerAd(models.Model):
     def __unicode__(self):
         return "%s [%s; %s]" % (self.publisher, self.date_start, self.get_space_display())
     
+
+models.signals.post_save.connect(managers.clear_pick_cache, sender=BannerAd)
+models.signals.post_delete.connect(managers.clear_pick_cache, sender=BannerAd)
@@ -3,13 +3,16 @@ from __future__ import division
 from django.db import IntegrityError
 from django.test import TestCase
 
+from gazjango.ads.managers import AliasSampler, clear_pick_cache
 from gazjango.ads.models import BannerAd
 from gazjango.media.models import OutsideMedia, MediaBucket
 
+import datetime
 import random
 
 class SpaceCreationTestCase(TestCase):
     def setUp(self):
+        clear_pick_cache() # it doesn't hear about the last test's rollback
         self.bucket = MediaBucket.objects.create(slug='bucket')
         self.m = OutsideMedia.objects.create(bucket=self.bucket, slug='ad')
     
@@ -29,6 +32,7 @@ class SpaceCreationTestCase(TestCase):
 
 class BannerAdPriorityTestCase(TestCase):
     def setUp(self):
+        clear_pick_cache() # it doesn't hear about the last test's rollback
         self.bucket = MediaBucket.objects.create(slug='bucket')
         self.m = OutsideMedia.objects.create(bucket=self.bucket, slug='ad')
         self.make = lambda pri=1: BannerAd.front.create(media=self.m, priority=pri)
@@ -70,6 +74,15 @@ class BannerAdPriorityTestCase(TestCase):
         self.assertEqual(picks[zero.pk], 0)
         self.assertEqual(picks[zero_b.pk], 0)
     
+    def testEndedAds(self):
+        ad = self.make()
+        self.assertEqual(BannerAd.front.pick(), ad)
+        
+        ad.date_start = ad.date_end = datetime.date.today() - datetime.timedelta(days=1)
+        ad.save()
+        self.assertEqual(BannerAd.front.pick(), None)
+        self.assertEqual(BannerAd.front.pick(date=ad.date_end), ad)
+    
     
     def pick_ratios(self, n=1000, base=BannerAd.front):
         counts = dict((ad.pk, 0) for ad in base.all())
@@ -95,3 +108,20 @@ class BannerAdPriorityTestCase(TestCase):
         self.assert_values_in_delta(picks, self.priority_ratios(base=base), delta)
         return picks
     
+
+
+class AliasSamplerTestCase(TestCase):
+    def testRatios(self):
+        weights = [1, 2, 3.5, 0.25, 10]
+        sampler = AliasSampler(range(len(weights)), weights)
+        n = 20000
+        counts = [0] * len(weights)
+        for i in range(n):
+            counts[sampler.pick()] += 1
+        for count, weight in zip(counts, weights):
+            self.assert_(abs(count / n - weight / sum(weights)) <= 0.02)
+    
+    def testSingle(self):
+        sampler = AliasSampler(['only'], [0.5])
+        self.assertEqual([sampler.pick() for i in range(10)], ['only'] * 10)
+    
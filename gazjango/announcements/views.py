@@ -19,7 +19,7 @@ from gazjango.reviews.forms        import SubmitEstablishmentForm, SubmitReviewF
 from gazjango.housing.models       import HousingListing
 from gazjango.housing.forms        import SubmitHousingForm
 from gazjango.misc.view_helpers    import get_user_profile
-from gazjango.misc.files           import handle_file_upload
+from gazjango.misc.files           import LimitedUploadHandler
 from gazjango.scrapers.bico        import get_bico_news
 from gazjango.media.models         import ImageFile, MediaBucket
 
@@ -87,16 +87,21 @@ def announcement_success(request, template="listings/announcements/success.html"
 @login_required
 def submit_poster(request, template="listings/posters/submit.html"):
     if request.method == 'POST':
+        uploads = LimitedUploadHandler(request)
+        request.upload_handlers = [uploads]
         form = SubmitPosterForm(request.POST, request.FILES)
-        if form.is_valid():
+        if 'poster' in uploads.too_large:
+            form.errors['poster'] = form.error_class(
+                ["That file is too big; please upload a smaller version."])
+        elif form.is_valid():
             profile = get_user_profile(request)
             
             args = dict( (k, v) for k, v in form.cleaned_data.items() if k != 'poster' )
             poster = Poster(**args)
             poster.sponsor_user = profile
             
-            poster_file_path = handle_file_upload(request.FILES['poster'], 'posters')
-            poster.poster = ImageFile.objects.create(
+            upload = request.FILES['poster']
+            poster.poster = ImageFile(
                 name = poster.title,
                 slug = slugify(poster.title),
                 bucket = MediaBucket.objects.get_or_create(slug="posters", defaults={
@@ -104,8 +109,11 @@ def submit_poster(request, template="listings/posters/submit.html"):
                     'description': "Posters uploaded by the community."
                 })[0],
                 license_type='p',
-                data=poster_file_path,
             )
+            # into the content store, which reuses the hash the upload
+            # handler worked out on the way in
+            poster.poster.data.save(upload.name, upload, save=False)
+            poster.poster.save()
             poster.poster.users = [profile]
             
             poster.save()
@@ -1,7 +1,11 @@
 from django.contrib import admin
-from gazjango.blogroll.models import OutsideSite
+from gazjango.blogroll.models import OutsideSite, BlogrollEntry
 
 class OutsideSiteAdmin(admin.ModelAdmin):
     pass
 admin.site.register(OutsideSite, OutsideSiteAdmin)
 
+class BlogrollEntryAdmin(admin.ModelAdmin):
+    list_display = ('title', 'site', 'date')
+    list_filter = ('site',)
+admin.site.register(BlogrollEntry, BlogrollEntryAdmin)
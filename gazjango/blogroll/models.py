@@ -1,44 +1,39 @@
-from django.core.cache import cache
-from django.db         import models
+from django.db         import models, transaction
 from gazjango.scrapers import feedparser
+from gazjango.scrapers.fetch import fetch
 
-FEED_TIMEOUT = 2*60*60 + 10*60
-BROKEN_FEED_TIMEOUT = 2*60
+import datetime
+
+# how many of each site's latest entries we keep around
+ENTRIES_PER_SITE = 10
 
 class OutsideSiteManager(models.Manager):
     def most_recent_stories(self, num_from_each=1, spec=models.Q()):
         """
         Return the `num_from_each` most recent stories from each OutsideSite
-        specified by `spec` (defaults to all), sorted most recent first. The
-        return format looks like
-            [(<OutsideSite: Site1>, <Story1>), (<OutsideSite: Site2>, <Story2>)]
-        with <Story1> being the object returned by feedparser.
-        
-        See http://feedparser.org for documentation on the returned objects.
+        specified by `spec` (defaults to all), sorted most recent first, as
+        BlogrollEntry objects (with their sites already loaded).
         
-        Note that this might be quite slow if the feeds aren't already
-        up to date.
+        This only looks at what's in the database, as of the last time
+        update_all() was run; it never goes out to the sites themselves.
         """
-        stories = []
-        for site in self.filter(spec):
-            if not site.feed.bozo:
-                stories.extend(site.feed.entries[:num_from_each])
-        return sorted(stories, key=lambda entry: entry.date, reverse=True)
+        entries = BlogrollEntry.objects.filter(rank__lt=num_from_each)
+        if spec:
+            entries = entries.filter(site__in=self.filter(spec))
+        return list(entries.select_related('site').order_by('-date'))
     
     def update_all(self):
         "Forces a refresh of all feeds."
         for site in self.all():
             site.update_feed()
-            
+    
 
 class OutsideSite(models.Model):
     """
     An outside site to be included in a blogroll-type thing.
     
-    The feed attribute is the result of feedparser.parse: see 
-    http://feedparser.org for more complete documentation. Note
-    that it may be completely invalid, in which case its "bozo"
-    attribute will be true.
+    Its latest few entries are kept in `entries` (see BlogrollEntry),
+    refreshed by update_feed().
     """
     name = models.CharField(max_length=100)
     feed_url = models.URLField(verify_exists=True)
@@ -53,25 +48,69 @@ class OutsideSite(models.Model):
     
     objects = OutsideSiteManager()
     
-    def _cache_key(self):
-        return "parsed-feed-%s" % self.pk
-    
-    def _get_feed(self):
-        key = self._cache_key()
-        cached = cache.get(key, None)
-        return cached if cached else _update_feed()
-    feed = property(_get_feed)
-    
     def update_feed(self):
-        new = feedparser.parse(self.feed_url)
-        timeout = BROKEN_FEED_TIMEOUT if new.bozo else FEED_TIMEOUT
-        cache.set(self._cache_key(), new, timeout)
-        return new
+        """
+        Fetches the site's feed and, if it's changed, replaces our entries
+        for it with the latest ones. If the feed can't be loaded or is
+        broken, the entries we've got are left alone.
+        
+        Returns whether we've got new entries.
+        """
+        try:
+            fetched = fetch(self.feed_url)
+        except Exception:
+            # TODO: log this somehow
+            return False
+        if not fetched.changed and self.entries.exists():
+            return False
+        
+        parsed = feedparser.parse(fetched.body)
+        if parsed.bozo and not parsed.entries:
+            return False
+        
+        self._replace_entries(parsed.entries[:ENTRIES_PER_SITE])
+        fetched.remember()
+        return True
+    
+    @transaction.commit_on_success
+    def _replace_entries(self, entries):
+        self.entries.all().delete()
+        for rank, entry in enumerate(entries):
+            parsed_date = entry.get('updated_parsed') or entry.get('published_parsed')
+            self.entries.create(
+                rank=rank,
+                title=entry.get('title', '')[:255],
+                link=entry.get('link', '')[:255],
+                date=datetime.datetime(*parsed_date[:6]) if parsed_date
+                     else datetime.datetime.now(),
+                summary=entry.get('summary', ''),
+            )
     
     def __unicode__(self):
         return self.name
     
 
+class BlogrollEntry(models.Model):
+    """
+    One of the latest entries from an OutsideSite's feed. `rank` is its
+    position among that site's entries, 0 being the newest.
+    """
+    site = models.ForeignKey(OutsideSite, related_name='entries')
+    rank = models.PositiveSmallIntegerField(db_index=True)
+    
+    title = models.CharField(max_length=255)
+    link  = models.URLField(max_length=255, verify_exists=False)
+    date  = models.DateTimeField(db_index=True)
+    summary = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ('site', 'rank')
+        verbose_name_plural = 'blogroll entries'
+    
+    def __unicode__(self):
+        return self.title
+    
+
 def reset_feed(sender, instance, **kwargs):
     instance.update_feed()
 models.signals.post_save.connect(reset_feed, sender=OutsideSite)
@@ -5,7 +5,8 @@ import heapq
 NUM_CONSIDERED = 50
 NUM_RETURNED = 6
 
-@cache(60 * 60)
+@cache(60 * 60, local=60,
+       key=lambda request, range=NUM_CONSIDERED, num=NUM_RETURNED: '%s-%s' % (range, num))
 def popular_comments(request, range=NUM_CONSIDERED, num=NUM_RETURNED):
     return {
         'popular_comments': heapq.nlargest(num,
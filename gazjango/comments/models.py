@@ -1,5 +1,6 @@
 from django.db                          import models
 from django.conf                        import settings
+from django.core.cache                  import cache
 from django.contrib.contenttypes        import generic
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models        import Site
@@ -10,6 +11,10 @@ from gazjango.misc            import akismet
 from gazjango.misc.helpers    import is_from_swat
 
 import datetime
+import time
+
+COMMENTS_VERSION_TIMEOUT = 24 * 60 * 60
+COMMENTS_CHANGED_KEPT = 20
 
 class CommentError(Exception):
     pass
@@ -344,3 +349,74 @@ class CommentVote(models.Model):
         by = self.user.username if self.user else self.ip
         return "%+d on <comment %s> by %s" % (self.value, self.comment, by)
     
+
+
+def _comments_version_key(year, month, day, slug):
+    return "comments-version-%d-%d-%d-%s" % (int(year), int(month), int(day), slug)
+
+def _comments_changed_key(year, month, day, slug):
+    return "comments-changed-%d-%d-%d-%s" % (int(year), int(month), int(day), slug)
+
+def get_comments_version(year, month, day, slug):
+    """
+    Returns a number that goes up whenever a comment is posted on the
+    article with that date and slug, or an existing one is approved,
+    hidden or shown, so that readers can check cheaply for changes. It's
+    only kept in the cache: if it's gone missing, a new (bigger) one is
+    made up, which just means readers who had the old one check again.
+    """
+    key = _comments_version_key(year, month, day, slug)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), COMMENTS_VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+def get_changed_comments(year, month, day, slug, since):
+    """
+    Returns the numbers of the article's existing comments that have been
+    approved, hidden or shown since version `since`, as far as we still
+    remember (the last COMMENTS_CHANGED_KEPT changes).
+    """
+    changed = cache.get(_comments_changed_key(year, month, day, slug)) or []
+    return sorted(set(number for version, number in changed if version > since))
+
+def _visibility(comment):
+    "The bits of a comment that readers need to hear about changes to."
+    return (bool(comment.is_approved), bool(comment.superhidden),
+            comment.score is not None and comment.score >= 0)
+
+def remember_visibility(sender, instance, **kwargs):
+    instance._published_visibility = _visibility(instance)
+models.signals.post_init.connect(remember_visibility, sender=PublicComment)
+
+def publish_comment(sender, instance, created=False, **kwargs):
+    """
+    Bumps the comments version for the comment's article when it's new or
+    its approval or visibility has changed, so that readers pick it up;
+    other saves (votes, mostly) are left alone. Changes to existing
+    comments are also noted for get_changed_comments, since readers only
+    fetch comments numbered after the last one they've got.
+    """
+    visibility = _visibility(instance)
+    if not created and visibility == getattr(instance, '_published_visibility', None):
+        return
+    instance._published_visibility = visibility
+    
+    subject = instance.subject
+    if not hasattr(subject, 'pub_date') or not hasattr(subject, 'slug'):
+        return
+    args = (subject.pub_date.year, subject.pub_date.month, subject.pub_date.day,
+            subject.slug)
+    get_comments_version(*args) # make sure there's one to bump
+    try:
+        version = cache.incr(_comments_version_key(*args))
+    except ValueError:
+        return # evicted in between; readers will check again anyway
+    
+    if not created:
+        key = _comments_changed_key(*args)
+        changed = cache.get(key) or []
+        changed.append((version, instance.number))
+        cache.set(key, changed[-COMMENTS_CHANGED_KEPT:], COMMENTS_VERSION_TIMEOUT)
+models.signals.post_save.connect(publish_comment, sender=PublicComment)
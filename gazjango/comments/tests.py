@@ -0,0 +1,96 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from gazjango.articles.models import Article, Section
+from gazjango.comments.models import PublicComment, get_comments_version, get_changed_comments
+from gazjango.comments.models import _comments_version_key, _comments_changed_key
+
+class CommentsVersionTestCase(TestCase):
+    def setUp(self):
+        news = Section.objects.create(name="News", slug="news")
+        self.article = Article.objects.create(headline="Story", text="Text",
+                                              slug="story", section=news, format='h')
+        d = self.article.pub_date
+        self.date = (d.year, d.month, d.day)
+        cache.delete(_comments_version_key(*(self.date + ('story',))))
+        cache.delete(_comments_changed_key(*(self.date + ('story',))))
+    
+    def comment(self, number, approved=True):
+        return PublicComment.objects.create(subject=self.article, number=number,
+                                            text="Hi", user_agent="test",
+                                            is_approved=approved)
+    
+    def version(self):
+        return get_comments_version(*(self.date + ('story',)))
+    
+    def testNewComments(self):
+        before = self.version()
+        self.assertEqual(self.version(), before)
+        self.comment(1)
+        self.assertNotEqual(self.version(), before)
+    
+    def testApprovingOlderComment(self):
+        old = self.comment(1, approved=False)
+        self.comment(2)
+        before = self.version()
+        
+        old.is_approved = True
+        old.save()
+        self.assertNotEqual(self.version(), before)
+        self.assertEqual(get_changed_comments(*(self.date + ('story', before))), [1])
+        self.assertEqual(get_changed_comments(*(self.date + ('story', self.version()))), [])
+    
+    def testHiding(self):
+        comment = self.comment(1)
+        before = self.version()
+        comment = PublicComment.objects.get(pk=comment.pk)
+        comment.superhidden = True
+        comment.save()
+        self.assertNotEqual(self.version(), before)
+        self.assertEqual(get_changed_comments(*(self.date + ('story', before))), [1])
+    
+    def testVotesDontBump(self):
+        comment = self.comment(1)
+        before = self.version()
+        comment = PublicComment.objects.get(pk=comment.pk)
+        comment.score += 2
+        comment.save()
+        comment.recalculate_score()
+        self.assertEqual(self.version(), before)
+    
+    def testCacheMiss(self):
+        cache.delete(_comments_version_key(*(self.date + ('story',))))
+        self.comment(1) # nothing to bump; mustn't complain
+        after_miss = self.version()
+        self.assertNotEqual(after_miss, None)
+        self.comment(2)
+        self.assertNotEqual(self.version(), after_miss)
+    
+    def testView(self):
+        url = self.article.get_absolute_url() + 'comments/version/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, str(self.version()))
+        
+        before = self.version()
+        old = self.comment(1, approved=False)
+        self.comment(2)
+        old.is_approved = True
+        old.save()
+        response = self.client.get(url, {'since': before})
+        self.assertEqual(response.content, '%s\n1' % self.version())
+    
+    def testChangedCommentsFetched(self):
+        old = self.comment(1, approved=False)
+        self.comment(2)
+        before = self.version()
+        old.is_approved = True
+        old.save()
+        self.comment(3)
+        
+        url = self.article.get_absolute_url() + 'comments/2/'
+        content = self.client.get(url, {'since': before}).content
+        self.assert_('id="c-1"' in content)
+        self.failIf('id="c-2"' in content)
+        self.assert_('id="c-3"' in content)
+    
@@ -11,6 +11,7 @@ from gazjango.articles.models      import Article
 from gazjango.articles.views       import specific_article
 from gazjango.comments.forms       import make_comment_form
 from gazjango.comments.models      import PublicComment, CommentIsSpam
+from gazjango.comments.models      import get_comments_version, get_changed_comments
 from gazjango.misc                 import recaptcha
 from gazjango.misc.view_helpers    import get_ip, get_user_profile, is_robot
 from gazjango.misc.view_helpers    import get_by_date_or_404, boolean_arg
@@ -124,7 +125,10 @@ def comments_for_article(request, slug, year, month, day, num=None):
     """
     Returns the comments for the specified article, rendered as they are
     on article view pages, starting after number `num`. Used for after
-    you've posted an AJAX comment.
+    you've posted an AJAX comment, and when polling finds new ones.
+    
+    With a `since` version (see get_comments_version), also includes the
+    earlier comments that have been approved or shown since then.
     """
     story = get_by_date_or_404(Article, year, month, day, slug=slug)
     
@@ -132,12 +136,40 @@ def comments_for_article(request, slug, year, month, day, num=None):
     ip = get_ip(request)
     
     spec = Q(number__gt=num) if num else Q()
+    if num and 'since' in request.GET:
+        changed = get_changed_comments(year, month, day, slug,
+                                       _int_arg(request.GET['since']))
+        spec |= Q(number__in=changed)
     comments = PublicComment.objects.for_article(story, user, ip, spec=spec)
     
     rc = RequestContext(request, { 'comments': comments, 'new': True })
     return render_to_response("stories/comments.html", context_instance=rc)
 
 
+def comments_version(request, slug, year, month, day):
+    """
+    Returns the article's comments version (see get_comments_version),
+    for readers to poll: when it changes, they fetch the comments after
+    the last one they've got. Given the reader's old version as `since`,
+    a second line lists the numbers of earlier comments that have changed
+    since, which they should fetch again or, if they don't come back
+    (because they've been hidden), take out. This only looks in the cache,
+    so it's cheap to ask often.
+    """
+    lines = [str(get_comments_version(year, month, day, slug))]
+    if 'since' in request.GET:
+        since = _int_arg(request.GET['since'])
+        changed = get_changed_comments(year, month, day, slug, since)
+        lines.append(','.join(str(number) for number in changed))
+    return HttpResponse('\n'.join(lines), mimetype='text/plain')
+
+def _int_arg(value):
+    try:
+        return int(value)
+    except ValueError:
+        raise Http404
+
+
 def _get_comment_or_404(year, month, day, slug, num):
     try:
         return PublicComment.objects.get(article__pub_date__year=year,
@@ -23,4 +23,8 @@ class FlickrPhotoAdmin(admin.ModelAdmin):
     date_hierarchy = 'uploaded_at'
 
 admin.site.register(FlickrPhoto, FlickrPhotoAdmin)
-admin.site.register(Entry, EntryAdmin)
\ No newline at end of file
+admin.site.register(Entry, EntryAdmin)
+class SourceCursorAdmin(admin.ModelAdmin):
+    list_display = ('source', 'account', 'last_id', 'last_timestamp', 'updated',)
+
+admin.site.register(SourceCursor, SourceCursorAdmin)
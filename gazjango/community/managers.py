@@ -1,7 +1,6 @@
 from django.db import models
 
 import datetime
-from operator import attrgetter
 
 class EntryManager(models.Manager):
     def get_of_type_for_user(self, types, usernames):
@@ -64,29 +63,94 @@ class PublishedEntryManager(EntryManager):
         get_entries(num=5, tweet=5, flickrphoto=5, others=0) will give you the
         5 most recent entries which are either tweets or flickrphotos.
         '''
-        base = (base or self).order_by('-timestamp')
-        entries = []
-
+        base = (base or self).order_by('-timestamp', '-id')
+        
         sum_kwargs = sum(kwargs.itervalues())
         if num is None:
             if not kwargs:
                 return []
             else:
                 num = sum_kwargs
-
-        for kind, kind_num in kwargs.iteritems():
-            if kind != 'others':
-                entries.extend(base.filter(source_type=kind)[:kind_num])
-
+        
+        quotas = dict((kind, kind_num) for kind, kind_num in kwargs.iteritems()
+                      if kind != 'others')
         if ('others' in kwargs) or (not kwargs) or (sum_kwargs < num):
-            if kwargs.get('others', -1) != 0:
-                exc_types = [k for k in kwargs.keys() if k != 'others']
-                entries.extend(base.exclude(source_type__in=exc_types)[:num])
-
-        # this is actually faster than heapq.nlargest for numbers we deal with
-        return sorted(entries, key=attrgetter('timestamp'), reverse=True)[:num]
+            others = kwargs.get('others', num)
+        else:
+            others = 0
+        
+        if others:
+            base = base.exclude(source_type__in=[k for k, n in quotas.iteritems() if not n])
+        else:
+            base = base.filter(source_type__in=[k for k, n in quotas.iteritems() if n])
+        
+        # Going newest first and taking each entry if its kind still has
+        # room gives the same entries as taking the newest of each kind and
+        # then the newest of those, but usually out of the first window.
+        window = max(3 * num, 20)
+        batch = list(base[:window])
+        entries, left, others_left = self._pick(batch, num, quotas, others)
+        
+        if len(entries) < num and len(batch) == window:
+            # Some kind is rare enough not to have filled up; rather than
+            # paging back through (say) years of tweets, get the newest of
+            # each kind that's short directly, and pick again from those.
+            extra = []
+            for kind, kind_num in quotas.iteritems():
+                if left[kind]:
+                    extra.extend(base.filter(source_type=kind)[:kind_num])
+            if others_left:
+                extra.extend(base.exclude(source_type__in=quotas.keys())[:others])
+            
+            seen = set(entry.pk for entry in batch)
+            batch.extend(entry for entry in extra if entry.pk not in seen)
+            batch.sort(key=lambda entry: (entry.timestamp, entry.pk), reverse=True)
+            entries = self._pick(batch, num, quotas, others)[0]
+        
+        self.load_objects(entries)
+        return entries
+    
+    def _pick(self, candidates, num, quotas, others):
+        """
+        Takes up to `num` of `candidates` (newest first), no more than
+        `quotas[kind]` of each kind in `quotas` or `others` of any other
+        kind. Returns the entries and what's left of the quotas.
+        """
+        left = dict(quotas)
+        entries = []
+        for entry in candidates:
+            if len(entries) == num:
+                break
+            if entry.source_type in left:
+                if not left[entry.source_type]:
+                    continue
+                left[entry.source_type] -= 1
+            elif others:
+                others -= 1
+            else:
+                continue
+            entries.append(entry)
+        return entries, left, others
+    
+    def load_objects(self, entries):
+        """
+        Loads the Tweet, FlickrPhoto, etc for each of `entries` with one
+        query per kind, so that using `entry.object` doesn't need another
+        query for each entry.
+        """
+        subclasses = dict((cls.__name__.lower(), cls) for cls in self.model.__subclasses__())
+        by_kind = {}
+        for entry in entries:
+            by_kind.setdefault(entry.source_type, []).append(entry)
+        
+        for kind, kind_entries in by_kind.iteritems():
+            if kind not in subclasses:
+                continue
+            objects = subclasses[kind]._default_manager.in_bulk([e.pk for e in kind_entries])
+            for entry in kind_entries:
+                if entry.pk in objects:
+                    entry._object = objects[entry.pk]
     
-
     def get_photos(self, base=None, num=3):
         base = (base or self).order_by('-timestamp')
         return base.filter(source_type='flickrphoto')[:num]
@@ -96,6 +160,13 @@ class PublishedEntryManager(EntryManager):
         return base.filter(source_type='tweet')[:num]
 
 
+class SourceCursorManager(models.Manager):
+    def for_account(self, source, account):
+        "Returns the cursor for `account` on `source`, making it if need be."
+        cursor, created = self.get_or_create(source=source, account=account)
+        return cursor
+    
+
 class TweetsManager(PublishedEntryManager):
     "A manager for tweets only."
     
@@ -3,7 +3,7 @@ import datetime
 from django.db import models
 from django.db.models import permalink
 
-from gazjango.community.managers import EntryManager, PublishedEntryManager
+from gazjango.community.managers import EntryManager, PublishedEntryManager, SourceCursorManager
 from gazjango.community.sources import import_source_modules
 
 class Entry(models.Model):
@@ -46,6 +46,44 @@ class Entry(models.Model):
     
     @property
     def object(self):
-        return getattr(self, self.source_type)
+        if not hasattr(self, '_object'):
+            self._object = getattr(self, self.source_type)
+        return self._object
+
+class SourceCursor(models.Model):
+    """
+    How far we've got with one account on one source: the id or the time
+    of the newest item we've stored from it, so the next retrieval can ask
+    for (or skip to) just what's come in since.
+    """
+    source  = models.CharField(max_length=50)
+    account = models.CharField(max_length=200)
+    
+    last_id        = models.BigIntegerField(null=True, blank=True)
+    last_timestamp = models.DateTimeField(null=True, blank=True)
+    updated        = models.DateTimeField(auto_now=True)
+    
+    objects = SourceCursorManager()
+    
+    class Meta:
+        unique_together = [('source', 'account'),]
+    
+    def __unicode__(self):
+        return u"%s: %s" % (self.source, self.account)
+    
+    def is_new(self):
+        "Whether we've never got anything from this account before."
+        return self.last_id is None and self.last_timestamp is None
+    
+    def advance(self, last_id=None, last_timestamp=None):
+        "Moves the cursor forward (never back) and saves it."
+        if last_id is not None and \
+           (self.last_id is None or last_id > self.last_id):
+            self.last_id = last_id
+        if last_timestamp is not None and \
+           (self.last_timestamp is None or last_timestamp > self.last_timestamp):
+            self.last_timestamp = last_timestamp
+        self.save()
+    
 
 import_source_modules()
@@ -1,36 +1,58 @@
 #!/usr/bin/evn python
 
 from django.conf import settings
+from django.db import connection
 from gazjango.community.sources import *
 import logging
 import sys
 import optparse
+import threading
+import traceback
 
 log = logging.getLogger('community.retrieve')
 
-def retrieve_data_updates(opts=None, args=None):
+class Retrieval(threading.Thread):
+    """
+    Pulls one account's new items from one source, in its own thread, so
+    that the sources (and accounts) are all fetched at once instead of each
+    waiting on the one before.
+    """
+    def __init__(self, source, force, args):
+        self.base_name = source.__name__[source.__name__.rfind('.')+1:]
+        threading.Thread.__init__(self, name='%s:%s' % (self.base_name, args['account']))
+        self.setDaemon(True)
+        self.source = source
+        self.force = force
+        self.args = args
+        self.error = None
+
+    def run(self):
+        log.info('using %s account: %s', self.base_name, self.args['account'])
+        try:
+            self.source.retrieve(self.force, **self.args)
+        except Exception:
+            self.error = traceback.format_exc()
+            log.error('error updating %s:\n%s', self.getName(), self.error)
+        finally:
+            connection.close()
+        log.info('done updating %s', self.getName())
+
+
+def retrieve_sources(sources=None, force=False):
+    """
+    Updates each account on each of `sources` (by default, all of them in
+    AGRO_SETTINGS), all at the same time. Returns the Retrieval threads,
+    once they've finished.
+    """
+    if sources is None:
+        sources = settings.AGRO_SETTINGS['source_list']
     log.info('starting to update sources')
-    sources = settings.AGRO_SETTINGS['source_list']
-
-    if args and len(args) > 1:
-        sources = args[1:]
-        for source in sources:
-            if source not in settings.AGRO_SETTINGS['source_list']:
-                log.warning('%s is not a valid source, removing from update list.', source)
-                sources.remove(source)
-
-    args = {}
-    force_run = False
-    if hasattr(opts, 'force'):
-        if opts.force == True:
-            force_run = True
 
+    retrievals = []
     for s in import_source_modules(source_list=sources, class_name='retrieve'):
-        log.info('')
-        log.info('trying to update %s', s.__name__)
-
         base_name = s.__name__[s.__name__.rfind('.')+1:]
 
+        args = {}
         if base_name in settings.AGRO_SETTINGS['api_keys'].keys():
             args['api_key'] = settings.AGRO_SETTINGS['api_keys'][base_name]
 
@@ -40,23 +62,34 @@ def retrieve_data_updates(opts=None, args=None):
             log.error('no credentials for %s', base_name)
             continue
 
-        if isinstance(account, (tuple, list)):
-            for a in account:
-                args['account'] = a
-                log.info('using %s account: %s', base_name, args['account'])
-                s.retrieve(force_run, **args)
-        else:
-            args['account'] = account
-            log.info('using %s account: %s', base_name, args['account'])
-            s.retrieve(force_run, **args)
+        if not isinstance(account, (tuple, list)):
+            account = [account]
+        for a in account:
+            retrievals.append(Retrieval(s, force, dict(args, account=a)))
+
+    for retrieval in retrievals:
+        retrieval.start()
+    for retrieval in retrievals:
+        retrieval.join()
+    return retrievals
+
+def retrieve_data_updates(opts=None, args=None):
+    sources = None
+    if args and len(args) > 1:
+        sources = []
+        for source in args[1:]:
+            if source in settings.AGRO_SETTINGS['source_list']:
+                sources.append(source)
+            else:
+                log.warning('%s is not a valid source, removing from update list.', source)
 
-        log.info('done updating %s', s.__name__)
-        log.info('')
+    force_run = bool(getattr(opts, 'force', False))
+    return retrieve_sources(sources, force_run)
 
 
 def _print_sources():
     print 'your sources:'
-    for s in settings.SETTINGS['source_list']:
+    for s in settings.AGRO_SETTINGS['source_list']:
         print ' -', s
 
 if __name__ == '__main__':
@@ -1,7 +1,7 @@
 from django.db import models
 from django.contrib import admin
 from gazjango.community.sources import utils
-from gazjango.community.models import Entry
+from gazjango.community.models import Entry, SourceCursor
 from django.template import Template
 import datetime
 import logging
@@ -34,39 +34,62 @@ def retrieve(force, **args):
     url = "http://feeds.delicious.com/v2/json/tag/%s" % tag
     rformat = 'json'
 
+    cursor = SourceCursor.objects.for_account('delicious', tag)
     last_update = datetime.datetime.fromtimestamp(0)
     if force:
         if password:
             url = "https://api.del.icio.us/v1/posts/all"
             rformat = "rss"
         log.info("Forcing update of all bookmarks available.")
+    elif not cursor.is_new():
+        last_update = cursor.last_timestamp
     else:
         try:
             last_update = Bookmark.objects.filter(owner_user="tag/"+tag).order_by('-timestamp')[0].timestamp
-        except Exception, e:
-            log.debug('%s', e)
+        except IndexError:
+            pass
 
     if force and password:
-        marks = utils.get_remote_data(url, rformat=rformat, username=username, password=password)
+        marks = utils.get_remote_data(url, rformat=rformat, username=tag, password=password)
     else:
         marks = utils.get_remote_data(url, rformat=rformat)
 
-    if marks:
+    if not marks:
+        return
+
+    if password and force:
         for mark in marks:
-            if password and force:
-                _handle_rss_bookmark(mark, tag)
-                continue
-            dt = utils.parsedate(mark['dt']) 
-            if dt > last_update:
-                _handle_bookmark(mark, dt, tag)
-            else:
-                log.warning("No more bookmarks, stopping...")
-                break
-
-def _handle_bookmark(mark, dt, tag):
+            _handle_rss_bookmark(mark, tag)
+        return
+
+    new = []
+    for mark in marks:
+        dt = utils.parsedate(mark['dt'])
+        if dt > last_update:
+            new.append(_make_bookmark(mark, dt, tag))
+        else:
+            log.info("No more bookmarks, stopping...")
+            break
+    if not new:
+        return
+
+    # skip anything that would break Entry's unique_together, whoever's
+    # it is, since one IntegrityError loses the whole batch (and the cursor
+    # wouldn't move, so it'd happen again next time)
+    seen = set(Entry.objects.filter(source_type='bookmark', title__in=[b.title for b in new])
+                            .values_list('title', 'timestamp'))
+    unsaved = []
+    for bookmark in new:
+        if (bookmark.title, bookmark.timestamp) not in seen:
+            seen.add((bookmark.title, bookmark.timestamp))
+            unsaved.append(bookmark)
+    utils.save_all(unsaved)
+    cursor.advance(last_timestamp=max(b.timestamp for b in new))
+
+def _make_bookmark(mark, dt, tag):
     log.info("working with bookmark => %s" % mark['d'])
 
-    bookmark, created = Bookmark.objects.get_or_create(
+    return Bookmark(
         timestamp   = dt,
         url         = mark['u'],
         title       = mark['d'],
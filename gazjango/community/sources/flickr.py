@@ -10,7 +10,7 @@ from django.utils.encoding import smart_unicode
 from django.template import Template
 
 from gazjango.community.sources import utils
-from gazjango.community.models import Entry
+from gazjango.community.models import Entry, SourceCursor
 
 log = logging.getLogger('community.sources.flickr')
 
@@ -84,18 +84,22 @@ def retrieve(force, **args):
     username, user_id = args['account']
     flickr = FClient(args['api_key'])
 
+    cursor = SourceCursor.objects.for_account('flickr', username)
     last_update = datetime.fromtimestamp(0)
     if force:
         log.info("Forcing update of all available photos")
+    elif not cursor.is_new():
+        last_update = cursor.last_timestamp
     else:
         try:
             last_update = FlickrPhoto.objects.filter(owner_user=username) \
                                      .order_by('-uploaded_at')[0].uploaded_at
-        except Exception, e:
-            log.debug("%s", e)
+        except IndexError:
+            pass
 
     log.debug('last update: %s', last_update)
     page = 1
+    updated = []
 
     while True:
         res = flickr.exe_method(
@@ -115,7 +119,7 @@ def retrieve(force, **args):
             photo_up_time = datetime.fromtimestamp(float(photo['lastupdate']))
             if last_update <= photo_up_time:
                 log.debug('current photo upload time: %s', photo_up_time)
-                _handle_photo(flickr, photo, username)
+                updated.append((photo, photo_up_time))
             else:
                 break
         page += 1
@@ -124,6 +128,16 @@ def retrieve(force, **args):
             log.info('no more photos')
             break
 
+    if not updated:
+        return
+
+    existing = dict((p.photo_id, p) for p in
+                    FlickrPhoto.objects.filter(photo_id__in=[photo['id'] for photo, t in updated]))
+    photos = [_handle_photo(flickr, photo, username, existing.get(photo['id']))
+              for photo, t in updated]
+    utils.save_all([p for p in photos if p is not None])
+    cursor.advance(last_timestamp=max(t for photo, t in updated))
+
 class FClient(object):
     def __init__(self, api_key):
         self.api_key = api_key
@@ -177,17 +191,20 @@ class FClient(object):
             dictionary['api_sig'] = self.sign(dictionary)
         return urllib.urlencode(dictionary)
 
-def _handle_photo(flickr_obj, photo, user):
+def _handle_photo(flickr_obj, photo, user, photo_obj=None):
+    """
+    Fills in `photo_obj` (or a new FlickrPhoto, if we haven't got it yet)
+    from the pool listing and the photo's info, without saving it; returns
+    None if that info can't be had.
+    """
     photo_id        = photo['id']
 
     log.info('working with photo => id: %s', photo_id)
 
     try:
         info = flickr_obj.exe_method('photos.getInfo', photo_id=photo_id)['photo']
-        photo_obj, created = FlickrPhoto.objects.get_or_create(
-            photo_id    = photo_id,
-            timestamp   = datetime.fromtimestamp(utils.safeint(info["dates"]["posted"]))
-        )
+        if photo_obj is None:
+            photo_obj = FlickrPhoto(photo_id=photo_id)
 
         photo_obj.taken_at    = photo['datetaken']
         photo_obj.source_type = "flickrphoto"
@@ -203,9 +220,10 @@ def _handle_photo(flickr_obj, photo, user):
         photo_obj.title = smart_unicode(photo['title'])
         photo_obj.description = smart_unicode(info['description']['_content'])
         photo_obj.num_comments = utils.safeint(info["comments"]["_content"])
-        photo_obj.save()
+        return photo_obj
     except Exception, e:
         log.error('%s' % e)
+        return None
 
 
 def make_utf8(dictionary):
@@ -3,7 +3,7 @@ from django.db import models
 from django.contrib import admin
 from django.utils.encoding import smart_unicode
 from gazjango.community.sources import utils
-from gazjango.community.models import Entry
+from gazjango.community.models import Entry, SourceCursor
 from django.template import Template
 import logging
 import re
@@ -46,109 +46,90 @@ def retrieve(force, **args):
     if isinstance(username, tuple):
         username, password = username
 
-    search = True
-    user = False
-    force = False
     search_term = "swarthmore"
-    
-    if search:
-        print "[community.sources.twitter | INFO]: Working with Search"
-        url = "http://search.twitter.com/search.json?q=%s" % search_term
-        last_id = 0
-
-        if force:
-            log.info("Forcing update of all tweets available.")
-        else:
-            try:
-                last_id = Tweet.objects.order_by('-tweet_id')[0].tweet_id
-            except Exception, e:
-                log.debug('%s', e)
-        log.debug("Last id processed: %s", last_id)
-
-        tweets = utils.get_remote_data(url, rformat="json")
-
-        if not tweets:
-            log.warning('no tweets returned, twitter possibly overloaded.')
-            return
-            
-        tweets = tweets['results']
-        for t in tweets:
-            curr_id = t['id']
-            if curr_id > last_id:
-                log.info("Working with %s.", t['id'])
-
-                tweet_text = t['text']
-                tweet_text = re.sub(r'@((?:\w|\.(?=\w))+)',r'<a href="http://www.twitter.com/\1/">\1</a>',tweet_text)
-                tweet_text = tweet_text.replace("@","&#64;")
-                owner_user = smart_unicode(t['from_user'])
-                url = "http://twitter.com/%s/statuses/%s" % (owner_user, t['id'])
-                icon = t['profile_image_url'].replace("_normal","_bigger",1)
-            
-                tweet, created = Tweet.objects.get_or_create(
-                        title       = str(curr_id) + " " + tweet_text[:50],
-                        description = tweet_text,
-                        tweet_id    = curr_id, 
-                        timestamp   = utils.parsedate(t['created_at']),
-                        source_type = "tweet",
-                        owner_user  = owner_user,
-                        url         = url,
-                        icon        = icon,
-                )
-            
-                tweet.source      = smart_unicode(t['source'])
-            
-            else:
-                log.warning("No more tweets, stopping...")
-                break        
-    
-    print "[community.sources.twitter | INFO]: Working with Users"
+
+    log.info("Working with Search")
+    url = "http://search.twitter.com/search.json?q=%s" % search_term
+    cursor, last_id = _start('search/%s' % search_term, Tweet.objects.all(), force)
+    results = utils.get_remote_data(_since(url, last_id), rformat="json")
+    if results:
+        _store(cursor, last_id, [_make_tweet(t, t['from_user'], t['profile_image_url'])
+                                 for t in results['results']])
+    else:
+        log.warning('no tweets returned, twitter possibly overloaded.')
+
+    log.info("Working with Users")
     url = "http://twitter.com/statuses/user_timeline/%s.json" % username
-    last_id = 0
+    cursor, last_id = _start(username, Tweet.objects.filter(owner_user=username), force)
+    tweets = utils.get_remote_data(_since(url, last_id), rformat="json",
+                                   username=username, password=password)
+    if tweets:
+        _store(cursor, last_id, [_make_tweet(t, t['user']['screen_name'], t['user']['profile_image_url'])
+                                 for t in tweets])
+    else:
+        log.warning('no tweets returned, twitter possibly overloaded.')
 
+def _start(account, existing, force):
+    """
+    Returns the cursor for `account` and the id of the last tweet we've got
+    from it (0 if we're forcing an update of everything). The first time
+    round, that comes from the tweets already in `existing`.
+    """
+    cursor = SourceCursor.objects.for_account('twitter', account)
+    last_id = 0
     if force:
         log.info("Forcing update of all tweets available.")
+    elif not cursor.is_new():
+        last_id = cursor.last_id
     else:
         try:
-            last_id = Tweet.objects.filter(owner_user=username).order_by('-tweet_id')[0].tweet_id
-        except Exception, e:
-            log.debug('%s', e)
+            last_id = existing.order_by('-tweet_id')[0].tweet_id
+        except IndexError:
+            pass
     log.debug("Last id processed: %s", last_id)
-
-    if not password:
-        tweets = utils.get_remote_data(url, rformat="json", username=username)
-    else:
-        tweets = utils.get_remote_data(url, rformat="json", username=username, password=password)
-
+    return cursor, last_id
+
+def _since(url, last_id):
+    if not last_id:
+        return url
+    return "%s%ssince_id=%d" % (url, '&' if '?' in url else '?', last_id)
+
+def _make_tweet(t, owner_user, icon):
+    tweet_text = t['text']
+    tweet_text = re.sub(r'@((?:\w|\.(?=\w))+)',r'<a href="http://www.twitter.com/\1/">\1</a>',tweet_text)
+    tweet_text = tweet_text.replace("@","&#64;")
+    owner_user = smart_unicode(owner_user)
+
+    return Tweet(
+        title       = str(t['id']) + " " + tweet_text[:50],
+        description = tweet_text,
+        tweet_id    = t['id'],
+        timestamp   = utils.parsedate(t['created_at']),
+        source_type = "tweet",
+        owner_user  = owner_user,
+        url         = "http://twitter.com/%s/statuses/%s" % (owner_user, t['id']),
+        icon        = icon.replace("_normal","_bigger",1),
+        source      = smart_unicode(t['source']),
+    )
+
+def _store(cursor, last_id, tweets):
+    """
+    Saves the tweets in `tweets` newer than `last_id` that we haven't got
+    already, all at once, and moves `cursor` up to the newest.
+    """
+    tweets = [t for t in tweets if t.tweet_id > last_id]
     if not tweets:
-        log.warning('no tweets returned, twitter possibly overloaded.')
+        log.info("No new tweets.")
         return
 
-    for t in tweets:
-        if t['id'] > last_id:
-            log.info("Working with %s.", t['id'])
-            
-            tweet_text = t['text']
-            tweet_text = re.sub(r'@((?:\w|\.(?=\w))+)',r'<a href="http://www.twitter.com/\1/">\1</a>',tweet_text)
-            tweet_text = tweet_text.replace("@","&#64;")
-            owner_user = smart_unicode(t['user']['screen_name'])
-            url = "http://twitter.com/%s/statuses/%s" % (owner_user, t['id'])
-            icon = t['user']['profile_image_url'].replace("_normal","bigger",1)
-        
-            tweet, created = Tweet.objects.get_or_create(
-                    title       = str(curr_id) + " " + tweet_text[:50],
-                    description = tweet_text,
-                    tweet_id    = curr_id, 
-                    timestamp   = utils.parsedate(t['created_at']),
-                    source_type = "tweet",
-                    owner_user  = owner_user,
-                    url         = url,
-                    icon        = icon,
-            )
-        
-            tweet.source      = smart_unicode(t['source'])
-    
-        else:
-            log.warning("No more tweets, stopping...")
-            break
+    ids = [t.tweet_id for t in tweets]
+    seen = set(Tweet.objects.filter(tweet_id__in=ids).values_list('tweet_id', flat=True))
+    new = []
+    for tweet in tweets:
+        if tweet.tweet_id not in seen:
+            seen.add(tweet.tweet_id)
+            new.append(tweet)
+    utils.save_all(new)
+    cursor.advance(last_id=max(ids))
 
 admin.site.register(Tweet, TweetAdmin)
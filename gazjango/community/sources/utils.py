@@ -3,6 +3,7 @@ from gazjango.misc.dateutil import parser
 from gazjango.misc.dateutil import tz
 import logging
 from gazjango.community.sources import *
+from django.db import transaction
 from django.utils import simplejson
 from django.utils.encoding import force_unicode
 
@@ -49,3 +50,13 @@ def safeint(s):
         return int(force_unicode(s))
     except (ValueError, TypeError):
         return 0
+
+@transaction.commit_on_success
+def save_all(objects):
+    """
+    Saves a batch of new entries in one transaction, rather than
+    committing after each of them.
+    """
+    for obj in objects:
+        obj.save()
+    log.info('saved %d new entries', len(objects))
@@ -0,0 +1,94 @@
+from django.test import TestCase
+
+from gazjango.community.models import Entry, SourceCursor
+from gazjango.community.sources import delicious
+from gazjango.community.sources.delicious import Bookmark
+from gazjango.community.sources.flickr import FlickrPhoto
+from gazjango.community.sources.twitter import Tweet
+
+import datetime
+
+class GetEntriesTestCase(TestCase):
+    def setUp(self):
+        self.now = datetime.datetime.now()
+        self.age = 0
+        # lots of tweets, then a few of everything else further back than
+        # the first window goes
+        self.tweets = [self.make(Tweet, 'tweet') for i in range(30)]
+        self.bookmarks = [self.make(Bookmark, 'bookmark') for i in range(2)]
+        self.photos = [self.make(FlickrPhoto, 'flickrphoto', photo_id='1')]
+    
+    def make(self, model, kind, **kwargs):
+        self.age += 1
+        return model.objects.create(title="%s %d" % (kind, self.age), source_type=kind,
+                                    timestamp=self.now - datetime.timedelta(minutes=self.age),
+                                    **kwargs)
+    
+    def get(self, **kwargs):
+        return [e.pk for e in Entry.published.get_entries(**kwargs)]
+    
+    def pks(self, entries):
+        return [e.pk for e in entries]
+    
+    def testNewest(self):
+        self.assertEqual(self.get(num=5), self.pks(self.tweets[:5]))
+    
+    def testQuotaLeavesRoomForOthers(self):
+        # the non-tweets are all older than the first window
+        self.assertEqual(self.get(num=7, tweet=3),
+                         self.pks(self.tweets[:3] + self.bookmarks + self.photos))
+    
+    def testQuotas(self):
+        self.assertEqual(self.get(tweet=2, bookmark=1, flickrphoto=1),
+                         self.pks(self.tweets[:2] + self.bookmarks[:1] + self.photos))
+    
+    def testOthersCap(self):
+        self.assertEqual(self.get(tweet=2, others=1),
+                         self.pks(self.tweets[:2] + self.bookmarks[:1]))
+        self.assertEqual(self.get(num=10, tweet=2, others=2),
+                         self.pks(self.tweets[:2] + self.bookmarks))
+    
+    def testNoOthers(self):
+        self.assertEqual(self.get(num=5, tweet=2, flickrphoto=5, others=0),
+                         self.pks(self.tweets[:2] + self.photos))
+    
+    def testLoadObjects(self):
+        entries = Entry.published.get_entries(num=7, tweet=3)
+        for entry in entries:
+            self.assert_(hasattr(entry, '_object'))
+            self.assertEqual(entry.object.pk, entry.pk)
+            self.assertEqual(type(entry.object).__name__.lower(), entry.source_type)
+    
+    def testLoadObjectsSkipsUnknownKinds(self):
+        post = Entry.objects.create(title="Post", source_type='post',
+                                    timestamp=self.now)
+        Entry.published.load_objects([post])
+        self.failIf(hasattr(post, '_object'))
+    
+
+class DeliciousTestCase(TestCase):
+    def setUp(self):
+        self.marks = []
+        self.old_get = delicious.utils.get_remote_data
+        delicious.utils.get_remote_data = lambda url, **kwargs: self.marks
+    
+    def tearDown(self):
+        delicious.utils.get_remote_data = self.old_get
+    
+    def mark(self, title, dt, url='http://example.com/'):
+        return {'d': title, 'dt': dt, 'u': url, 'n': ''}
+    
+    def testSkipsTitleCollisions(self):
+        # somebody else's bookmark with the same title and time
+        Bookmark.objects.create(title="Same", url='http://other.com/', owner_user="tag/other",
+                                source_type='bookmark',
+                                timestamp=datetime.datetime(2009, 10, 1, 12, 0))
+        self.marks = [self.mark("New", '2009-10-02T12:00:00', 'http://new.com/'),
+                      self.mark("Same", '2009-10-01T12:00:00'),
+                      self.mark("Same", '2009-10-01T12:00:00')]
+        delicious.retrieve(False, account='swat')
+        
+        self.assertEqual(Bookmark.objects.filter(owner_user="tag/swat").count(), 1)
+        cursor = SourceCursor.objects.for_account('delicious', 'swat')
+        self.assertEqual(cursor.last_timestamp, datetime.datetime(2009, 10, 2, 12, 0))
+    
@@ -1,7 +1,7 @@
 from gazjango.issues.models import Weather, WeatherJoke
 from gazjango.misc.helpers import cache
 
-@cache(60*60)
+@cache(60*60, key=lambda request: '', local=60)
 def weather_joke(request):
     return {
         'weather': Weather.objects.for_today(),
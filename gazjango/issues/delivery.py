@@ -0,0 +1,245 @@
+"""
+Sends a lot of email at once, over a pool of SMTP connections.
+
+The mailing commands hand a DeliveryEngine a stream of Deliveries; it spreads
+them over its connections, retries the ones that hit a flaky server (backing
+off as it does so), and reports back on each one as it goes.
+"""
+
+from django.core.mail import SMTPConnection
+from email.Utils      import make_msgid
+
+import itertools
+import Queue
+import smtplib
+import socket
+import sys
+import threading
+import time
+
+def classify_error(exc):
+    """
+    Returns (kind, retry) for an exception raised while sending: a short
+    description, and whether it's worth reconnecting and trying again.
+    """
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return 'recipient refused', False
+    elif isinstance(exc, smtplib.SMTPServerDisconnected):
+        return 'server disconnected', True
+    elif isinstance(exc, smtplib.SMTPResponseException):
+        # 4xx responses are the server asking us to come back later
+        return 'smtp error %s' % exc.smtp_code, 400 <= exc.smtp_code < 500
+    elif isinstance(exc, smtplib.SMTPException):
+        return 'smtp error', False
+    elif isinstance(exc, socket.sslerror):
+        return 'ssl error', True # probably timeout
+    elif isinstance(exc, socket.timeout):
+        return 'timeout', True
+    elif isinstance(exc, socket.error):
+        return 'socket error', True
+    else:
+        return 'generic error', False
+
+
+def smtp_response(exc):
+    """
+    Returns (code, message) for the server's reply behind `exc`, or
+    (None, '') if the server didn't get a word in.
+    """
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return exc.smtp_code, exc.smtp_error
+    elif isinstance(exc, smtplib.SMTPRecipientsRefused) and exc.recipients:
+        return exc.recipients.values()[0]
+    else:
+        return None, ''
+
+
+class MessageTemplate(object):
+    """
+    An EmailMessage that's going to lots of people, serialized just once.
+    Only the To and Message-ID headers differ between recipients, so those
+    are the only bits put together per message.
+    """
+    PER_RECIPIENT_HEADERS = ('to', 'message-id')
+
+    def __init__(self, message):
+        self.from_email = message.from_email
+        message.to = ['recipient@example.invalid']
+        headers, self.body = message.message().as_string().split('\n\n', 1)
+
+        kept = []
+        skipping = False
+        for line in headers.split('\n'):
+            if line[:1] in (' ', '\t'): # continuation of the previous header
+                if not skipping:
+                    kept.append(line)
+            else:
+                name = line.split(':', 1)[0].strip().lower()
+                skipping = name in self.PER_RECIPIENT_HEADERS
+                if not skipping:
+                    kept.append(line)
+        self.headers = '\n'.join(kept)
+
+        # make_msgid looks up our hostname, which can be slow; do it once
+        # and count up from there
+        base = make_msgid()
+        self.msgid_format = base[:base.index('@')] + '.%d' + base[base.index('@'):]
+        self.msgid_counter = itertools.count()
+
+    def render(self, to):
+        msgid = self.msgid_format % self.msgid_counter.next()
+        return '%s\nTo: %s\nMessage-ID: %s\n\n%s' % (self.headers, to, msgid, self.body)
+
+    def for_recipient(self, to):
+        return Envelope(self, to)
+
+
+class Envelope(object):
+    "A MessageTemplate addressed to one person."
+    def __init__(self, template, to):
+        self.template = template
+        self.to = to
+
+    def send(self, connection):
+        connection.connection.sendmail(self.template.from_email, [self.to],
+                                       self.template.render(self.to))
+
+
+class Delivery(object):
+    """
+    One message on its way to one recipient. `key` is whatever the caller
+    wants to get back with the result (a Subscriber, say); `attempts` counts
+    how many times we've tried to send it, and `started` and `finished` are
+    when the first try began and the latest one ended. If any try failed,
+    `last_error` is (kind, exc_info) for the latest failure.
+    """
+    def __init__(self, key, message):
+        self.key = key
+        self.message = message
+        self.attempts = 0
+        self.started = self.finished = None
+        self.last_error = None
+
+
+class DeliveryEngine(object):
+    """
+    Sends Deliveries over `num_connections` SMTP connections at once, each
+    in its own thread and each kept open for as many messages as it can take.
+
+    When sending fails in a way that might go away (the server hanging up on
+    us, a timeout, a 4xx response), that connection waits a bit -- longer
+    each time it happens in a row, up to `max_backoff` seconds -- reconnects,
+    and tries the message again, up to `max_attempts` times in all.
+
+    `connection_factory` makes the connections; by default that's Django's
+    SMTPConnection with the usual EMAIL_* settings.
+    """
+    def __init__(self, num_connections=4, max_attempts=4, backoff_base=2,
+                 max_backoff=60, connection_factory=SMTPConnection):
+        self.num_connections = num_connections
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.connection_factory = connection_factory
+
+    def send(self, deliveries):
+        """
+        Sends each of `deliveries` (which can be any iterable, and is only
+        read as fast as the connections can keep up), yielding the outcome
+        of every attempt as (delivery, error): error is None if it went
+        through, and otherwise (kind, exc_info, final), with `final` true
+        if we've given up on it.
+        """
+        self.work = Queue.Queue(maxsize=self.num_connections * 10)
+        self.results = Queue.Queue()
+        workers = [threading.Thread(target=self._work)
+                   for i in range(self.num_connections)]
+        for worker in workers:
+            worker.setDaemon(True)
+            worker.start()
+
+        self.outstanding = 0
+        try:
+            for delivery in deliveries:
+                while True:
+                    try:
+                        self.work.put(delivery, timeout=0.1)
+                        break
+                    except Queue.Full:
+                        for result in self._collect(block=False):
+                            yield result
+                self.outstanding += 1
+                for result in self._collect(block=False):
+                    yield result
+
+            while self.outstanding:
+                for result in self._collect(block=True):
+                    yield result
+        finally:
+            for worker in workers:
+                self.work.put(None)
+            for worker in workers:
+                worker.join()
+
+    def _collect(self, block):
+        while True:
+            try:
+                delivery, error = self.results.get(block=block)
+            except Queue.Empty:
+                return
+            if error is None or error[2]:
+                self.outstanding -= 1
+            yield delivery, error
+            if block:
+                return
+
+    def _work(self):
+        connection = None
+        failures_in_a_row = 0
+        retries = []
+
+        while True:
+            if retries:
+                delivery = retries.pop(0)
+            else:
+                delivery = self.work.get()
+                if delivery is None:
+                    break
+
+            delivery.attempts += 1
+            if delivery.started is None:
+                delivery.started = time.time()
+            try:
+                if connection is None:
+                    connection = self.connection_factory()
+                    connection.open()
+                if isinstance(delivery.message, Envelope):
+                    delivery.message.send(connection)
+                else:
+                    connection.send_messages([delivery.message])
+            except Exception:
+                exc_info = sys.exc_info()
+                delivery.finished = time.time()
+                kind, retry = classify_error(exc_info[1])
+                delivery.last_error = (kind, exc_info)
+                final = not retry or delivery.attempts >= self.max_attempts
+                self.results.put((delivery, (kind, exc_info, final)))
+
+                if retry:
+                    if connection is not None:
+                        connection.fail_silently = True
+                        connection.close()
+                        connection = None
+                    failures_in_a_row += 1
+                    time.sleep(min(self.backoff_base ** failures_in_a_row,
+                                   self.max_backoff))
+                if not final:
+                    retries.append(delivery)
+            else:
+                failures_in_a_row = 0
+                delivery.finished = time.time()
+                self.results.put((delivery, None))
+
+        if connection is not None:
+            connection.fail_silently = True
+            connection.close()
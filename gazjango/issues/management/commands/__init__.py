@@ -1,18 +1,34 @@
 from django.core.management.base import NoArgsCommand
-from django.core.mail            import EmailMessage, SMTPConnection, mail_admins
+from django.core.mail            import EmailMessage, mail_admins
+from django.db                   import transaction
 from django.http                 import HttpRequest
+from gazjango.issues.delivery    import DeliveryEngine, Delivery, MessageTemplate, smtp_response
+from gazjango.subscriptions.models import SendRun, SendRecord, stream_recipients
+from optparse import make_option
 import datetime
 import time
-import sys
-import smtplib
-import socket
 import traceback
-import pickle
 
 class SendingOutCommand(NoArgsCommand):
     subscriber_base = None # Subscriber.rsd or whatever
     from_email = 'The Daily Gazette <dailygazette@swarthmore.edu>'
-    WAIT_TIME = 60
+    NUM_CONNECTIONS = 4
+    
+    # how often the journal is written to the database. A crash can lose
+    # (and so resend) what's been sent since, on top of whatever's in
+    # flight, so this is kept to about one message per connection (None
+    # means just that) or a second's worth; a few small writes a second
+    # cost next to nothing beside the SMTP round trips.
+    FLUSH_EVERY = None
+    FLUSH_INTERVAL = 1
+    
+    # how many subscribers to load from the database at a time
+    CHUNK_SIZE = 1000
+    
+    option_list = NoArgsCommand.option_list + (
+        make_option('--connections', type='int', dest='connections', default=None,
+            help='How many SMTP connections to send over at once.'),
+    )
     
     def set_content(self, dummy_request):
         raise NotImplemented
@@ -28,79 +44,87 @@ class SendingOutCommand(NoArgsCommand):
         return (self.text_content, self.html_content)
     
     
-    def send_to_subscriber(self, subscriber):
-        subj = self.subject
-        frm = self.from_email
+    def message_for_subscriber(self, subscriber):
+        """
+        Returns the message for `subscriber`. There are only a few different
+        bodies to go around, so each is encoded once, into a MessageTemplate,
+        and then just addressed to each subscriber.
+        """
         text_content, html_content = self.contents_for_subscriber(subscriber)
+        content = text_content if subscriber.plain_text else html_content
         
-        if subscriber.plain_text:
-            msg = EmailMessage(subj, text_content, frm, [subscriber.email])
-        else:
-            msg = EmailMessage(subj, html_content, frm, [subscriber.email])
-            msg.content_subtype = "html"
-
-        # msg = EmailMessage(self.subject, text_content, self.from_email, [subscriber.email])
-        # if not subscriber.plain_text:
-        #     msg.multipart_subtype = 'alternative'
-        #     msg.attach(content=html_content, mimetype='text/html')
-        
-        self.connection.send_messages([msg])
-        
-        # if it didn't just crash, sending was successful :)
-        subscriber.last_sent = self.sent_str
-        subscriber.save()
+        key = (subscriber.plain_text, content)
+        if key not in self.templates:
+            msg = EmailMessage(self.subject, content, self.from_email)
+            if not subscriber.plain_text:
+                msg.content_subtype = "html"
+            
+            # msg = EmailMessage(self.subject, text_content, self.from_email, [subscriber.email])
+            # if not subscriber.plain_text:
+            #     msg.multipart_subtype = 'alternative'
+            #     msg.attach(content=html_content, mimetype='text/html')
+            self.templates[key] = MessageTemplate(msg)
+        return self.templates[key].for_recipient(subscriber.email)
     
-    def renew_connection(self, subscriber, retries=5, sleep_time_base=2):
-        # close the old one
-        self.connection.fail_silently = True
-        self.connection.close()
-        
-        # get a new one
-        for i in range(retries):
-            try:
-                self.connection = SMTPConnection()
-                self.connection.open()
-            except socket.timeout:
-                self.add_error(subscriber, 'timeout while opening connection')
-                time.sleep(sleep_time_base ** i)
-            else:
-                return
+    def journal_name(self):
+        "The name this command's SendRuns are recorded under."
+        return self.__module__.rsplit('.', 1)[-1]
     
-    def try_sending_to_subscriber(self, subscriber, repeat_index=0, max_repeats=2):
-        if repeat_index >= max_repeats:
-            return
+    def start_run(self):
+        """
+        Gets the SendRun for this mailing, picking up the one from last time
+        if this mailing has already been started.
+        """
+        now = datetime.datetime.now()
+        run, created = SendRun.objects.get_or_create(
+            command=self.journal_name(), sent_str=self.sent_str,
+            defaults={'started': now, 'subject': self.subject})
+        if not created:
+            print 'resuming run #%d, started %s' % (run.pk, run.started.strftime("%c"))
+            run.resumed = now
+            run.finished = None
+        run.total = self.subscriber_base.count()
+        run.save()
+        return run
+    
+    def record(self, delivery, state):
+        """
+        Notes how sending to `delivery`'s subscriber turned out. Rather than
+        saving each one as it happens, these are written out in batches by
+        `flush_records`.
+        """
+        subscriber = delivery.key
+        error = response = tb = ''
+        code = None
+        if delivery.last_error:
+            error, (exc_type, exc_val, exc_trace) = delivery.last_error
+            code, response = smtp_response(exc_val)
+            tb = ''.join(traceback.format_exception(exc_type, exc_val, exc_trace))
         
-        try:
-            self.send_to_subscriber(subscriber)
-        except smtplib.SMTPRecipientsRefused:
-            self.add_error(subscriber, 'recipient refused')
-        except smtplib.SMTPServerDisconnected:
-            self.add_error(subscriber, 'server disconnected')
-            self.renew_connection(subscriber)
-            self.try_sending_to_subscriber(subscriber, repeat_index + 1, max_repeats)
-        except socket.sslerror:
-            self.add_error(subscriber, 'ssl error') # probably timeout
-            self.renew_connection(subscriber)
-            self.try_sending_to_subscriber(subscriber, repeat_index + 1, max_repeats)
-        except socket.timeout:
-            self.add_error(subscriber, 'timeout')
-            self.renew_connection(subscriber)
-            self.try_sending_to_subscriber(subscriber, repeat_index + 1, max_repeats)
-        except smtplib.SMTPException:
-            self.add_error(subscriber, 'smtp error')
-        except Exception:
-            self.add_error(subscriber, 'generic error')
+        self.records.append((self.run.pk, subscriber.pk, state, delivery.attempts,
+                             error, code, response, tb, datetime.datetime.now(),
+                             delivery.finished - delivery.started))
+        if state == 's':
+            self.sent_pks.append(subscriber.pk)
+        
+        if len(self.records) >= self.flush_every or \
+           time.time() - self.last_flush >= self.FLUSH_INTERVAL:
+            self.flush_records()
     
-    def add_error(self, subscriber, key):
-        self.errors.setdefault(subscriber.email, {})
-        self.errors[subscriber.email].setdefault(key, [])
-        exc_type, exc_val, exc_trace = sys.exc_info()
-        self.errors[subscriber.email][key].append({
-            'type': exc_type,
-            'val': exc_val,
-            'traceback': ''.join(traceback.format_exception(exc_type, exc_val, exc_trace)),
-            'time': datetime.datetime.now()
-        })
+    @transaction.commit_on_success
+    def flush_records(self):
+        """
+        Writes out the journal entries and `last_sent` marks for everyone
+        we've heard back about, together, so a resumed run never disagrees
+        with the journal about who's been sent to.
+        """
+        SendRecord.objects.write(self.run, self.records)
+        if self.sent_pks:
+            self.subscriber_base.model._default_manager \
+                .filter(pk__in=self.sent_pks).update(last_sent=self.sent_str)
+        self.records = []
+        self.sent_pks = []
+        self.last_flush = time.time()
     
     
     def handle_noargs(self, **options):
@@ -111,39 +135,48 @@ class SendingOutCommand(NoArgsCommand):
         self.subject = self.get_subject()
         self.sent_str = self.get_sent_str()
         
-        self.connection = SMTPConnection()
-        self.errors = {}
+        self.templates = {}
+        connections = int(options.get('connections') or self.NUM_CONNECTIONS)
+        engine = DeliveryEngine(num_connections=connections)
+        self.flush_every = self.FLUSH_EVERY or connections
         
         print 'starting: ' + datetime.datetime.now().strftime("%c")
+        self.run = self.start_run()
         
-        # try up to four times, if necessary
-        for i in range(4):
-            not_sent = self.subscriber_base.exclude(last_sent=self.sent_str)
-            if len(not_sent): # intentionally resolve the query
-                if i != 0:
-                    print datetime.datetime.now().strftime('%c'), 
-                    print '- sleeping before retrying %s emails...' % len(not_sent)
-                    time.sleep(self.WAIT_TIME)
-                for subscriber in not_sent:
-                    self.try_sending_to_subscriber(subscriber)
+        not_sent = self.subscriber_base.exclude(last_sent=self.sent_str)
+        deliveries = (Delivery(sub, self.message_for_subscriber(sub))
+                      for sub in stream_recipients(not_sent, self.CHUNK_SIZE))
         
-        # any that *still* didn't work?
+        self.records = []
+        self.sent_pks = []
+        self.last_flush = time.time()
+        failed = []
+        try:
+            for delivery, error in engine.send(deliveries):
+                if error is None:
+                    self.record(delivery, 's')
+                elif error[2]:
+                    self.record(delivery, 'f')
+                    failed.append(delivery)
+        finally:
+            self.flush_records()
+        
+        self.run.finished = datetime.datetime.now()
+        self.run.save()
+        
+        # any that didn't work?
         error_output = []
-        for sub in self.subscriber_base.exclude(last_sent=self.sent_str):
-            errors = [ '%d %s' % (len(data), kind) for kind, data 
-                       in self.errors[sub.email].items() ]
-            error_output.append('errors with %s: %s' % (sub.email, '\t'.join(errors)))
+        for delivery in failed:
+            error_output.append('errors with %s: %s after %d tries' %
+                (delivery.key.email, delivery.last_error[0], delivery.attempts))
         
         if error_output:
             print '\n', '\n'.join(error_output), '\n'
             mail_admins('Errors sending out',
                 "Got the following errors while sending the email:\n" +
                 '\n'.join(error_output) +
-                '\n\nMore information is available by loading the pickled log file.'
+                '\n\nThe tracebacks and server responses are in the send records '
+                'for run #%d.' % self.run.pk
             )
         
-        if self.errors:
-            print 'more info available in the pickle file'
-        pickle.dump(self.errors, sys.stderr)
-        
         print 'finished: ' + datetime.datetime.now().strftime("%c")
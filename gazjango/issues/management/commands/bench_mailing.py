@@ -0,0 +1,133 @@
+from django.conf                 import settings
+from django.core.management.base import NoArgsCommand, CommandError
+from django.db                   import connection, reset_queries, transaction
+from django.utils.importlib      import import_module
+from optparse import make_option
+import random
+import socket
+import time
+
+from gazjango.issues.smtp_sink     import SMTPSink
+from gazjango.subscriptions.models import Subscriber, SendRun
+
+# what the subscribers for each command get, if it's not an issue
+RECEIVE = {
+    'send_rsd_directly': 'r',
+    'send_events_directly': 'r',
+    'send_combo_directly': 'r',
+    'send_staff_directly': 's',
+}
+
+class Command(NoArgsCommand):
+    help = ("Times a mailing command sending to lots of made-up subscribers, "
+            "in a test database, through a local SMTP sink.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--command', dest='command', default='send_issue_directly',
+            help='Which mailing command to run (default send_issue_directly).'),
+        make_option('--subscribers', type='int', dest='subscribers', default=10000,
+            help='How many subscribers to make up.'),
+        make_option('--connections', type='int', dest='connections', default=None,
+            help='How many SMTP connections the command should use.'),
+        make_option('--size', type='int', dest='size', default=40,
+            help='Roughly how big each message should be, in KB.'),
+        make_option('--latency', type='float', dest='latency', default=0.0,
+            help='Seconds the sink takes over each message.'),
+        make_option('--error-rate', type='float', dest='error_rate', default=0.0,
+            help='Fraction of messages the sink answers with a 451.'),
+        make_option('--disconnect-rate', type='float', dest='disconnect_rate', default=0.0,
+            help='Fraction of messages the sink hangs up on.'),
+        make_option('--stall-rate', type='float', dest='stall_rate', default=0.0,
+            help='Fraction of messages the sink goes quiet on until the client times out.'),
+        make_option('--timeout', type='float', dest='timeout', default=5.0,
+            help='Socket timeout for the SMTP connections, in seconds.'),
+        make_option('--noinput', action='store_false', dest='interactive', default=True,
+            help="Don't ask before clobbering an old test database."),
+    )
+
+    def handle_noargs(self, **options):
+        try:
+            module = import_module('gazjango.issues.management.commands.' + options['command'])
+        except ImportError:
+            raise CommandError("there's no mailing command called %s" % options['command'])
+        mailer = synthetic_command(module.Command, options['size'] * 1024)()
+
+        sink = SMTPSink(latency=options['latency'],
+                        error_rate=options['error_rate'],
+                        disconnect_rate=options['disconnect_rate'],
+                        stall_rate=options['stall_rate'],
+                        stall=options['timeout'] * 2).start()
+
+        verbosity = int(options.get('verbosity', 1))
+        old_name = settings.DATABASE_NAME
+        old_settings = dict((name, getattr(settings, name)) for name in
+            ('DEBUG', 'EMAIL_HOST', 'EMAIL_PORT', 'EMAIL_HOST_USER', 'EMAIL_USE_TLS'))
+        old_timeout = socket.getdefaulttimeout()
+        connection.creation.create_test_db(verbosity, autoclobber=not options['interactive'])
+        try:
+            settings.EMAIL_HOST = sink.host
+            settings.EMAIL_PORT = sink.port
+            settings.EMAIL_HOST_USER = ''
+            settings.EMAIL_USE_TLS = False
+            socket.setdefaulttimeout(options['timeout'])
+
+            make_subscribers(options['subscribers'], RECEIVE.get(options['command'], 'i'))
+
+            settings.DEBUG = True # so that queries are logged
+            reset_queries()
+            start = time.time()
+            mailer.handle_noargs(connections=options['connections'])
+            elapsed = time.time() - start
+            queries = len(connection.queries)
+            settings.DEBUG = False
+
+            self.report(options, SendRun.objects.latest('started'), sink, elapsed, queries)
+        finally:
+            for name, value in old_settings.items():
+                setattr(settings, name, value)
+            socket.setdefaulttimeout(old_timeout)
+            sink.stop()
+            connection.creation.destroy_test_db(old_name, verbosity)
+
+    def report(self, options, run, sink, elapsed, queries):
+        counts = run.counts()
+        attempts = sum(run.records.values_list('attempts', flat=True))
+        sent = counts['s']
+
+        print
+        print "%s to %d subscribers over %s connections:" % \
+              (options['command'], options['subscribers'],
+               options['connections'] or 'the default number of')
+        print "  %d sent, %d failed in %.1f seconds: %.1f messages/second" % \
+              (sent, counts['f'], elapsed, sent / elapsed if elapsed else 0)
+        print "  %d queries, %.3f per message" % (queries, float(queries) / max(sent, 1))
+        print "  %d tries for %d messages: %d retries" % \
+              (attempts, sent + counts['f'], attempts - sent - counts['f'])
+        print "  sink: %(connections)d connections, %(messages)d messages, " \
+              "%(error)d errors, %(disconnect)d disconnects, %(stall)d stalls" % sink.stats
+
+
+def synthetic_command(command_class, size):
+    """
+    Makes a version of a mailing command that sends made-up content of about
+    `size` bytes, since the test database has no articles or announcements.
+    """
+    class SyntheticCommand(command_class):
+        def set_content(self, dummy_request):
+            paragraph = ('All work and no play makes Jack a dull boy. ' * 20)
+            paragraphs = max(size // len(paragraph), 1)
+            self.text_content = '\n\n'.join([paragraph] * paragraphs)
+            self.html_content = '<p>%s</p>' % '</p>\n<p>'.join([paragraph] * paragraphs)
+            self.tame_text_content = self.text_content
+            self.tame_html_content = self.html_content
+
+    SyntheticCommand.__module__ = command_class.__module__
+    return SyntheticCommand
+
+@transaction.commit_on_success
+def make_subscribers(num, receive):
+    for i in xrange(num):
+        Subscriber.objects.create(_email='subscriber%d@example.com' % i,
+                                  receive=receive,
+                                  plain_text=random.random() < 0.1,
+                                  racy_content=random.random() < 0.9)
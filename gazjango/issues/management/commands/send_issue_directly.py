@@ -2,9 +2,10 @@ from gazjango.issues.management.commands import SendingOutCommand
 from django.core.management.base         import CommandError
 from django.core.mail                    import mail_admins
 from django.http                         import Http404
+from django.utils.encoding               import smart_str
 
 from gazjango.issues.models        import Issue
-from gazjango.issues.views         import show_issue
+from gazjango.issues.views         import render_issue
 from gazjango.options.helpers      import is_publishing
 from gazjango.subscriptions.models import Subscriber
 
@@ -24,12 +25,17 @@ class Command(SendingOutCommand):
                         "there were no articles, but we're in publish mode!")
             raise CommandError('No issue, so not sending it.')
         
-        self.html_content = show_issue(dummy_request, issue).content
-        self.text_content = show_issue(dummy_request, issue, plain=True).content
+        # the issue's final now; render it once, fresh, for everyone
+        issue.clear_render_cache()
+        self.html_content = smart_str(render_issue(issue, False, True, True))
+        self.text_content = smart_str(render_issue(issue, True, True, True))
+        self.tame_html_content = smart_str(render_issue(issue, False, False, True))
+        self.tame_text_content = smart_str(render_issue(issue, True, False, True))
         
-        dummy_request.GET['racy'] = 'no'
-        self.tame_html_content = show_issue(dummy_request, issue).content
-        self.tame_text_content = show_issue(dummy_request, issue, plain=True).content
+        # and have the site's versions ready for the morning, too
+        for racy in (True, False):
+            for plain in (False, True):
+                render_issue(issue, plain, racy)
     
     def contents_for_subscriber(self, subscriber):
         if subscriber.racy_content:
@@ -1,19 +1,48 @@
-from django.core.management.base import LabelCommand
-from gazjango.subscriptions.models import Subscriber
+from django.core.management.base import LabelCommand, CommandError
+from gazjango.subscriptions.models import SendRun
 from gazjango.issues.management.commands import send_issue_directly, send_rsd_directly
+import datetime
 
 class Command(LabelCommand):
+    help = "Shows how far along today's mailing is, from its send journal."
+    args = '[issue|rsd|<command name>]'
+    
     def handle_label(self, label, **options):
-        if label.startswith('r'):
-            base = Subscriber.rsd
-            name = 'RSD'
+        if label.startswith('send_'):
+            command = label
+            sent_str = None
+        elif label.startswith('r'):
+            command = 'send_rsd_directly'
             sent_str = send_rsd_directly.Command().get_sent_str()
         else:
-            base = Subscriber.issues
-            name = 'issue'
+            command = 'send_issue_directly'
             sent_str = send_issue_directly.Command().get_sent_str()
         
-        done = base.filter( last_sent=sent_str).count()
-        left = base.exclude(last_sent=sent_str).count()
-        print "%s subscribers for %s: %d done, %d to go" % (name, sent_str, done, left)
+        runs = SendRun.objects.filter(command=command)
+        if sent_str:
+            runs = runs.filter(sent_str=sent_str)
+        try:
+            run = runs[0]
+        except IndexError:
+            raise CommandError("%s hasn't started sending %s" % (command, sent_str or 'anything'))
+        
+        counts = run.counts()
+        done = counts['s'] + counts['f']
+        left = max(run.total - done, 0)
+        print "%s for %s: %d sent, %d failed, %d to go" % \
+              (command, run.sent_str, counts['s'], counts['f'], left)
+        
+        if run.finished:
+            print "finished at %s" % run.finished.strftime("%c")
+            return
+        
+        # the rate since the run was last (re)started
+        since = run.resumed or run.started
+        elapsed = datetime.datetime.now() - since
+        seconds = elapsed.days * 86400 + elapsed.seconds
+        recent = run.records.filter(sent__gte=since).count()
+        if seconds and recent:
+            rate = float(recent) / seconds
+            eta = datetime.datetime.now() + datetime.timedelta(seconds=left / rate)
+            print "%.1f emails/second; should finish around %s" % (rate, eta.strftime("%X"))
     
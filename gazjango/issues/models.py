@@ -1,11 +1,14 @@
-from django.db        import models
-from django.db.models import permalink
+from django.core.cache import cache
+from django.db         import models, connection, transaction
+from django.db.models  import permalink
 
 from gazjango.articles.models      import Article
 from gazjango.announcements.models import Announcement
 from gazjango.athletics.models     import Team, Game
 
 import datetime
+import itertools
+import urllib2
 from gazjango.scrapers import sharples
 from gazjango.scrapers import weather
 from gazjango.scrapers import events
@@ -20,29 +23,99 @@ class EventManager(models.Manager):
         end = date + forward
         return self.filter(start_day__lte=end, end_day__gte=start)
     
+    # the fields that come from the calendar feed, besides the link
+    SCRAPED_FIELDS = ('name', 'start_day', 'end_day', 'start_time', 'end_time',
+                      'location', 'sponsor')
+    
+    # how many links to look up at once
+    LOOKUP_BATCH = 500
+    
     def update(self, forward=None, start=None):
+        """
+        Brings our events for the next `forward` (default a week) up to date
+        with the calendar feed: events we haven't seen are inserted, and ones
+        that have changed are updated, in a couple of batched queries.
+        Events that are just the same are left alone.
+        
+        Returns (inserted, updated) counts, or None if the feed hasn't
+        changed since last time. Raises urllib2.URLError if the feed can't
+        be loaded.
+        """
         if not forward:
             forward = datetime.timedelta(days=7)
         if not start:
             start = datetime.date.today()
         
-        existing = self.for_date(start, forward=forward)
-        scraped = events.scrape_events_feed(start=start, end=start+forward)
+        fetched = events.fetch_events_feed(start=start, end=start+forward)
+        if not fetched.changed:
+            return # nothing new
+        scraped = events.parse_events_feed(fetched.body)
         
-        for event_dict in scraped:
-            try:
-                e = existing.get(link=event_dict['link'])
-                e.start_day  = event_dict['start_day']
-                e.start_time = event_dict['start_time']
-                e.end_day    = event_dict['end_day']
-                e.end_time   = event_dict['end_time']
-                e.name     = event_dict['name']
-                e.location = event_dict['location']
-                e.sponsor  = event_dict['sponsor']
-                e.save()
-            except Event.DoesNotExist:
-                Event.objects.create(**event_dict)
+        # links are unique, so the last one the feed gives us wins
+        scraped = dict((event_dict['link'], event_dict) for event_dict in scraped)
+        
+        # look up by link, not just in the window, since an event that's
+        # moved into it is already in the table
+        links = scraped.keys()
+        existing = {}
+        for i in range(0, len(links), self.LOOKUP_BATCH):
+            for pk, link, values in self._current(links[i:i+self.LOOKUP_BATCH]):
+                existing[link] = (pk, values)
+        
+        new, changed = [], []
+        for link, event_dict in scraped.iteritems():
+            row = [event_dict[field] for field in self.SCRAPED_FIELDS]
+            if link not in existing:
+                new.append(row + [link])
+            elif tuple(row) != existing[link][1]:
+                changed.append(row + [existing[link][0]])
+        
+        self._write(new, changed)
+        fetched.remember()
+        return len(new), len(changed)
     
+    def _current(self, links):
+        fields = ('pk', 'link') + self.SCRAPED_FIELDS
+        for values in self.filter(link__in=links).values_list(*fields):
+            yield values[0], values[1], tuple(values[2:])
+    
+    @transaction.commit_on_success
+    def _write(self, new, changed):
+        """
+        Inserts the `new` rows (values for SCRAPED_FIELDS, then the link)
+        and updates the `changed` ones (values for SCRAPED_FIELDS, then the
+        pk), each with a single executemany(). Like SendRecordManager.write,
+        this goes straight through the cursor and skips save() and signals.
+        """
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        cursor = connection.cursor()
+        if new:
+            columns = self.SCRAPED_FIELDS + ('link',)
+            sql = "INSERT INTO %s (%s) VALUES (%s)" % (
+                table,
+                ', '.join(qn(column) for column in columns),
+                ', '.join(['%s'] * len(columns)))
+            cursor.executemany(sql, [_db_values(row) for row in new])
+        if changed:
+            sql = "UPDATE %s SET %s WHERE %s = %%s" % (
+                table,
+                ', '.join('%s = %%s' % qn(column) for column in self.SCRAPED_FIELDS),
+                qn(self.model._meta.pk.column))
+            cursor.executemany(sql, [_db_values(row) for row in changed])
+    
+
+def _db_values(row):
+    "Converts dates and times in `row` to what the database backend expects."
+    ops = connection.ops
+    converted = []
+    for value in row:
+        if isinstance(value, datetime.time):
+            value = ops.value_to_db_time(value)
+        elif isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+            value = ops.value_to_db_date(value)
+        converted.append(value)
+    return converted
 
 class Event(models.Model):
     "An event scraped from the College calendar."
@@ -75,6 +148,9 @@ class Event(models.Model):
     
 
 ISSUE_CUTOFF_TIME = datetime.time(18, 0, 0)
+RECENT_RENDER_TIMEOUT = 60 * 60
+OLD_RENDER_TIMEOUT = 24 * 60 * 60
+
 class IssuesManager(models.Manager):
     def populate_issue(self, tomorrow=None):
         if tomorrow is None:
@@ -177,6 +253,23 @@ class Issue(models.Model):
     def lowstories(self, racy=True, skip=3):
         return self.articles_in_order(racy)[skip:]
     
+    def render_cache_key(self, plain, racy, for_email):
+        return 'issue-render:%d:%d:%d:%d' % (self.pk, plain, racy, for_email)
+    
+    def render_cache_timeout(self):
+        """
+        How long a rendering of this issue stays cached. Changes to its
+        articles and announcements clear it out right away, but the jobs and
+        comments in the sidebar don't, so keep recent issues only briefly.
+        """
+        if self.date >= datetime.date.today() - datetime.timedelta(days=7):
+            return RECENT_RENDER_TIMEOUT
+        return OLD_RENDER_TIMEOUT
+    
+    def clear_render_cache(self):
+        cache.delete_many([self.render_cache_key(*flags)
+                           for flags in itertools.product((False, True), repeat=3)])
+    
     def __unicode__(self):
         return self.date.strftime("%a, %d %B %Y")
     
@@ -191,21 +284,26 @@ class Issue(models.Model):
     
 
 class MenuManager(models.Manager):
-    def for_today(self, ignore_cached=False):
+    def for_today(self, ignore_cached=False, fail_silently=True):
         """
         Returns the Sharples menu object for today, creating a new
         one by scraping it from the XML feed if necessary.
+        
+        If the feed can't be loaded, the menu says so, unless
+        `fail_silently` is off, in which case the urllib2.URLError is
+        raised.
         """
-        return self._for_today_or_tomorrow(False, ignore_cached)
+        return self._for_today_or_tomorrow(False, ignore_cached, fail_silently)
     
-    def for_tomorrow(self, ignore_cached=False):
+    def for_tomorrow(self, ignore_cached=False, fail_silently=True):
         """
         Returns the Sharples menu object for tomorrow, creating a new
-        one by scraping it from the XML feed if necessary.
+        one by scraping it from the XML feed if necessary. See for_today
+        for `fail_silently`.
         """
-        return self._for_today_or_tomorrow(True, ignore_cached)
+        return self._for_today_or_tomorrow(True, ignore_cached, fail_silently)
     
-    def _for_today_or_tomorrow(self, tomorrow, ignore_cached=False):
+    def _for_today_or_tomorrow(self, tomorrow, ignore_cached=False, fail_silently=True):
         date = datetime.date.today() + \
                datetime.timedelta(days=(1 if tomorrow else 0))
         try:
@@ -215,10 +313,25 @@ class MenuManager(models.Manager):
         except self.model.DoesNotExist:
             menu = self.model()
         
-        vals = self.scrape_menu(tomorrow, yield_dict=True)
-        for key, val in vals.iteritems():
+        # if we already have one, only bother if the feed's changed
+        try:
+            fetched = sharples.fetch_menu(tomorrow=tomorrow)
+        except urllib2.URLError:
+            if not fail_silently:
+                raise
+            # TODO: log this error somehow
+            fetched = None
+            vals = sharples.unavailable_menu()
+        else:
+            if menu.pk and not fetched.changed:
+                return menu
+            vals = sharples.parse_menu(fetched.body, tomorrow=tomorrow)
+        
+        for key, val in self._menu_values(vals, tomorrow).iteritems():
             menu.__setattr__(key, val)
         menu.save()
+        if fetched is not None:
+            fetched.remember()
         return menu
     
     def scrape_menu(self, tomorrow=False, yield_dict=False):
@@ -229,9 +342,12 @@ class MenuManager(models.Manager):
         If `yield_dict` is passed, return a dictionary of values
         rather than an object.
         """
-        menu = sharples.get_menu(tomorrow=tomorrow)
-        
-        return (dict if yield_dict else self.model)(
+        vals = self._menu_values(sharples.get_menu(tomorrow=tomorrow), tomorrow)
+        return vals if yield_dict else self.model(**vals)
+    
+    def _menu_values(self, menu, tomorrow=False):
+        "Turns a menu dictionary from the scraper into Menu field values."
+        return dict(
             date    = datetime.date.today() + 
                       datetime.timedelta(days=(1 if tomorrow else 0)),
             closed  = menu['closed'],
@@ -260,21 +376,26 @@ class Menu(models.Model):
 
 
 class WeatherManager(models.Manager):
-    def for_today(self, ignore_cached=False):
+    def for_today(self, ignore_cached=False, fail_silently=True):
         """
         Returns the weather object for today, creating a new
         one (by parsing it from the online data feed) if necessary.
+        
+        If the feed can't be loaded or parsed, the forecast is left blank,
+        unless `fail_silently` is off, in which case the WeatherError is
+        raised.
         """
-        return self._get_or_parse(False, ignore_cached)
+        return self._get_or_parse(False, ignore_cached, fail_silently)
     
-    def for_tomorrow(self, ignore_cached=False):
+    def for_tomorrow(self, ignore_cached=False, fail_silently=True):
         """
         Returns the weather object for tomorrow, creating a new
-        one (by parsing it from the online data feed) if necessary.
+        one (by parsing it from the online data feed) if necessary. See
+        for_today for `fail_silently`.
         """
-        return self._get_or_parse(True, ignore_cached)
+        return self._get_or_parse(True, ignore_cached, fail_silently)
     
-    def _get_or_parse(self, tomorrow=False, ignore_cached=False):
+    def _get_or_parse(self, tomorrow=False, ignore_cached=False, fail_silently=True):
         day = datetime.date.today()
         if tomorrow:
             day += datetime.timedelta(days=1)
@@ -288,8 +409,14 @@ class WeatherManager(models.Manager):
             obj = self.model()
         
         try:
-            data = weather.get_weather(date=day)
+            fetched = weather.fetch_weather(date=day)
+            if obj.pk and not fetched.changed: # same forecast as before
+                return obj
+            data = weather.parse_weather(fetched.body)
         except weather.WeatherError:
+            if not fail_silently:
+                raise
+            fetched = None
             data = { 'today': "", 'tonight': "", 'tomorrow': "" }
         
         obj.date     = day
@@ -297,6 +424,8 @@ class WeatherManager(models.Manager):
         obj.tonight  = data['tonight']
         obj.tomorrow = data['tomorrow']
         obj.save()
+        if fetched is not None:
+            fetched.remember()
         
         return obj
     
@@ -346,3 +475,33 @@ class WeatherJoke(models.Model):
     class Meta:
         get_latest_by = "date"
     
+
+
+# Clear out cached renderings of issues (see issues.views.render_issue) when
+# the issue or its articles or announcements change.
+def _clear_issue(sender, instance, **kwargs):
+    instance.clear_render_cache()
+models.signals.post_save.connect(_clear_issue, sender=Issue)
+models.signals.post_delete.connect(_clear_issue, sender=Issue)
+
+def _clear_issue_articles(sender, instance, **kwargs):
+    if isinstance(instance, Issue):
+        instance.clear_render_cache()
+    else:
+        for issue in instance.issues.all():
+            issue.clear_render_cache()
+models.signals.m2m_changed.connect(_clear_issue_articles, sender=Issue.articles.through)
+
+def _clear_article_issues(sender, instance, **kwargs):
+    # subclasses (like PhotoSpread) send their own signals, so check here
+    if isinstance(instance, Article):
+        for issue in instance.issues.all():
+            issue.clear_render_cache()
+models.signals.post_save.connect(_clear_article_issues)
+
+def _clear_announcement_issues(sender, instance, **kwargs):
+    issues = Issue.objects.filter(date__gte=instance.date_start, date__lte=instance.date_end)
+    for issue in issues:
+        issue.clear_render_cache()
+models.signals.post_save.connect(_clear_announcement_issues, sender=Announcement)
+models.signals.post_delete.connect(_clear_announcement_issues, sender=Announcement)
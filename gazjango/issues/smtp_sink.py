@@ -0,0 +1,166 @@
+"""
+A little SMTP server that accepts mail and throws it away, for trying out the
+mailing commands without bothering a real relay.
+
+It can be made to misbehave like a real server does on a bad morning: taking
+its time over each message, answering with 4xx errors, hanging up, or going
+quiet until the client gives up. Run it standalone with
+
+    python -m gazjango.issues.smtp_sink [port] [latency] [error_rate] [disconnect_rate]
+
+or start one in-process with SMTPSink(...).start(), which is what
+`manage.py bench_mailing` does.
+"""
+
+import random
+import SocketServer
+import sys
+import threading
+import time
+
+class SinkHandler(SocketServer.StreamRequestHandler):
+    "Speaks just enough SMTP to make smtplib happy."
+
+    def reply(self, line):
+        self.wfile.write(line + '\r\n')
+
+    def handle(self):
+        sink = self.server.sink
+        sink.count('connections')
+        self.reply('220 localhost SMTP sink')
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command, space, arg = line.strip().partition(' ')
+            command = command.upper()
+
+            if command in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif command == 'MAIL':
+                fault = sink.fault()
+                if fault == 'disconnect':
+                    return
+                elif fault == 'stall':
+                    time.sleep(sink.stall)
+                    return
+                elif fault == 'error':
+                    self.reply('451 4.3.0 Try again later')
+                else:
+                    self.reply('250 OK')
+            elif command == 'RCPT':
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                size = 0
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    if line in ('.\r\n', '.\n'):
+                        break
+                    size += len(line)
+                if sink.latency:
+                    time.sleep(sink.latency)
+                sink.received(size)
+                self.reply('250 OK')
+            elif command in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SinkServer(SocketServer.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink(object):
+    """
+    An SMTP server, in its own thread, that takes `latency` seconds over
+    each message. For each message it's asked to take, it answers with a
+    4xx error with probability `error_rate`, hangs up with probability
+    `disconnect_rate`, and goes silent for `stall` seconds (and then hangs
+    up) with probability `stall_rate`.
+
+    Counts of what it did are in `stats`. With port 0 (the default), it
+    picks a free one; see `port` once it's started.
+    """
+    def __init__(self, host='127.0.0.1', port=0, latency=0, error_rate=0,
+                 disconnect_rate=0, stall_rate=0, stall=30, seed=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        self.disconnect_rate = disconnect_rate
+        self.stall_rate = stall_rate
+        self.stall = stall
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = dict.fromkeys(('connections', 'messages', 'bytes', 'error',
+                                    'disconnect', 'stall'), 0)
+
+    def count(self, name, n=1):
+        self.lock.acquire()
+        try:
+            self.stats[name] += n
+        finally:
+            self.lock.release()
+
+    def fault(self):
+        "Decides how (if at all) to mess up the next message."
+        self.lock.acquire()
+        try:
+            roll = self.random.random()
+        finally:
+            self.lock.release()
+
+        for fault, rate in (('error', self.error_rate),
+                            ('disconnect', self.disconnect_rate),
+                            ('stall', self.stall_rate)):
+            if roll < rate:
+                self.count(fault)
+                return fault
+            roll -= rate
+        return None
+
+    def received(self, size):
+        self.lock.acquire()
+        try:
+            self.stats['messages'] += 1
+            self.stats['bytes'] += size
+        finally:
+            self.lock.release()
+
+    def start(self):
+        self.server = SinkServer((self.host, self.port), SinkHandler)
+        self.server.sink = self
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    sink = SMTPSink(port=int(args[0]) if args else 1025,
+                    latency=float(args[1]) if len(args) > 1 else 0,
+                    error_rate=float(args[2]) if len(args) > 2 else 0,
+                    disconnect_rate=float(args[3]) if len(args) > 3 else 0)
+    sink.start()
+    print "SMTP sink listening on %s:%d" % (sink.host, sink.port)
+    try:
+        while True:
+            time.sleep(10)
+            print sink.stats
+    except KeyboardInterrupt:
+        sink.stop()
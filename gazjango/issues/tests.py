@@ -1,7 +1,13 @@
 import unittest
+from django.core.mail         import EmailMessage
 from gazjango.articles.models import Article, Section
-from gazjango.issues.models   import Issue
+from gazjango.issues.delivery import DeliveryEngine, Delivery, MessageTemplate, smtp_response
+from gazjango.issues.models   import Issue, Event
+from gazjango.issues          import models as issue_models
+from gazjango.issues.smtp_sink import SMTPSink
 from datetime import date, timedelta
+import email
+import smtplib
 
 class IssueTestCase(unittest.TestCase):
     
@@ -53,3 +59,211 @@ class IssueTestCase(unittest.TestCase):
         self.assertEquals([a.pk for a in self.issue_today.articles_in_order().all()], 
                          [self.exciting_article.pk, self.boring_article.pk])
     
+
+
+class FlakyConnection(object):
+    "Pretends to be an SMTPConnection that hangs up on every `flakiness`th message."
+    sent = []
+    count = 0
+    flakiness = 3
+    
+    def open(self):
+        pass
+    
+    def close(self):
+        pass
+    
+    def send_messages(self, messages):
+        FlakyConnection.count += 1
+        if FlakyConnection.count % self.flakiness == 0:
+            raise smtplib.SMTPServerDisconnected('bye')
+        if messages[0] == 'refused':
+            raise smtplib.SMTPRecipientsRefused({})
+        FlakyConnection.sent.extend(messages)
+        return len(messages)
+    
+
+class DeliveryEngineTestCase(unittest.TestCase):
+    def setUp(self):
+        FlakyConnection.sent = []
+        FlakyConnection.count = 0
+        self.engine = DeliveryEngine(num_connections=3, backoff_base=0,
+                                     connection_factory=FlakyConnection)
+    
+    def testEverythingArrives(self):
+        messages = range(50)
+        results = list(self.engine.send(Delivery(m, m) for m in messages))
+        
+        self.assertEquals(sorted(FlakyConnection.sent), messages)
+        successes = [d.key for d, error in results if error is None]
+        self.assertEquals(sorted(successes), messages)
+        retried = [d for d, error in results if error is not None]
+        self.assert_(retried)
+        self.assert_(all(error[0] == 'server disconnected' and not error[2]
+                         for d, error in results if error is not None))
+    
+    def testPermanentFailures(self):
+        results = list(self.engine.send([Delivery('r', 'refused'), Delivery(1, 1)]))
+        failures = [(d.key, error[0], error[2]) for d, error in results
+                    if error is not None and error[0] != 'server disconnected']
+        self.assertEquals(failures, [('r', 'recipient refused', True)])
+        self.assertEquals(FlakyConnection.sent, [1])
+    
+    def testJournalDetails(self):
+        results = list(self.engine.send([Delivery('r', 'refused')]))
+        delivery = results[-1][0]
+        self.assertEquals(delivery.last_error[0], 'recipient refused')
+        self.assert_(delivery.finished >= delivery.started)
+        
+        refused = smtplib.SMTPRecipientsRefused({'a@b.com': (550, 'no such user')})
+        self.assertEquals(smtp_response(refused), (550, 'no such user'))
+        self.assertEquals(smtp_response(ValueError()), (None, ''))
+    
+
+class MessageTemplateTestCase(unittest.TestCase):
+    def testRender(self):
+        msg = EmailMessage('Subject', u'Body \u2603', 'from@example.com')
+        msg.content_subtype = 'html'
+        template = MessageTemplate(msg)
+        
+        a = email.message_from_string(template.render('a@example.com'))
+        b = email.message_from_string(template.render('b@example.com'))
+        
+        self.assertEquals(a.get_all('To'), ['a@example.com'])
+        self.assertEquals(b.get_all('To'), ['b@example.com'])
+        self.assertNotEquals(a['Message-ID'], b['Message-ID'])
+        for m in (a, b):
+            self.assertEquals(m['Subject'], 'Subject')
+            self.assertEquals(m.get_content_type(), 'text/html')
+            self.assertEquals(m.get_payload(decode=True).decode('utf-8'), u'Body \u2603')
+    
+
+class SMTPSinkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.sink = SMTPSink(seed=0).start()
+    
+    def tearDown(self):
+        self.sink.stop()
+    
+    def testSendAndMisbehave(self):
+        conn = smtplib.SMTP(self.sink.host, self.sink.port)
+        conn.sendmail('a@example.com', ['b@example.com'], 'Subject: hi\n\nthere\n')
+        self.assertEquals(self.sink.stats['messages'], 1)
+        
+        self.sink.error_rate = 1
+        try:
+            conn.sendmail('a@example.com', ['b@example.com'], 'Subject: hi\n\nthere\n')
+        except smtplib.SMTPResponseException, e:
+            self.assertEquals(e.smtp_code, 451)
+        else:
+            self.fail("the sink should have refused that")
+        
+        self.sink.error_rate = 0
+        self.sink.disconnect_rate = 1
+        self.assertRaises(smtplib.SMTPServerDisconnected, conn.sendmail,
+                          'a@example.com', ['b@example.com'], 'Subject: hi\n\nthere\n')
+        self.assertEquals(self.sink.stats['messages'], 1)
+        self.assertEquals(self.sink.stats['error'], 1)
+        self.assertEquals(self.sink.stats['disconnect'], 1)
+    
+    def testEngineThroughSink(self):
+        self.sink.disconnect_rate = 0.2
+        engine = DeliveryEngine(num_connections=2, backoff_base=0, max_attempts=10,
+                                connection_factory=lambda: SinkConnection(self.sink))
+        results = list(engine.send(Delivery(i, 'Subject: %d\n\nhi\n' % i) for i in range(20)))
+        self.assertEquals(self.sink.stats['messages'], 20)
+        self.assertEquals(len([d for d, error in results if error is None]), 20)
+    
+
+class SinkConnection(object):
+    "A bare-bones SMTPConnection for the sink, so these don't need settings."
+    def __init__(self, sink):
+        self.sink = sink
+        self.connection = None
+    
+    def open(self):
+        self.connection = smtplib.SMTP(self.sink.host, self.sink.port)
+    
+    def close(self):
+        try:
+            self.connection.quit()
+        except smtplib.SMTPException:
+            pass
+    
+    def send_messages(self, messages):
+        for message in messages:
+            self.connection.sendmail('a@example.com', ['b@example.com'], message)
+    
+
+
+class EventUpdateTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        self.today = date.today()
+        self.feed = []
+        self.changed = True
+        self.remembered = []
+        self.old = (issue_models.events.fetch_events_feed,
+                    issue_models.events.parse_events_feed)
+        issue_models.events.fetch_events_feed = lambda **kwargs: StubFetched(self)
+        issue_models.events.parse_events_feed = lambda body: body
+    
+    def tearDown(self):
+        (issue_models.events.fetch_events_feed,
+         issue_models.events.parse_events_feed) = self.old
+        Event.objects.all().delete()
+    
+    def event(self, link, name, days=0):
+        day = self.today + timedelta(days=days)
+        return dict(name=name, link=link, start_day=day, end_day=day,
+                    start_time=None, end_time=None, location='', sponsor='')
+    
+    def testUpsert(self):
+        self.feed = [self.event('http://e/1', 'One'), self.event('http://e/2', 'Two')]
+        self.assertEquals(Event.objects.update(), (2, 0))
+        self.assertEquals(Event.objects.count(), 2)
+        
+        # nothing's different, so nothing's written
+        self.assertEquals(Event.objects.update(), (0, 0))
+        
+        self.feed = [self.event('http://e/1', 'One, moved', days=1),
+                     self.event('http://e/2', 'Two'),
+                     self.event('http://e/3', 'Three'),
+                     self.event('http://e/3', 'Three')]
+        self.assertEquals(Event.objects.update(), (1, 1))
+        self.assertEquals(Event.objects.count(), 3)
+        
+        moved = Event.objects.get(link='http://e/1')
+        self.assertEquals(moved.name, 'One, moved')
+        self.assertEquals(moved.start_day, self.today + timedelta(days=1))
+    
+    def testUnchangedFeed(self):
+        self.changed = False
+        self.assertEquals(Event.objects.update(), None)
+        self.assertEquals(self.remembered, [])
+    
+    def testRemembersOnlyAfterWriting(self):
+        self.feed = [self.event('http://e/1', 'One')]
+        def fail(new, changed):
+            raise RuntimeError("database's gone")
+        Event.objects._write = fail
+        try:
+            self.assertRaises(RuntimeError, Event.objects.update)
+        finally:
+            del Event.objects._write
+        self.assertEquals(self.remembered, [])
+        
+        Event.objects.update()
+        self.assertEquals(len(self.remembered), 1)
+    
+
+class StubFetched(object):
+    "Stands in for a fetch.Fetched of `test.feed`."
+    def __init__(self, test):
+        self.test = test
+        self.body = test.feed
+        self.changed = test.changed
+    
+    def remember(self):
+        self.test.remembered.append(self.body)
+    
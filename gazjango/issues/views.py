@@ -1,6 +1,9 @@
+from django.core.cache          import cache
+from django.db                  import transaction
 from django.db.models           import Q
-from django.http                import Http404
+from django.http                import Http404, HttpResponse
 from django.template            import RequestContext
+from django.template.loader     import render_to_string
 from django.shortcuts           import render_to_response
 from gazjango.misc.view_helpers import get_by_date_or_404, filter_by_date
 from gazjango.misc.view_helpers import staff_required, boolean_arg
@@ -22,6 +25,22 @@ def latest_issue(request, plain=False):
     return show_issue(request, Issue.with_articles.latest(), plain)
 
 def show_issue(request, issue, plain=False):
+    racy = boolean_arg(request.GET.get('racy', ''), True)
+    for_email = boolean_arg(request.GET.get('for_email', ''), False)
+    return HttpResponse(render_issue(issue, plain, racy, for_email))
+
+def render_issue(issue, plain=False, racy=True, for_email=False, use_cache=True):
+    """
+    Renders `issue`, as text or html, with or without racy articles, for the
+    web or for email. The result is kept in the cache (see Issue.render_cache_key)
+    so that the mailing and every web hit for the issue share one rendering.
+    """
+    key = issue.render_cache_key(plain, racy, for_email)
+    if use_cache:
+        content = cache.get(key)
+        if content is not None:
+            return content
+    
     tomorrow = issue.date + datetime.timedelta(days=1)
     comments = PublicComment.visible.filter(time__lt=tomorrow).order_by('-time')
     
@@ -31,7 +50,7 @@ def show_issue(request, issue, plain=False):
     else:
         jobs = JobListing.published.get_for_show(num=5, base_date=issue.date, cutoff=one_week)
     
-    articles = issue.articles_in_order(racy=boolean_arg(request.GET.get('racy', ''), True))
+    articles = issue.articles_in_order(racy=racy)
     try:
         topstory = articles[0]
     except IndexError:
@@ -44,21 +63,31 @@ def show_issue(request, issue, plain=False):
         'lowstories': articles[issue.num_full:],
         'jobs': jobs,
         'comments': comments[:5],
-        'for_email': boolean_arg(request.GET.get('for_email', ''), False)
+        'for_email': for_email
     }
     template = "issue/issue." + ('txt' if plain else 'html')
-    return render_to_response(template, data)
+    content = render_to_string(template, data)
+    if use_cache:
+        cache.set(key, content, issue.render_cache_timeout())
+    return content
 
 
 @staff_required
+@transaction.commit_manually
 def preview_issue(request, plain=False):
-    issue, created = Issue.objects.populate_issue()
+    # see what the issue would look like, without actually saving anything
+    issue, created = None, False
     try:
-        resp = show_issue(request, issue, plain)
+        issue, created = Issue.objects.populate_issue()
+        racy = boolean_arg(request.GET.get('racy', ''), True)
+        for_email = boolean_arg(request.GET.get('for_email', ''), False)
+        return HttpResponse(render_issue(issue, plain, racy, for_email, use_cache=False))
     finally:
+        # the rollback does nothing on non-transactional tables (MyISAM),
+        # so get rid of the preview issue explicitly too
         if created:
             issue.delete()
-    return resp
+        transaction.rollback()
 
 
 def issues_list(request, year=None, month=None):
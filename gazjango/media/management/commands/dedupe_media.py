@@ -0,0 +1,105 @@
+from django.core.files.base      import File
+from django.core.management.base import NoArgsCommand
+from optparse import make_option
+import os, os.path
+
+from gazjango.media.models  import MediaFile, ImageFile
+from gazjango.media.storage import content_store, content_name, hash_file, HASH_DIR
+
+FILE_FIELDS = (
+    (MediaFile, ('data',)),
+    (ImageFile, ('data', '_front_data', '_issue_data', '_thumb_data')),
+)
+
+class Command(NoArgsCommand):
+    """
+    Moves uploaded media into the content-addressed store, so that files
+    uploaded more than once end up stored (and resized) only once.
+
+    With --prune, also removes files in the store that nothing points to.
+    """
+    option_list = NoArgsCommand.option_list + (
+        make_option('--dry-run', action='store_true', dest='dry_run', default=False,
+            help="Just report what would be merged; don't change anything."),
+        make_option('--prune', action='store_true', dest='prune', default=False,
+            help="Also delete files in the store that no rows refer to."),
+    )
+
+    def handle_noargs(self, **options):
+        dry_run = options['dry_run']
+        verbose = int(options['verbosity']) >= 2
+
+        seen = set(); moved = dupes = saved = 0
+        for model, fields in FILE_FIELDS:
+            for field in fields:
+                for obj in model.objects.exclude(**{field: ''}).iterator():
+                    f = getattr(obj, field)
+                    if content_store.is_shared(f.name):
+                        seen.add(f.name)
+                        continue
+                    if not content_store.exists(f.name):
+                        print "missing: %s %s %s" % (model.__name__, obj.pk, f.name)
+                        continue
+
+                    fp = File(content_store.open(f.name))
+                    try:
+                        new_name = content_name(hash_file(fp), f.name)
+                        if new_name in seen or content_store.exists(new_name):
+                            dupes += 1
+                            saved += fp.size
+                        if verbose:
+                            print "%s -> %s" % (f.name, new_name)
+                        if not dry_run:
+                            new_name = self.move(obj, field, f, fp)
+                    finally:
+                        fp.close()
+                    seen.add(new_name)
+                    moved += 1
+
+        print "%d files %s into the store; %d were duplicates (%.1f MB)" % \
+              (moved, "would be moved" if dry_run else "moved", dupes,
+               saved / (1024.0 * 1024))
+
+        if options['prune']:
+            self.prune(dry_run, verbose)
+
+    def move(self, obj, field, f, fp):
+        old_name = f.name
+        if field == 'data' and isinstance(obj, ImageFile):
+            # resized versions are named after the original, so they'd be orphaned
+            obj._clear_cache()
+        new_name = content_store.save(old_name, fp)
+
+        # update() rather than save(), so imagekit doesn't redo anything
+        type(obj).objects.filter(pk=obj.pk).update(**{field: new_name})
+
+        if not any(m.objects.filter(**{fd: old_name}).exists()
+                   for m, fields in FILE_FIELDS for fd in fields):
+            content_store.delete(old_name)
+        return new_name
+
+    def referenced_names(self):
+        names = set()
+        for model, fields in FILE_FIELDS:
+            for field in fields:
+                names.update(model.objects.values_list(field, flat=True))
+        return names
+
+    def prune(self, dry_run, verbose):
+        referenced = self.referenced_names()
+        root = content_store.path(HASH_DIR)
+        pruned = freed = 0
+        for dirpath, dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                name = os.path.join(HASH_DIR, os.path.relpath(path, root))
+                if name not in referenced:
+                    if verbose:
+                        print "pruning %s" % name
+                    pruned += 1
+                    freed += os.path.getsize(path)
+                    if not dry_run:
+                        os.remove(path)
+        print "%d unreferenced files %s (%.1f MB)" % \
+              (pruned, "would be pruned" if dry_run else "pruned",
+               freed / (1024.0 * 1024))
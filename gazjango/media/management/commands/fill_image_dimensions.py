@@ -0,0 +1,32 @@
+from django.core.management.base import NoArgsCommand
+
+from gazjango.media.models import ImageFile
+
+class Command(NoArgsCommand):
+    """
+    Fills in ImageFile.width and .height for images uploaded before those
+    were kept, so that pages showing them don't have to open the file to
+    work out their resized sizes.
+
+    Before running this the first time, add the columns:
+        ALTER TABLE media_imagefile ADD COLUMN width integer unsigned NULL,
+                                    ADD COLUMN height integer unsigned NULL;
+    """
+    def handle_noargs(self, **options):
+        verbose = int(options['verbosity']) >= 2
+
+        filled = missing = 0
+        for image in ImageFile.objects.filter(width__isnull=True).exclude(data='').iterator():
+            try:
+                width, height = image.data.width, image.data.height
+            except IOError:
+                print "missing: ImageFile %s %s" % (image.pk, image.data.name)
+                missing += 1
+                continue
+            if verbose:
+                print "%s: %dx%d" % (image.data.name, width, height)
+            # update() rather than save(), so imagekit doesn't redo anything
+            ImageFile.objects.filter(pk=image.pk).update(width=width, height=height)
+            filled += 1
+
+        print "%d images filled in, %d missing" % (filled, missing)
@@ -0,0 +1,60 @@
+from django.core.cache           import cache
+from django.core.management.base import NoArgsCommand
+from optparse import make_option
+import os.path
+
+from gazjango.media.models import ImageFile
+
+OLD_CACHE_DIR = 'resized'
+
+class Command(NoArgsCommand):
+    """
+    Moves resized images from the old flat resized/<upload path>/ layout to
+    the sharded names imagekit now looks for, so they don't all have to be
+    rendered again (and the old copies don't sit around forever).
+
+    With --delete, just removes the old copies instead of moving them.
+    """
+    option_list = NoArgsCommand.option_list + (
+        make_option('--dry-run', action='store_true', dest='dry_run', default=False,
+            help="Just report what would be done; don't change anything."),
+        make_option('--delete', action='store_true', dest='delete', default=False,
+            help="Delete the old resized images rather than moving them."),
+    )
+
+    def handle_noargs(self, **options):
+        dry_run = options['dry_run']
+        verbose = int(options['verbosity']) >= 2
+
+        moved = deleted = 0
+        for image in ImageFile.objects.exclude(data='').iterator():
+            storage = image._storage
+            for spec in image._ik.specs:
+                prop = getattr(image, spec.name())
+                old_name = os.path.join(OLD_CACHE_DIR, *prop._cache_filename())
+                if old_name == prop.name or not storage.exists(old_name):
+                    continue
+
+                if options['delete'] or storage.exists(prop.name):
+                    if verbose:
+                        print "deleting %s" % old_name
+                    if not dry_run:
+                        storage.delete(old_name)
+                    deleted += 1
+                    continue
+
+                if verbose:
+                    print "%s -> %s" % (old_name, prop.name)
+                if not dry_run:
+                    fp = storage.open(old_name)
+                    try:
+                        storage.save(prop.name, fp)
+                    finally:
+                        fp.close()
+                    storage.delete(old_name)
+                    # it's remembered as missing if anything asked already
+                    cache.delete(prop._metadata_key)
+                moved += 1
+
+        verb = "would be" if dry_run else "were"
+        print "%d resized images %s moved, %d %s deleted" % (moved, verb, deleted, verb)
@@ -1,13 +1,18 @@
 import datetime
 import re
 
+from django.core.files.storage   import default_storage
 from django.db                   import models
 from django.db.models            import signals
 
 from gazjango.accounts.models import UserProfile
 from gazjango.misc.helpers    import set_default_slug
+from gazjango.media.storage   import content_store
 
 from imagekit.models import ImageModel, ImageModelBase
+from imagekit.utils  import sharded_cache_dir
+
+from hashlib import sha1
 
 class MediaBucket(models.Model):
     """
@@ -84,13 +89,20 @@ class MediaFile(BaseFile):
     All BaseFile subclasses *except* ImageFile should probably
     inherit from this.
     """
-    data = models.FileField(upload_to="by_date/%Y/%m/%d")
+    data = models.FileField(upload_to="by_date/%Y/%m/%d", storage=content_store)
     
     def get_absolute_url(self):
         return self.data.url
     
 
 
+def _resized_url(image, spec):
+    # the version bit changes when a new file is uploaded, since the
+    # resized image is served with far-future expiry headers
+    from django.core.urlresolvers import reverse
+    url = reverse('resized-image', kwargs={'spec': spec.name(), 'pk': image.pk})
+    return '%s?v=%s' % (url, sha1(image.data.name).hexdigest()[:8])
+
 class ImageFile(BaseFile, ImageModel):
     """
     An image file. Adds a bunch of resizing stuff, from imagekit.
@@ -98,7 +110,11 @@ class ImageFile(BaseFile, ImageModel):
     # default inheritance doesn't get the metaclass, since it's second
     __metaclass__ = ImageModelBase
     
-    data = models.ImageField(upload_to="by_date/%Y/%m/%d")
+    data = models.ImageField(upload_to="by_date/%Y/%m/%d", storage=content_store,
+                             width_field='width', height_field='height')
+    # kept so that working out resized sizes never has to open the file
+    width  = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
     
     front_is_tall = models.BooleanField(default=False)
     """
@@ -109,18 +125,18 @@ class ImageFile(BaseFile, ImageModel):
     """
     
     # optional explicit cropping / resizings
-    _front_data = models.ImageField(upload_to="by_date/%Y/%m/%d", blank=True,
+    _front_data = models.ImageField(upload_to="by_date/%Y/%m/%d", storage=content_store, blank=True,
         help_text="A version of this file to show on the frontpage. Should be 350px wide"
                   "and 120-200px tall, or 320px tall and 190-250px wide, for top stories."
                   "Mid stories can be a little smaller, 280x125 or 90x155."
     )
-    _issue_data = models.ImageField(upload_to="by_date/%Y/%m/%d", blank=True,
+    _issue_data = models.ImageField(upload_to="by_date/%Y/%m/%d", storage=content_store, blank=True,
         help_text="A version of this file to show in the issue, if it's the top story. "
                   "Should be 192x192 pixels. Note that although this can look okay in the "
                   "issue if it's not exactly square, it'll look weird if the article is "
                   "a special to show up on the bar on the front page."
     )
-    _thumb_data = models.ImageField(upload_to="by_date/%Y/%m/%d", blank=True,
+    _thumb_data = models.ImageField(upload_to="by_date/%Y/%m/%d", storage=content_store, blank=True,
         help_text="A version of this file to show up at the bottom of the page, for top "
                   "stories only. Should be about 50x80."
     )
@@ -128,7 +144,9 @@ class ImageFile(BaseFile, ImageModel):
     
     class IKOptions:
         spec_module = 'gazjango.media.image_specs'
-        cache_dir = 'resized'
+        cache_dir = sharded_cache_dir('resized')
+        spec_url = _resized_url
+        storage = default_storage # not content_store: specs need their names
         image_field = 'data'
         admin_thumbnail_spec = 'adminthumb'
     
@@ -168,13 +186,16 @@ flickr_id = re.compile(r'^(?:http://)?(?:www\.)?flickr.com/photos/[^/]+/(\d+)/?'
 def get_from_flickr(url, name, user, bucket, size='Large'):
     from gazjango.scrapers import flickr
     import os, os.path
-    import time
+    import tempfile
     from urllib import urlretrieve
     from django.conf import settings
+    from django.core.files.base import File
     from django.template.defaultfilters import slugify
 
     flickr.API_KEY = settings.FLICKR_API
     flickr.API_SECRET = settings.FLICKR_SECRET
+    flickr.CACHE_DIR = getattr(settings, 'FLICKR_CACHE_DIR', None) or \
+                       os.path.join(tempfile.gettempdir(), 'gazjango-flickr')
 
     m = flickr_id.match(url)
     if m:
@@ -190,20 +211,9 @@ def get_from_flickr(url, name, user, bucket, size='Large'):
     if 'flickr.com' not in url:
         url = p.getURL(size=size, urlType='url')
 
-    dir = time.strftime("by_date/%Y/%m/%d/")
-    os_dir = os.path.join(settings.MEDIA_ROOT, dir)
-
-    if not os.path.exists(os_dir):
-        os.makedirs(os_dir)
-    elif not os.path.isdir(os_dir):
-        raise IOError("%s exists, but isn't a directory!" % os_dir)
-
     filename = size_url.split('/')[-1]
 
-    urlretrieve(size_url, os.path.join(os_dir, filename))
-
     args = {
-        'data': os.path.join(dir, filename),
         'name': name,
         'slug': slugify(name),
         'bucket': bucket,
@@ -211,8 +221,20 @@ def get_from_flickr(url, name, user, bucket, size='Large'):
     }
     if isinstance(user, basestring):
         args['author_name'] = user
+    image = ImageFile(**args)
 
-    image = ImageFile.objects.create(**args)
+    # through the content store, like uploads, so a photo we've already got
+    # (and its resized versions) isn't stored again
+    tmp_path, headers = urlretrieve(size_url)
+    try:
+        fp = open(tmp_path, 'rb')
+        try:
+            image.data.save(filename, File(fp), save=False)
+        finally:
+            fp.close()
+    finally:
+        os.remove(tmp_path)
+    image.save()
 
     if not isinstance(user, basestring):
         image.users = [user]
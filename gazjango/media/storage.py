@@ -0,0 +1,49 @@
+import os.path
+from hashlib import sha1
+
+from django.core.files.storage import FileSystemStorage
+
+HASH_DIR = 'by_hash'
+
+def hash_file(content):
+    "Returns the sha1 hex digest of a django File, reading it in chunks."
+    digest = sha1()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+def content_name(digest, name):
+    "The name a file with hash `digest`, uploaded as `name`, is stored under."
+    extension = os.path.splitext(name)[1].lower()
+    return os.path.join(HASH_DIR, digest[:2], digest[2:4], digest + extension)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores files under the hash of their contents, so uploading the same
+    file twice (for a follow-up story, say) only stores it once, and any
+    resized versions of it are shared too.
+
+    Since several rows might point to the same file, deleting is a no-op
+    for files in the store; `manage.py dedupe_media --prune` clears out
+    files that nothing points to any more.
+    """
+    def _save(self, name, content):
+        # uploads that came through misc.files.LimitedUploadHandler already
+        # know their hash
+        digest = getattr(content, 'sha1', None) or hash_file(content)
+        hashed = content_name(digest, name)
+        if self.exists(hashed):
+            return hashed
+        return super(ContentAddressedStorage, self)._save(hashed, content)
+
+    def delete(self, name):
+        if not self.is_shared(name):
+            super(ContentAddressedStorage, self).delete(name)
+
+    def is_shared(self, name):
+        return name.startswith(HASH_DIR + '/')
+
+
+content_store = ContentAddressedStorage()
@@ -5,6 +5,7 @@ from django.template          import RequestContext
 from django.shortcuts         import get_object_or_404, render_to_response
 from gazjango.media.models import MediaFile, ImageFile, MediaBucket
 from django.conf import settings
+from imagekit.views import serve_spec
 
 def _get_or_post(key, request, default=None):
     if key in request.GET:
@@ -23,3 +24,6 @@ def file(request, bucket, slug):
     except Http404:
         obj = get_object_or_404(ImageFile, bucket__slug=bucket, slug=slug)
     return HttpResponseRedirect(obj.data.url)
+
+def resized(request, spec, pk):
+    return serve_spec(request, ImageFile, pk, spec)
@@ -1,22 +1,65 @@
-import os, os.path
+from hashlib import sha1
+
 from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler, SkipFile
+
+# Largest upload we'll take, in bytes, by content type. Keys ending in '/'
+# match the whole family; None is the default for everything else.
+UPLOAD_SIZE_LIMITS = getattr(settings, 'UPLOAD_SIZE_LIMITS', {
+    'image/': 8 * 1024 * 1024,
+    'application/pdf': 20 * 1024 * 1024,
+    None: 10 * 1024 * 1024,
+})
+
+def size_limit(content_type, limits=UPLOAD_SIZE_LIMITS):
+    "Returns the size limit for `content_type` from `limits`."
+    content_type = (content_type or '').lower()
+    if content_type in limits:
+        return limits[content_type]
+    family = content_type.split('/')[0] + '/'
+    return limits.get(family, limits[None])
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams every upload straight to a temporary file on disk, however small,
+    working out its sha1 (as the `sha1` attribute of the resulting file) on
+    the way through.
+
+    Files over the size limit for their content type are dropped as soon as
+    they cross it, rather than after the whole thing has come in; their field
+    names end up in `too_large`.
+
+    Has to be installed before request.POST or request.FILES are touched:
+        request.upload_handlers = [LimitedUploadHandler(request)]
+    """
+    def __init__(self, request=None, limits=UPLOAD_SIZE_LIMITS):
+        super(LimitedUploadHandler, self).__init__(request)
+        self.limits = limits
+        self.too_large = []
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None):
+        super(LimitedUploadHandler, self).new_file(field_name, file_name,
+                content_type, content_length, charset)
+        self.digest = sha1()
+        self.received = 0
+        self.limit = size_limit(content_type, self.limits)
+        if content_length and content_length > self.limit:
+            self.skip()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.limit:
+            self.skip()
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        f = super(LimitedUploadHandler, self).file_complete(file_size)
+        f.sha1 = self.digest.hexdigest()
+        return f
 
-def handle_file_upload(f, folder_name, return_full_path=False):
-    """Save an uploaded file into the appropriate location."""
-    
-    directory = os.path.join(settings.MEDIA_ROOT, folder_name)
-    if not os.path.isdir(directory):
-        os.makedirs(directory)
-    
-    name = f.name
-    while os.path.isfile(os.path.join(directory, name)):
-        name = '_' + name
-    
-    dest = open(os.path.join(directory, name), 'wb+')
-    for chunk in f.chunks():
-        dest.write(chunk)
-
-    if return_full_path:
-        return os.path.join(directory, name)
-    else:
-        return os.path.join(folder_name, name)
+    def skip(self):
+        self.too_large.append(self.field_name)
+        self.file.close()
+        raise SkipFile
@@ -7,6 +7,7 @@ from django.template.defaultfilters import slugify
 
 import datetime
 import re
+import time
 from hashlib import sha1
 
 def is_from_swat(user=None, ip=None):
@@ -149,20 +150,114 @@ def smart_truncate(string, length, min_length_diff=15):
     return string[:length] + '...'
 
 
-def cache(seconds=900):
+# how long one process gets to recompute a cached value before someone
+# else may try, and how long everyone else waits for a first value to show up
+CACHE_LOCK_TIMEOUT = 60
+CACHE_WAIT = 5
+
+# cached_value's entries are (value, fresh_until) pairs; they're kept under
+# keys with this prefix so they can't be mixed up with anything cached
+# under the same name in some older format
+CACHE_KEY_PREFIX = 'cv1:'
+
+# the most keys kept in the in-process cache at once
+LOCAL_CACHE_SIZE = 1000
+
+_local_cache = {}
+
+def _remember_locally(key, value, until):
+    if key not in _local_cache and len(_local_cache) >= LOCAL_CACHE_SIZE:
+        now = time.time()
+        for old in [k for k, v in _local_cache.items() if v[1] <= now]:
+            _local_cache.pop(old, None)
+        if len(_local_cache) >= LOCAL_CACHE_SIZE:
+            _local_cache.clear()
+    _local_cache[key] = (value, until)
+
+def _get_entry(key):
+    "Gets a (value, fresh_until) pair from the cache, or None."
+    entry = _djcache.get(key)
+    if isinstance(entry, tuple) and len(entry) == 2:
+        return entry
+    return None
+
+def cached_value(key, compute, seconds=900, stale=60, local=5,
+                 timeout_for=None, force=False):
+    """
+    Returns the value cached under `key`, computing and caching it with
+    `compute(old_value)` (where `old_value` is whatever was cached before,
+    or None) if it's not there or is more than `seconds` old.
+    
+    Only one process recomputes a value at a time: for `stale` seconds after
+    a value's gone out of date, everyone else gets the old value in the
+    meantime, and if there's no value at all, they wait a few seconds for it.
+    Results of None are cached like anything else.
+    
+    Values are also kept in a dictionary in this process for `local`
+    seconds, so that lots of calls in a row don't all go to the cache.
+    
+    `timeout_for(value)`, if given, overrides `seconds` for that value
+    (so that errors can be tried again sooner, say). With `force`, the value
+    is recomputed no matter what.
+    """
+    key = CACHE_KEY_PREFIX + key
+    now = time.time()
+    if not force:
+        hit = _local_cache.get(key)
+        if hit and now < hit[1]:
+            return hit[0]
+    
+    entry = _get_entry(key)
+    if entry is not None and now < entry[1] and not force:
+        _remember_locally(key, entry[0], min(now + local, entry[1]))
+        return entry[0]
+    old_value = entry[0] if entry is not None else None
+    
+    lock_key = key + '-lock'
+    if force or _djcache.add(lock_key, True, CACHE_LOCK_TIMEOUT):
+        try:
+            value = compute(old_value)
+            fresh_for = timeout_for(value) if timeout_for else seconds
+            _djcache.set(key, (value, now + fresh_for), fresh_for + stale)
+            _remember_locally(key, value, now + min(local, fresh_for))
+            return value
+        finally:
+            if not force:
+                _djcache.delete(lock_key)
+    
+    # someone else is working on it
+    if entry is not None:
+        return old_value
+    waited = 0
+    while waited < CACHE_WAIT:
+        time.sleep(0.1)
+        waited += 0.1
+        entry = _get_entry(key)
+        if entry is not None:
+            return entry[0]
+    return compute(None)
+
+
+def cache(seconds=900, key=None, stale=60, local=5):
     """
     Caches the results of a function call for the specified number of seconds,
-    using the standard Django cache. Assumes it is a pure function (ie only
-    depends on its arguments); note also that the exact argument string matters.
-    Also note that a result of None will not be cached.
+    using cached_value (see above). Assumes it is a pure function (ie only
+    depends on its arguments).
+    
+    `key` is a function that takes the same arguments and returns a string
+    identifying the call; by default it's built from the arguments' reprs,
+    which is only any good for simple arguments (not, say, requests).
     """
     def doCache(f):
         def x(*args, **kwargs):
-            key = sha1(str(f.__module__) + str(f.__name__) + str(args) + str(kwargs)).hexdigest()
-            result = _djcache.get(key)
-            if result is None:
-                result = f(*args, **kwargs)
-                _djcache.set(key, result, seconds)
-            return result
+            if key:
+                call = key(*args, **kwargs)
+            else:
+                call = repr(args) + repr(sorted(kwargs.items()))
+            cache_key = sha1('%s.%s:%s' % (f.__module__, f.__name__, call)).hexdigest()
+            return cached_value(cache_key, lambda old: f(*args, **kwargs),
+                                seconds=seconds, stale=stale, local=local)
+        x.__name__ = f.__name__
+        x.__doc__ = f.__doc__
         return x
     return doCache
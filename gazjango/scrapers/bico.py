@@ -1,6 +1,7 @@
 import urllib2
-import feedparser
 import re
+from fastfeed import parse_entries
+from fetch    import fetch
 
 BASE_URL = "http://www.biconews.com/?feed=rss2&cat="
 CATEGORIES = {
@@ -22,9 +23,11 @@ def cache_item_name(order=DEFAULT_ORDER):
 
 def get_bico_news(order=DEFAULT_ORDER, override_cache=False):
     """
-    Caches the BiCo News feed.
+    Caches the BiCo News feed. When the cached version goes out of date,
+    only one process refetches it; the rest keep using the old one.
     
-    Feed results for a given order are stored in the cache like this:
+    Feed results for a given order are stored in the cache (along with when
+    they go out of date) like this:
     
     bico_news_features_sports => [
         {'author': ..., 'headline': ..., 'link': ...},
@@ -33,26 +36,28 @@ def get_bico_news(order=DEFAULT_ORDER, override_cache=False):
     ]
     """
     # so we can use the main file w/o django...
-    from django.core.cache import cache
+    from gazjango.misc.helpers import cached_value
     
-    key = cache_item_name(order)
-    cached = cache.get(key)
-    
-    if cached and not override_cache:
-        return cached
-    else:
+    def compute(cached):
         try:
-            results = get_bico_news_directly(order)
-            cache.set(key, results, 13 * 60 * 60)
-            return results
+            # if we have good results already, only redo them if BiCo's changed
+            have_results = cached and cached != "error"
+            results = get_bico_news_directly(order, if_changed=have_results)
+            return cached if results is None else results
         except urllib2.URLError:
             # TODO: log this somehow
-            cache.set(key, "error", 1 * 60 * 60)
             return "error"
+    
+    return cached_value(cache_item_name(order), compute, force=override_cache,
+                        timeout_for=lambda r: 1*60*60 if r == "error" else 13*60*60,
+                        stale=15*60, local=60)
 
 
-def get_bico_news_directly(order=DEFAULT_ORDER):
-    """Gets the bico news, not doing any caching or anything."""
+def get_bico_news_directly(order=DEFAULT_ORDER, if_changed=False):
+    """
+    Gets the bico news, not doing any caching or anything. If `if_changed`
+    is set, returns None if none of the feeds have changed since last time.
+    """
     # NOTE: if we can assume that the main feed will always contain
     #       enough entries of each type, we could use that, and only
     #       have to read / parse one feed. however, this is often not
@@ -60,26 +65,27 @@ def get_bico_news_directly(order=DEFAULT_ORDER):
     #       seem to be uploaded last, so the main feed tends to be
     #       mostly Last Words.
     
+    fetched = dict((cat, fetch(BASE_URL + CATEGORIES[cat])) for cat in set(order))
+    if if_changed and not any(f.changed for f in fetched.values()):
+        return None
+    
     feeds = {}
     result = []
     
     for cat in order:
         if cat in feeds:
-            feed, index = feeds[cat]
+            entries, index = feeds[cat]
             index += 1
-            feeds[cat] = (feed, index)
+            feeds[cat] = (entries, index)
         else:
-            try:
-                url = urllib2.urlopen(BASE_URL + CATEGORIES[cat])
-            except urllib2.URLError, e:
-                raise e
-            
-            feed = feedparser.parse(url)
+            # we only need as many from each feed as it appears in order
+            entries = list(parse_entries(fetched[cat].body, limit=order.count(cat),
+                                         fields=('title', 'link', 'content')))
             index = 0
-            feeds[cat] = (feed, index)
+            feeds[cat] = (entries, index)
         
         try:
-            entry = feed.entries[index]
+            entry = entries[index]
         except IndexError:
             continue
         
@@ -101,4 +107,6 @@ def get_bico_news_directly(order=DEFAULT_ORDER):
             'author': author
         })
     
+    for f in fetched.values():
+        f.remember()
     return result
@@ -1,19 +1,23 @@
 from datetime import date, timedelta
-import feedparser
 import re
+import urllib2
+from fastfeed import parse_entries
+from fetch    import fetch
 
 RSS_URL = "http://calendar.swarthmore.edu/calendar/RSSSyndicator.aspx?category=" \
           "&location=&type=N&binary=N&keywords="
 
-def scrape_events_feed(start=None, end=None):
+def fetch_events_feed(start=None, end=None):
     """
-    Gets events from the College's RSS feed calendar.
+    Fetches the College's RSS feed calendar, returning a fetch.Fetched whose
+    body can be handed to parse_events_feed. Raises urllib2.URLError if the
+    feed can't be loaded.
     
     If `start` is passed, start at the given date; defaults to today.
     Note that this is not reliable for past dates.
     
     If `end` is passed, don't return any events after the specified date.
-    """    
+    """
     start_date = start if start else date.today()
     # if we have a num, try a week; if that's not enough we'll add more later
     end_date = end if end else date.today() + timedelta(days=7)
@@ -21,15 +25,29 @@ def scrape_events_feed(start=None, end=None):
     url = RSS_URL
     url += "&starting=%s" % start_date.strftime("%m/%d/%Y")
     url += "&ending=%s"   %   end_date.strftime("%m/%d/%Y")
-    
-    feed = feedparser.parse(url)
+    return fetch(url)
+
+def scrape_events_feed(start=None, end=None):
+    """
+    Gets events from the College's RSS feed calendar; see fetch_events_feed
+    for `start` and `end`.
+    """
+    try:
+        fetched = fetch_events_feed(start, end)
+    except urllib2.URLError:
+        # TODO: log this error somehow
+        return []
+    return parse_events_feed(fetched.body)
+
+def parse_events_feed(body):
+    "Parses the calendar feed `body` into a list of event dictionaries."
     events = []
     
     d = r'(?P<month%(s)s>\d{1,2})/(?P<day%(s)s>\d{1,2})/(?P<year%(s)s>\d{4})'
     reps = tuple(d % {'s': '_' + str(i)} for i in (1,2))
     title_pattern = re.compile(r'^(?P<name>.*)\s+\(%s(?: - %s)?\)$' % reps)
     
-    for entry in feed.entries:
+    for entry in parse_entries(body, fields=('title', 'link')):
         match = re.match(title_pattern, entry.title.strip())
         if match:
             d = match.groupdict()
@@ -0,0 +1,174 @@
+"""
+A quick way to get the entries out of a feed, for when all we want from each
+is its title, link, date or first bit of content.
+
+feedparser builds and sanitizes the whole feed before giving any of it back;
+this reads the feed as a stream of SAX events, keeps only the fields asked
+for, and hands back each entry as soon as it's finished, so callers that
+only need the first few can stop early.
+
+    for entry in parse_entries(body, fields=('title', 'link'), limit=3):
+        print entry.title, entry.link
+
+Entries are FeedParserDicts with the same keys feedparser would use (title,
+link, id, summary, content, updated and updated_parsed), so they can stand
+in for feedparser's. Unlike feedparser's, though, their HTML is NOT
+sanitized: don't put it on a page without cleaning it up first.
+
+Feeds that aren't well-formed XML (which happens) are handed off to
+feedparser's forgiving parser instead.
+"""
+
+from cStringIO import StringIO
+import xml.sax
+import xml.sax.handler
+import xml.sax.saxutils
+
+import feedparser
+
+FIELDS = ('title', 'link', 'date', 'summary', 'content', 'id')
+
+ENTRY_TAGS = ('item', 'entry')
+
+CONTENT_NS = 'http://purl.org/rss/1.0/modules/content/'
+DC_NS = 'http://purl.org/dc/elements/1.1/'
+
+# (namespace, tag) for the bits of an entry we know about; a namespace of
+# None matches any namespace (RSS has none, Atom has a couple)
+ELEMENTS = {
+    (None, 'title'): 'title',
+    (None, 'link'): 'link',
+    (None, 'guid'): 'id',
+    (None, 'id'): 'id',
+    (None, 'description'): 'summary',
+    (None, 'summary'): 'summary',
+    (None, 'content'): 'content',
+    (CONTENT_NS, 'encoded'): 'content',
+    (None, 'pubDate'): 'date',
+    (None, 'updated'): 'date',
+    (None, 'published'): 'date',
+    (None, 'modified'): 'date',
+    (None, 'issued'): 'date',
+    (DC_NS, 'date'): 'date',
+}
+
+class _EntryHandler(xml.sax.handler.ContentHandler):
+    def __init__(self, fields):
+        xml.sax.handler.ContentHandler.__init__(self)
+        self.fields = set(fields)
+        self.done = []
+        self.entry = None
+        self.field = None    # what we're reading the text of, if anything
+        self.depth = 0       # how far inside that field's element we are
+        self.text = []
+
+    def _field_for(self, namespace, tag):
+        return ELEMENTS.get((namespace, tag)) or \
+               (namespace != CONTENT_NS and namespace != DC_NS and
+                ELEMENTS.get((None, tag)))
+
+    def startElementNS(self, name, qname, attrs):
+        namespace, tag = name
+        if self.entry is None:
+            if tag in ENTRY_TAGS:
+                self.entry = feedparser.FeedParserDict()
+            return
+
+        if self.field:
+            # markup inside the field (atom's type="xhtml"); keep it as it is
+            self.depth += 1
+            attributes = ''.join(' %s=%s' % (key[1], xml.sax.saxutils.quoteattr(value))
+                                 for key, value in attrs.items())
+            self.text.append('<%s%s>' % (tag, attributes))
+            return
+
+        field = self._field_for(namespace, tag)
+        if field not in self.fields or field in self.entry or \
+           (field == 'date' and 'updated' in self.entry):
+            return
+
+        if field == 'link' and attrs.getLength():
+            # atom puts links in attributes, and can have several
+            if attrs.get((None, 'rel'), 'alternate') == 'alternate' and \
+               attrs.get((None, 'href')):
+                self.entry['link'] = attrs.get((None, 'href'))
+            return
+
+        self.field = field
+        self.depth = 0
+        self.text = []
+        self.content_type = attrs.get((None, 'type'), 'text/html')
+
+    def characters(self, content):
+        if self.field:
+            self.text.append(xml.sax.saxutils.escape(content) if self.depth else content)
+
+    def endElementNS(self, name, qname):
+        namespace, tag = name
+        if self.field:
+            if self.depth:
+                self.depth -= 1
+                self.text.append('</%s>' % tag)
+                return
+            value = u''.join(self.text).strip()
+            if self.field == 'date':
+                self.entry['updated'] = value
+                self.entry['updated_parsed'] = feedparser._parse_date(value)
+            elif self.field == 'content':
+                self.entry['content'] = [feedparser.FeedParserDict(
+                    value=value, type=self.content_type)]
+            else:
+                self.entry[self.field] = value
+            self.field = None
+        elif self.entry is not None and tag in ENTRY_TAGS:
+            self.done.append(self.entry)
+            self.entry = None
+
+
+def iter_entries(source, fields=FIELDS, limit=None, chunk_size=16 * 1024):
+    """
+    Yields the entries in `source` (a string of the feed, as it came over
+    the wire, or a file) one by one, as they're read, stopping after `limit`
+    of them if it's given. Only the given `fields` are filled in.
+
+    Raises xml.sax.SAXException if the feed isn't well-formed.
+    """
+    handler = _EntryHandler(fields)
+    parser = xml.sax.make_parser()
+    parser.setFeature(xml.sax.handler.feature_namespaces, True)
+    parser.setFeature(xml.sax.handler.feature_external_ges, False)
+    parser.setContentHandler(handler)
+
+    stream = StringIO(source) if isinstance(source, str) else source
+    count = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if chunk:
+            parser.feed(chunk)
+        else:
+            parser.close()
+        while handler.done:
+            yield handler.done.pop(0)
+            count += 1
+            if limit is not None and count >= limit:
+                return
+        if not chunk:
+            return
+
+
+def parse_entries(source, fields=FIELDS, limit=None):
+    """
+    Like iter_entries, but if the feed turns out not to be well-formed,
+    gets the rest of the entries from feedparser instead.
+    """
+    count = 0
+    try:
+        for entry in iter_entries(source, fields, limit):
+            yield entry
+            count += 1
+    except xml.sax.SAXException:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        entries = feedparser.parse(source).entries
+        for entry in entries[count:limit]:
+            yield entry
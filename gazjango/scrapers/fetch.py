@@ -0,0 +1,114 @@
+"""
+Fetches feeds over HTTP, remembering what they looked like last time, so
+that scrapers can skip reparsing (and rewriting) feeds that haven't changed.
+
+For each URL we keep its ETag and Last-Modified headers, which we send back
+so the server can just say "304 Not Modified", and a hash of its body, for
+servers that don't bother with either. By default these live in the Django
+cache.
+
+Whatever keeps the results does something like
+
+    fetched = fetch(url)
+    if not fetched.changed:
+        return
+    ...parse fetched.body and save what's in it...
+    fetched.remember()
+
+only calling remember() once the new version is safely stored, so a feed
+that breaks the parser (or a failed write) gets another go next time. The
+scrapers themselves just fetch and parse, leaving that to their callers.
+"""
+
+from hashlib import sha1
+import urllib2
+
+STATE_TIMEOUT = 30 * 24 * 60 * 60
+
+class CacheStore(object):
+    """
+    Keeps fetch state in the Django cache, or just in memory when the
+    scrapers are being used without django.
+    """
+    def __init__(self):
+        self.local = {}
+
+    def _cache(self):
+        try:
+            from django.core.cache import cache
+            return cache
+        except ImportError:
+            return None
+
+    def get(self, key):
+        cache = self._cache()
+        return cache.get(key) if cache is not None else self.local.get(key)
+
+    def set(self, key, value):
+        cache = self._cache()
+        if cache is not None:
+            cache.set(key, value, STATE_TIMEOUT)
+        else:
+            self.local[key] = value
+
+
+default_store = CacheStore()
+
+
+class Fetched(object):
+    """
+    The result of a fetch: `body` is the feed (whether it came over the wire
+    or, if it hadn't changed, from last time) and `changed` is whether it's
+    any different from the last version we remember()ed.
+    """
+    def __init__(self, store, key, body, changed, state):
+        self.store = store
+        self.key = key
+        self.body = body
+        self.changed = changed
+        self.state = state
+
+    def remember(self):
+        "Marks this version of the feed as dealt with."
+        self.store.set(self.key, self.state)
+
+
+def fetch(url, key=None, store=None):
+    """
+    Fetches `url`, conditionally if we've seen it before, and returns a
+    Fetched. `key` distinguishes different uses of the same feed (the menu
+    for today and for tomorrow, say), which each need to see it change.
+
+    Errors are raised as urllib2.URLError, as they would be for urlopen.
+    """
+    store = store or default_store
+    key = 'fetch-state-' + sha1(key or url).hexdigest()
+    old = store.get(key) or {}
+
+    request = urllib2.Request(url)
+    if old.get('etag'):
+        request.add_header('If-None-Match', old['etag'])
+    if old.get('modified'):
+        request.add_header('If-Modified-Since', old['modified'])
+
+    try:
+        response = urllib2.urlopen(request)
+    except urllib2.HTTPError, e:
+        if e.code == 304 and 'body' in old:
+            return Fetched(store, key, old['body'], False, old)
+        raise
+
+    try:
+        body = response.read()
+        info = response.info()
+    finally:
+        response.close()
+
+    digest = sha1(body).hexdigest()
+    state = {
+        'etag': info.getheader('ETag'),
+        'modified': info.getheader('Last-Modified'),
+        'digest': digest,
+        'body': body,
+    }
+    return Fetched(store, key, body, digest != old.get('digest'), state)
@@ -29,6 +29,12 @@ from urllib import urlencode, urlopen
 from xml.dom import minidom
 import hashlib
 import os
+import time
+
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
 
 HOST = 'http://flickr.com'
 API = '/services/rest'
@@ -52,6 +58,21 @@ tokenPath = ''
 tokenFile = 'token.txt'
 
 
+# Unauthenticated GET responses are kept in files here, if it's set, and
+# used again for CACHE_TTL seconds (set these using flickr.CACHE_DIR, etc)
+CACHE_DIR = None
+CACHE_TTL = 60 * 60
+
+# What the methods that list photos ask to get along with each one, so
+# that we needn't call photos.getInfo for each of them afterwards.
+DEFAULT_EXTRAS = 'license,date_upload,date_taken,owner_name,description,' \
+                 'url_sq,url_t,url_s,url_m,url_l,url_o'
+
+# the size label (as in getURL) for each of the url_* extras
+URL_EXTRAS = {'url_sq': 'Square', 'url_t': 'Thumbnail', 'url_s': 'Small',
+              'url_m': 'Medium', 'url_l': 'Large', 'url_o': 'Original'}
+
+
 class FlickrError(Exception): pass
 
 class Photo(object):
@@ -68,8 +89,10 @@ class Photo(object):
                  title=None, description=None, ispublic=None, \
                  isfriend=None, isfamily=None, cancomment=None, \
                  canaddmeta=None, comments=None, tags=None, secret=None, \
-                 isfavorite=None, server=None, farm=None, license=None, rotation=None):
-        """Must specify id, rest is optional."""
+                 isfavorite=None, server=None, farm=None, license=None, rotation=None, \
+                 dateposted=None, datetaken=None, urls=None):
+        """Must specify id, rest is optional. `urls` maps size labels to
+        the photo's image url at that size, as from the url_* extras."""
         self.__loaded = False
         self.__cancomment = cancomment
         self.__canaddmeta = canaddmeta
@@ -90,8 +113,9 @@ class Photo(object):
         self.__tags = tags
         self.__title = title
         
-        self.__dateposted = None
-        self.__datetaken = None
+        self.__dateposted = dateposted
+        self.__datetaken = datetaken
+        self.__urls = urls or {}
         self.__takengranularity = None
         self.__permcomment = None
         self.__permaddmeta = None
@@ -103,10 +127,12 @@ class Photo(object):
             super(Photo, self).__setattr__(key, value)
 
     def __getattr__(self, key):
-        if not self.__loaded:
-            self._load_properties()
         if key in self.__class__.__readonly:
-            return super(Photo, self).__getattribute__("_%s__%s" % (self.__class__.__name__, key))
+            # only go to flickr for things we weren't given up front
+            name = "_%s__%s" % (self.__class__.__name__, key)
+            if super(Photo, self).__getattribute__(name) is None and not self.__loaded:
+                self._load_properties()
+            return super(Photo, self).__getattribute__(name)
         else:
             return super(Photo, self).__getattribute__(key)
 
@@ -226,6 +252,8 @@ class Photo(object):
         'url' - flickr page of photo
         'source' - image file
         """
+        if urlType == 'source' and size in self.__urls:
+            return self.__urls[size]
         method = 'flickr.photos.getSizes'
         data = _doget(method, photo_id=self.id)
         for psize in data.rsp.sizes.size:
@@ -316,16 +344,13 @@ class Photoset(object):
     def __str__(self):
         return '<Flickr Photoset %s>' % self.id
     
-    def getPhotos(self):
+    def getPhotos(self, extras=DEFAULT_EXTRAS, per_page='', page=''):
         """Returns list of Photos."""
         method = 'flickr.photosets.getPhotos'
-        data = _doget(method, photoset_id=self.id)
-        photos = data.rsp.photoset.photo
-        p = []
-        for photo in photos:
-            p.append(Photo(photo.id, title=photo.title, secret=photo.secret, \
-                           server=photo.server))
-        return p    
+        data = _doget(method, photoset_id=self.id, extras=extras, \
+                      per_page=per_page, page=page)
+        photoset = data.rsp.photoset
+        return _parse_photos(photoset, owner=getattr(photoset, 'owner', None))
 
     def editPhotos(self, photos, primary=None):
         """Edit the photos in this set.
@@ -570,15 +595,12 @@ class Group(object):
     def __str__(self):
         return '<Flickr Group %s>' % self.id
     
-    def getPhotos(self, tags='', per_page='', page=''):
+    def getPhotos(self, tags='', per_page='', page='', extras=DEFAULT_EXTRAS):
         """Get a list of photo objects for this group"""
         method = 'flickr.groups.pools.getPhotos'
         data = _doget(method, group_id=self.id, tags=tags,\
-                      per_page=per_page, page=page)
-        photos = []
-        for photo in data.rsp.photos.photo:
-            photos.append(_parse_photo(photo))
-        return photos
+                      per_page=per_page, page=page, extras=extras)
+        return _parse_photos(data.rsp.photos)
 
     def add(self, photo):
         """Adds a Photo to the group"""
@@ -612,7 +634,7 @@ def photos_search(user_id='', auth=False,  tags='', tag_mode='', text='',\
                   min_upload_date='', max_upload_date='',\
                   min_taken_date='', max_taken_date='', \
                   license='', per_page='', page='', sort='',\
-                  safe_search='', content_type='' ):
+                  safe_search='', content_type='', extras=DEFAULT_EXTRAS):
     """Returns a list of Photo objects.
 
     If auth=True then will auth the user.  Can see private etc
@@ -627,15 +649,8 @@ def photos_search(user_id='', auth=False,  tags='', tag_mode='', text='',\
                   license=license, per_page=per_page,\
                   page=page, sort=sort,  safe_search=safe_search, \
                   content_type=content_type, \
-                  tag_mode=tag_mode)
-    photos = []
-    if data.rsp.photos.__dict__.has_key('photo'):
-        if isinstance(data.rsp.photos.photo, list):
-            for photo in data.rsp.photos.photo:
-                photos.append(_parse_photo(photo))
-        else:
-            photos = [_parse_photo(data.rsp.photos.photo)]
-    return photos
+                  tag_mode=tag_mode, extras=extras)
+    return _parse_photos(data.rsp.photos)
 
 def photos_search_pages(user_id='', auth=False,  tags='', tag_mode='', text='',\
                   min_upload_date='', max_upload_date='',\
@@ -674,18 +689,12 @@ def people_findByUsername(username):
     return user
 
 #XXX: Should probably be in User as a list User.public
-def people_getPublicPhotos(user_id, per_page='', page=''):
+def people_getPublicPhotos(user_id, per_page='', page='', extras=DEFAULT_EXTRAS):
     """Returns list of Photo objects."""
     method = 'flickr.people.getPublicPhotos'
-    data = _doget(method, user_id=user_id, per_page=per_page, page=page)
-    photos = []
-    if hasattr(data.rsp.photos, "photo"): # Check if there are photos at all (may be been paging too far).
-        if isinstance(data.rsp.photos.photo, list):
-            for photo in data.rsp.photos.photo:
-                photos.append(_parse_photo(photo))
-        else:
-            photos = [_parse_photo(data.rsp.photos.photo)]
-    return photos
+    data = _doget(method, user_id=user_id, per_page=per_page, page=page, \
+                  extras=extras)
+    return _parse_photos(data.rsp.photos)
 
 #XXX: These are also called from User
 def favorites_getList(user_id='', per_page='', page=''):
@@ -835,14 +844,26 @@ def _doget(method, auth=False, **params):
     #print "***** do get %s" % method
 
     params = _prepare_params(params)
+    suffix = _get_auth_url_suffix(method, auth, params)
     url = '%s%s/?api_key=%s&method=%s&%s%s'% \
-          (HOST, API, API_KEY, method, urlencode(params),
-                  _get_auth_url_suffix(method, auth, params))
+          (HOST, API, API_KEY, method, urlencode(params), suffix)
 
     #another useful debug print statement
     #print url
-    
-    return _get_data(minidom.parse(urlopen(url)))
+
+    # authenticated responses might be private, so they're never cached
+    path = None
+    if CACHE_DIR and not suffix:
+        path = _cache_path(method, params)
+        body = _read_cache(path)
+        if body is not None:
+            return _get_data(_parse(body))
+
+    body = urlopen(url).read()
+    data = _get_data(_parse(body))
+    if path:
+        _write_cache(path, body)
+    return data
 
 def _dopost(method, auth=False, **params):
     #uncomment to check you aren't killing the flickr server
@@ -860,7 +881,7 @@ def _dopost(method, auth=False, **params):
     #print url
     #print payload
     
-    return _get_data(minidom.parse(urlopen(url, payload)))
+    return _get_data(_parse(urlopen(url, payload).read()))
 
 def _prepare_params(params):
     """Convert lists to strings with ',' between items."""
@@ -869,10 +890,56 @@ def _prepare_params(params):
             params[key] = ','.join([item for item in value])
     return params
 
+def _cache_path(method, params):
+    """Where the response to `method` with `params` is kept in CACHE_DIR."""
+    query = urlencode(sorted(params.items()))
+    key = hashlib.sha1('%s %s %s' % (API_KEY, method, query)).hexdigest()
+    return os.path.join(CACHE_DIR, key[:2], key + '.xml')
+
+def _read_cache(path):
+    """Returns the cached response at `path`, or None if there isn't one
+    from the last CACHE_TTL seconds."""
+    try:
+        if time.time() - os.path.getmtime(path) < CACHE_TTL:
+            return open(path, 'rb').read()
+    except (IOError, OSError):
+        pass
+    return None
+
+def _write_cache(path, body):
+    """Saves `body` at `path`; the cache is only an optimization, so this
+    doesn't complain if it can't."""
+    try:
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        temp = '%s.%d.tmp' % (path, os.getpid())
+        f = open(temp, 'wb')
+        try:
+            f.write(body)
+        finally:
+            f.close()
+        os.rename(temp, path)
+    except (IOError, OSError):
+        pass
+
+def _parse(body):
+    """Turns the XML of a response into the same Bags that unmarshal()
+    makes out of its minidom document, but with cElementTree, which is a
+    good deal quicker."""
+    root = ElementTree.fromstring(body)
+    data = Bag()
+    setattr(data, root.tag, _unmarshal_element(root))
+    return data
+
 def _get_data(xml):
     """Given a bunch of XML back from Flickr, we turn it into a data structure
-    we can deal with (after checking for errors)."""
-    data = unmarshal(xml)
+    we can deal with (after checking for errors). `xml` is either a minidom
+    document or, from _parse(), what unmarshal() would have made of one."""
+    if isinstance(xml, Bag):
+        data = xml
+    else:
+        data = unmarshal(xml)
     if not data.rsp.stat == 'ok':
         msg = "ERROR [%s]: %s" % (data.rsp.err.code, data.rsp.err.msg)
         raise FlickrError, msg
@@ -926,20 +993,35 @@ def _get_auth_url_suffix(method, auth, params):
     
     return '&auth_token=%s&api_sig=%s' % (token, api_signature) 
 
-def _parse_photo(photo):
-    """Create a Photo object from photo data."""
-    owner = User(photo.owner)
-    title = photo.title
-    ispublic = photo.ispublic
-    isfriend = photo.isfriend
-    isfamily = photo.isfamily
-    secret = photo.secret
-    server = photo.server
-    p = Photo(photo.id, owner=owner, title=title, ispublic=ispublic,\
-              isfriend=isfriend, isfamily=isfamily, secret=secret, \
-              server=server)        
+def _parse_photo(photo, owner=None):
+    """Create a Photo object from photo data, along with whatever extras
+    came with it. `owner` is the owner's id, if it's not given for each
+    photo (as in photosets)."""
+    get = lambda key: getattr(photo, key, None)
+
+    owner = get('owner') or owner
+    if owner is not None:
+        owner = User(owner, username=get('ownername'))
+    description = get('description')
+    if description is not None:
+        description = description.text
+    urls = dict((URL_EXTRAS[key], get(key)) for key in URL_EXTRAS if get(key))
+
+    p = Photo(photo.id, owner=owner, title=get('title'), ispublic=get('ispublic'),\
+              isfriend=get('isfriend'), isfamily=get('isfamily'), secret=get('secret'), \
+              server=get('server'), farm=get('farm'), license=get('license'), \
+              description=description, dateuploaded=get('dateupload'), \
+              dateposted=get('dateupload'), datetaken=get('datetaken'), urls=urls)
     return p
 
+def _parse_photos(photos, owner=None):
+    """Create a list of Photos from the photo elements (however many there
+    are, including none) under `photos`."""
+    photo = getattr(photos, 'photo', [])
+    if not isinstance(photo, list):
+        photo = [photo]
+    return [_parse_photo(p, owner=owner) for p in photo]
+
 #stolen methods
 
 class Bag: pass
@@ -980,6 +1062,28 @@ def unmarshal(element):
         setattr(rc, 'text', text)
     return rc
 
+def _unmarshal_element(element):
+    """unmarshal() for an ElementTree element."""
+    rc = Bag()
+    for key, value in element.attrib.items():
+        setattr(rc, key, unicode(value))
+
+    children = element.getchildren()
+    if children:
+        for child in children:
+            key = child.tag
+            if hasattr(rc, key):
+                if type(getattr(rc, key)) <> type([]):
+                    setattr(rc, key, [getattr(rc, key)])
+                setattr(rc, key, getattr(rc, key) + [_unmarshal_element(child)])
+            elif key == 'Details':
+                setattr(rc, key, [_unmarshal_element(child)])
+            else:
+                setattr(rc, key, _unmarshal_element(child))
+    else:
+        setattr(rc, 'text', unicode(element.text or ''))
+    return rc
+
 #unique items from a list from the cookbook
 def uniq(alist):    # Fastest without order preserving
     set = {}
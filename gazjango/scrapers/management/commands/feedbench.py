@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+from multiprocessing import Process, Queue
+from optparse import make_option
+import os.path
+import resource
+import time
+
+from gazjango.scrapers import feedparser
+from gazjango.scrapers.fastfeed import parse_entries, FIELDS
+from gazjango.scrapers.testdata import TESTDATA, CORPUS
+
+class Command(BaseCommand):
+    help = ("Times parsing feeds with feedparser and with the fast path in "
+            "scrapers.fastfeed, by default on the feeds saved with the tests.")
+    args = '[feed.xml ...]'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--runs', type='int', dest='runs', default=5,
+            help='How many times to parse each feed; the best is reported.'),
+        make_option('--limit', type='int', dest='limit', default=None,
+            help='Have the fast path stop after this many entries.'),
+        make_option('--fields', dest='fields', default=','.join(FIELDS),
+            help='Comma-separated fields for the fast path to fill in.'),
+    )
+
+    def handle(self, *paths, **options):
+        paths = paths or [os.path.join(TESTDATA, name) for name in CORPUS]
+        fields = options['fields'].split(',')
+
+        print '%-20s %8s %-6s %8s %9s %9s' % \
+            ('feed', 'KB', 'mode', 'entries', 'seconds', 'peak MB')
+        for path in paths:
+            body = open(path).read()
+            for mode in ('full', 'fast'):
+                entries, seconds, peak = measure(body, mode, fields,
+                                                 options['limit'], options['runs'])
+                print '%-20s %8.1f %-6s %8d %9.4f %9.1f' % \
+                    (os.path.basename(path)[:20], len(body) / 1024.0, mode,
+                     entries, seconds, peak)
+
+
+def parse(body, mode, fields, limit):
+    if mode == 'full':
+        return feedparser.parse(body).entries[:limit]
+    return list(parse_entries(body, fields, limit))
+
+def _measure_child(queue, body, mode, fields, limit, runs):
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    best = None
+    for i in range(runs):
+        start = time.time()
+        entries = parse(body, mode, fields, limit)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((len(entries), best, (peak_rss - start_rss) / 1024.0))
+
+def measure(body, mode, fields, limit, runs):
+    """
+    Returns the number of entries, the best time, and the peak extra memory
+    (in MB) for parsing `body` one way or the other. Each measurement runs
+    in its own process, so that they don't muddle each other's memory use.
+    """
+    queue = Queue()
+    child = Process(target=_measure_child,
+                    args=(queue, body, mode, fields, limit, runs))
+    child.start()
+    result = queue.get()
+    child.join()
+    return result
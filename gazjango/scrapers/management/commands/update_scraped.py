@@ -1,24 +1,100 @@
-from django.core.management.base import LabelCommand
+from django.core.management.base import LabelCommand, CommandError
+from django.db                   import connection
 from gazjango.blogroll.models import OutsideSite
 from gazjango.issues.models   import Event, Menu, Weather
+from optparse import make_option
+import socket
+import sys
+import threading
+import time
+import traceback
+
+# how long (in seconds) each source gets, retries and all, before we give
+# up on it and let the run finish without it
+DEADLINES = {
+    'bico':     60,
+    'events':   90,
+    'menu':     45,
+    'weather':  45,
+    'blogroll': 120,
+}
+
+class Refresh(threading.Thread):
+    """
+    Updates one source in its own thread, trying again (after waiting
+    `backoff`, then `backoff` squared, ...) if it raises, so long as
+    there's time left before its deadline.
+    """
+    def __init__(self, name, update, deadline, retries=2, backoff=2):
+        threading.Thread.__init__(self, name=name)
+        self.setDaemon(True) # so a hung source can't keep us from exiting
+        self.update = update
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.attempts = 0
+        self.error = None
+        self.started = self.finished = None
+    
+    def run(self):
+        self.started = time.time()
+        try:
+            while True:
+                self.attempts += 1
+                try:
+                    self.update()
+                    self.error = None
+                    return
+                except Exception:
+                    self.error = traceback.format_exc()
+                wait = self.backoff ** self.attempts
+                if self.attempts > self.retries or \
+                   time.time() + wait > self.started + self.deadline:
+                    return
+                time.sleep(wait)
+        finally:
+            self.finished = time.time()
+            connection.close()
+    
+    def status(self):
+        if self.finished is None:
+            return 'timed out'
+        return 'failed' if self.error else 'ok'
+    
+    def seconds(self):
+        return (self.finished or time.time()) - self.started
+
 
 class Command(LabelCommand):
-    """Updates scraped objects."""
+    """
+    Updates scraped objects. With `all`, updates every source at once, each
+    in its own thread with its own deadline, so that one slow or dead feed
+    doesn't hold up the rest.
+    """
+    option_list = LabelCommand.option_list + (
+        make_option('--timeout', type='float', dest='timeout', default=20,
+            help='Socket timeout for each request, in seconds.'),
+        make_option('--retries', type='int', dest='retries', default=2,
+            help='How many times to retry a source that fails.'),
+    )
+    
+    # the update_* methods raise if they fail, so Refresh knows to retry
     
     def update_bico(self):
         import gazjango.scrapers.bico
-        gazjango.scrapers.bico.get_bico_news(override_cache=True)
+        if gazjango.scrapers.bico.get_bico_news(override_cache=True) == "error":
+            raise CommandError("couldn't load the BiCo News feeds")
     
     def update_events(self):
         Event.objects.update()
     
     def update_menu(self):
-        Menu.objects.for_today(   ignore_cached=True)
-        Menu.objects.for_tomorrow(ignore_cached=True)
+        Menu.objects.for_today(   ignore_cached=True, fail_silently=False)
+        Menu.objects.for_tomorrow(ignore_cached=True, fail_silently=False)
     
     def update_weather(self):
-        Weather.objects.for_today(   ignore_cached=True)
-        Weather.objects.for_tomorrow(ignore_cached=True)
+        Weather.objects.for_today(   ignore_cached=True, fail_silently=False)
+        Weather.objects.for_tomorrow(ignore_cached=True, fail_silently=False)
     
     def update_blogroll(self):
         OutsideSite.objects.update_all()
@@ -32,13 +108,37 @@ class Command(LabelCommand):
             'blogroll': self.update_blogroll,
         }
         if label == 'all':
-            for name, f in lookup.items():
-                print "updating", name
-                f()
+            names = sorted(lookup)
+        elif label in lookup:
+            names = [label]
         else:
-            if label in lookup:
-                print "updating", label
-                lookup[label]()
-            else:
-                raise NotImplementedError()
+            raise CommandError("unknown source %s" % label)
+        
+        # urllib2 and friends will wait forever by default
+        old_timeout = socket.getdefaulttimeout()
+        socket.setdefaulttimeout(options.get('timeout', 20))
+        try:
+            refreshes = [Refresh(name, lookup[name], DEADLINES[name],
+                                 retries=int(options.get('retries', 2)))
+                         for name in names]
+            start = time.time()
+            for refresh in refreshes:
+                print "updating", refresh.getName()
+                refresh.start()
+            for refresh in refreshes:
+                refresh.join(max(start + refresh.deadline - time.time(), 0))
+        finally:
+            socket.setdefaulttimeout(old_timeout)
+        
+        print "%-10s %-10s %8s %8s" % ('source', 'status', 'tries', 'seconds')
+        for refresh in refreshes:
+            print "%-10s %-10s %8d %8.1f" % (refresh.getName(), refresh.status(),
+                                             refresh.attempts, refresh.seconds())
+        for refresh in refreshes:
+            if refresh.error:
+                print >> sys.stderr, "error updating %s:\n%s" % (refresh.getName(), refresh.error)
+        
+        failed = [r.getName() for r in refreshes if r.status() != 'ok']
+        if failed:
+            raise CommandError("couldn't update %s" % ', '.join(failed))
     
@@ -0,0 +1 @@
+# No models here; this is just so that Django finds our tests.
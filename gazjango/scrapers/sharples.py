@@ -2,6 +2,7 @@ import re
 import urllib2
 from BeautifulSoup import BeautifulStoneSoup
 from datetime      import date, timedelta, datetime
+from fetch         import fetch
 
 FEED_URL = "http://www.swarthmore.edu/dashboards/feeds/sharples.xml"
 NUM_WEEKS = 4
@@ -25,15 +26,32 @@ def get_menu(url=FEED_URL, tomorrow=False, die_on_closed=False):
     If ``tomorrow`` is set, tries to figure out the menu for tomorrow.
     """
     try:
-        page = urllib2.urlopen(url)
+        fetched = fetch_menu(url, tomorrow)
     except urllib2.URLError:
         # TODO: log this error somehow
-        message = "Sorry, it seems we're having some technical difficulties " \
-                  "with figuring out the Sharples menu. Try checking the " \
-                  "Dashboard or the Sharples website."
-        return { 'closed': True, 'message': message }
+        return unavailable_menu()
+    return parse_menu(fetched.body, tomorrow, die_on_closed)
 
-    feed = BeautifulStoneSoup(page, selfClosingTags=['closed'])
+def unavailable_menu():
+    "What to show when we can't get at the feed."
+    message = "Sorry, it seems we're having some technical difficulties " \
+              "with figuring out the Sharples menu. Try checking the " \
+              "Dashboard or the Sharples website."
+    return { 'closed': True, 'message': message }
+
+def fetch_menu(url=FEED_URL, tomorrow=False):
+    """
+    Fetches the feed for today's (or tomorrow's) menu, returning a
+    fetch.Fetched whose body can be handed to parse_menu. Each day is
+    remembered separately, since each needs to see the feed change.
+    Raises urllib2.URLError if the feed can't be loaded.
+    """
+    day = date.today() + timedelta(days=1 if tomorrow else 0)
+    return fetch(url, key='%s#%s' % (url, day))
+
+def parse_menu(body, tomorrow=False, die_on_closed=False):
+    "Parses the feed ``body`` into a menu dictionary, as for get_menu."
+    feed = BeautifulStoneSoup(body, selfClosingTags=['closed'])
     data = {}
     
     data['closed'] = feed.closed['value'] == "1"
@@ -0,0 +1,8 @@
+"""
+Feeds saved from the sites we scrape, for the scrapers tests and for timing
+the parsers with ``manage.py feedbench``.
+"""
+import os.path
+
+TESTDATA = os.path.dirname(os.path.abspath(__file__))
+CORPUS = ('bico-news.xml', 'calendar.xml', 'blog-atom.xml')
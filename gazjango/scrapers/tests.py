@@ -0,0 +1,187 @@
+from StringIO import StringIO
+from xml.dom import minidom
+import BaseHTTPServer
+import os.path
+import shutil
+import tempfile
+import threading
+import unittest
+
+from gazjango.scrapers import feedparser
+from gazjango.scrapers import flickr
+from gazjango.scrapers.fastfeed import iter_entries, parse_entries
+from gazjango.scrapers.fetch import fetch
+from gazjango.scrapers.testdata import TESTDATA, CORPUS
+
+def read_feed(name):
+    return open(os.path.join(TESTDATA, name)).read()
+
+class FastFeedTestCase(unittest.TestCase):
+    def testMatchesFeedparser(self):
+        for name in CORPUS:
+            body = read_feed(name)
+            full = feedparser.parse(body).entries
+            fast = list(parse_entries(body))
+            self.assertEquals(len(fast), len(full), name)
+            for slow_entry, fast_entry in zip(full, fast):
+                for key in ('title', 'link', 'updated_parsed'):
+                    self.assertEquals(fast_entry[key], slow_entry[key], name)
+    
+    def testLimitAndFields(self):
+        body = read_feed('bico-news.xml')
+        entries = list(iter_entries(body, fields=('title', 'content'), limit=2))
+        self.assertEquals(len(entries), 2)
+        self.assert_(entries[0].content[0].value.startswith('<p><strong>By '))
+        self.failIf('link' in entries[0])
+        self.failIf('updated_parsed' in entries[0])
+    
+    def testAtomLinks(self):
+        entry = iter_entries(read_feed('blog-atom.xml'), fields=('link',)).next()
+        self.assertEquals(entry.link, 'http://example.blogspot.com/2009/10/post-0.html')
+    
+    def testFallsBackWhenBroken(self):
+        entries = list(parse_entries(read_feed('broken.xml')))
+        self.assertEquals([e.link for e in entries],
+                          ['http://example.com/1', 'http://example.com/2'])
+    
+
+
+PHOTOSET_XML = """<?xml version="1.0" encoding="utf-8" ?>
+<rsp stat="ok">
+<photoset id="4" primary="2483" owner="12037949754@N01" page="1" per_page="500" perpage="500" pages="1" total="2">
+    <photo id="2484" secret="123456" server="1" farm="1" title="Parrish" isprimary="1" license="0"
+           dateupload="1229000000" datetaken="2008-12-11 09:30:00" ownername="gazette"
+           url_sq="http://farm1.static.flickr.com/1/2484_123456_s.jpg"
+           url_m="http://farm1.static.flickr.com/1/2484_123456.jpg">
+        <description>Parrish in the snow</description>
+    </photo>
+    <photo id="2485" secret="654321" server="1" farm="1" title="Caf\xc3\xa9" isprimary="0" license="0"
+           dateupload="1229000100" datetaken="2008-12-11 09:35:00" ownername="gazette">
+        <description></description>
+    </photo>
+</photoset>
+</rsp>"""
+
+def bag_dict(bag):
+    if isinstance(bag, list):
+        return [bag_dict(b) for b in bag]
+    if isinstance(bag, flickr.Bag):
+        return dict((k, bag_dict(v)) for k, v in bag.__dict__.items())
+    return bag
+
+class FlickrTestCase(unittest.TestCase):
+    def setUp(self):
+        self.old = (flickr.urlopen, flickr.CACHE_DIR)
+        self.requests = []
+        def urlopen(url, payload=None):
+            self.requests.append(url)
+            if 'photosets.getPhotos' not in url:
+                raise AssertionError("unexpected request to %s" % url)
+            return StringIO(PHOTOSET_XML)
+        flickr.urlopen = urlopen
+        flickr.CACHE_DIR = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(flickr.CACHE_DIR)
+        flickr.urlopen, flickr.CACHE_DIR = self.old
+    
+    def testParseMatchesUnmarshal(self):
+        self.assertEquals(bag_dict(flickr._parse(PHOTOSET_XML)),
+                          bag_dict(flickr.unmarshal(minidom.parseString(PHOTOSET_XML))))
+    
+    def testExtras(self):
+        photos = flickr.Photoset('4', 'Snow', None).getPhotos()
+        self.assertEquals([p.id for p in photos], ['2484', '2485'])
+        self.assertEquals(photos[0].title, 'Parrish')
+        self.assertEquals(photos[1].title, u'Caf\xe9')
+        self.assertEquals(photos[0].description, 'Parrish in the snow')
+        self.assertEquals(photos[1].description, '')
+        self.assertEquals(photos[0].datetaken, '2008-12-11 09:30:00')
+        self.assertEquals(photos[0].owner.username, 'gazette')
+        self.assertEquals(photos[0].getURL('Medium', urlType='source'),
+                          'http://farm1.static.flickr.com/1/2484_123456.jpg')
+        self.assertEquals(len(self.requests), 1)
+    
+    def testCache(self):
+        flickr.Photoset('4', 'Snow', None).getPhotos()
+        flickr.Photoset('4', 'Snow', None).getPhotos()
+        self.assertEquals(len(self.requests), 1)
+        
+        flickr.Photoset('4', 'Snow', None).getPhotos(per_page=10)
+        self.assertEquals(len(self.requests), 2)
+        
+        flickr.CACHE_TTL, old_ttl = 0, flickr.CACHE_TTL
+        try:
+            flickr.Photoset('4', 'Snow', None).getPhotos()
+        finally:
+            flickr.CACHE_TTL = old_ttl
+        self.assertEquals(len(self.requests), 3)
+    
+
+class StubFeedHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    "Serves `server.body`, with an ETag if `server.etag` is set."
+    def do_GET(self):
+        self.server.hits += 1
+        if self.server.etag and self.headers.get('If-None-Match') == self.server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        if self.server.etag:
+            self.send_header('ETag', self.server.etag)
+        self.end_headers()
+        self.wfile.write(self.server.body)
+    
+    def log_message(self, *args):
+        pass
+    
+
+class ConditionalFetchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), StubFeedHandler)
+        self.server.body = '<rss>one</rss>'
+        self.server.etag = '"1"'
+        self.server.hits = 0
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/feed' % self.server.server_address[1]
+        self.store = DictStore()
+    
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def testETag(self):
+        first = fetch(self.url, store=self.store)
+        self.assert_(first.changed)
+        self.assertEquals(first.body, '<rss>one</rss>')
+        
+        # not remembered yet, so it still counts as changed
+        self.assert_(fetch(self.url, store=self.store).changed)
+        first.remember()
+        
+        second = fetch(self.url, store=self.store)
+        self.failIf(second.changed)
+        self.assertEquals(second.body, '<rss>one</rss>')
+        
+        self.server.body = '<rss>two</rss>'
+        self.server.etag = '"2"'
+        third = fetch(self.url, store=self.store)
+        self.assert_(third.changed)
+        self.assertEquals(third.body, '<rss>two</rss>')
+        self.assertEquals(self.server.hits, 4)
+    
+    def testBodyHash(self):
+        self.server.etag = None
+        fetch(self.url, store=self.store).remember()
+        self.failIf(fetch(self.url, store=self.store).changed)
+        self.assert_(fetch(self.url, key='other', store=self.store).changed)
+        
+        self.server.body = '<rss>two</rss>'
+        self.assert_(fetch(self.url, store=self.store).changed)
+    
+
+class DictStore(dict):
+    def set(self, key, value):
+        self[key] = value
@@ -1,6 +1,8 @@
 from xml.etree import cElementTree as etree
+from cStringIO import StringIO
 import urllib2
 import datetime
+from fetch import fetch
 
 # the National Weather Service provides us a nice xml feed with lots of weather data
 # <3 the US government
@@ -24,6 +26,13 @@ def get_weather(date=None):
     in a dictionary, where keys are "today", "tonight", "tomorrow" and
     values are like "Mostly Clear. High of 86."
     """
+    return parse_weather(fetch_weather(date).body)
+
+def fetch_weather(date=None):
+    """
+    Fetches the forecast for `date` (default today), returning a
+    fetch.Fetched whose body can be handed to parse_weather.
+    """
     if date is None:
         date = datetime.date.today()
     
@@ -32,12 +41,14 @@ def get_weather(date=None):
     url = FEED_URL % reps
     
     try:
-        page = urllib2.urlopen(url)
+        return fetch(url)
     except urllib2.URLError:
         # TODO: log this error somehow
         raise WeatherLoadError("Couldn't load the feed.")
-    
-    feed = etree.parse(page)
+
+def parse_weather(body):
+    "Parses the forecast `body` into a dictionary, as for get_weather."
+    feed = etree.parse(StringIO(body))
     
     if feed.getroot().tag == "error":
         raise WeatherParseError("The feed returned an error.")
@@ -10,6 +10,9 @@ function fullSetup() {
     setupApproveLinks();
 }
 $(fullSetup);
+$(function() {
+    if ($('#comments').length > 0) { pollComments(); }
+});
 
 
 // ======================
@@ -96,26 +99,88 @@ function setNameDisabled(disabled) {
 
 function newComments() { newComments('normal'); }
 
-function newComments(speed) {
+function lastCommentNumber() {
     comments = $('.comment');
     if (comments.length == 0) {
-        last_num = 0;
+        return 0;
     } else {
-        last_num = comments.get(comments.length - 1).id.substr(2);
+        return comments.get(comments.length - 1).id.substr(2);
     }
-    $.get('comments/' + last_num + '/', {}, function(data, textStatus) {
-        $('#comments').append(data);
-        fullSetup();
-        
-        var new_comments = $('.comment.new');
-        var i = 0;
-        callback = function() {
-            i++;
-            if (i < new_comments.length) {
-                new_comments.eq(i).slideDown(speed, callback).removeClass('new');
+}
+
+function newComments(speed, since) {
+    var args = (since == null) ? {} : { since: since };
+    $.get('comments/' + lastCommentNumber() + '/', args, function(data, textStatus) {
+        showNewComments(data, speed);
+    });
+}
+
+function commentNumber(comment) {
+    return parseInt(comment.id.substr(2), 10);
+}
+
+function showNewComments(data, speed) {
+    // polling and a just-posted comment can both bring back the same
+    // comments; only add the ones we don't have yet, in order by number
+    // (an older one may have been approved, and taken out to be redone)
+    $(data).filter('.comment').each(function() {
+        if ($('#' + this.id).length > 0) {
+            return;
+        }
+        var number = commentNumber(this);
+        var after = $('.comment').filter(function() {
+            return commentNumber(this) > number;
+        });
+        if (after.length > 0) {
+            after.eq(0).before(this);
+        } else {
+            $('#comments').append(this);
+        }
+    });
+    fullSetup();
+    
+    var new_comments = $('.comment.new');
+    var i = 0;
+    callback = function() {
+        i++;
+        if (i < new_comments.length) {
+            new_comments.eq(i).slideDown(speed, callback).removeClass('new');
+        }
+    }        
+    new_comments.eq(0).slideDown(speed, callback);
+}
+
+var commentsVersion = null;
+var COMMENTS_POLL_INTERVAL = 20000;
+
+function pollComments() {
+    // the version goes up when a comment is posted, approved or hidden;
+    // only then do we ask for the comments after our last one, plus the
+    // older ones that changed (which come back on the second line)
+    var args = (commentsVersion == null) ? {} : { since: commentsVersion };
+    $.ajax({
+        url: 'comments/version/',
+        data: args,
+        success: function(text) {
+            var lines = $.trim(text).split('\n');
+            var version = $.trim(lines[0]);
+            if (commentsVersion != null && version != commentsVersion) {
+                var changed = lines.length > 1 ? $.trim(lines[1]) : '';
+                if (changed) {
+                    // hidden ones won't come back; the rest are redone
+                    $.each(changed.split(','), function() {
+                        $('#c-' + this).remove();
+                    });
+                }
+                newComments('normal', commentsVersion);
             }
-        }        
-        new_comments.eq(0).slideDown(speed, callback);
+            commentsVersion = version;
+            setTimeout(pollComments, COMMENTS_POLL_INTERVAL);
+        },
+        error: function() {
+            // back off a bit so a broken server doesn't get hammered
+            setTimeout(pollComments, 5 * COMMENTS_POLL_INTERVAL);
+        }
     });
 }
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from gazjango.subscriptions.models import Subscriber
+from gazjango.subscriptions.models import Subscriber, SendRun, SendRecord
 
 class SubscriberAdmin(admin.ModelAdmin):
     list_display = ('email', 'name', 'kind', 'receive', 'is_active', 'racy_content')
@@ -9,3 +9,13 @@ class SubscriberAdmin(admin.ModelAdmin):
 admin.site.register(Subscriber, SubscriberAdmin)
 
 
+class SendRunAdmin(admin.ModelAdmin):
+    list_display = ('command', 'sent_str', 'total', 'started', 'resumed', 'finished')
+    list_filter = ('command',)
+admin.site.register(SendRun, SendRunAdmin)
+
+class SendRecordAdmin(admin.ModelAdmin):
+    list_display = ('subscriber', 'run', 'state', 'attempts', 'error', 'smtp_code', 'seconds')
+    list_filter = ('state', 'error', 'run')
+    raw_id_fields = ('subscriber', 'run')
+admin.site.register(SendRecord, SendRecordAdmin)
@@ -1,7 +1,8 @@
-from django.db        import models
+from django.db        import models, connection, transaction
 from django.db.models import signals, Q
 from gazjango.accounts.models import UserProfile, UserKind
 from registration.signals import user_activated
+from collections import namedtuple
 
 class SubscribersManager(models.Manager):
     def find_by_email(self, email):
@@ -45,6 +46,31 @@ class AllRSDSubscribersManager(SubscribersManager):
         return orig.filter(receive='r')
     
 
+# Just enough about a subscriber to send them something.
+Recipient = namedtuple('Recipient', ['pk', 'email', 'plain_text', 'racy_content'])
+
+def stream_recipients(queryset, chunk_size=1000):
+    """
+    Yields a Recipient for each subscriber in `queryset`, in order of pk.
+    
+    Rather than loading everyone at once (or looking up each linked user's
+    email one at a time), this takes `chunk_size` subscribers at a go, with
+    their users' emails joined in, and picks up each chunk from the last pk
+    of the one before -- so it's fine for the mailing to change the rows
+    it's walking through as it goes.
+    """
+    last_pk = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list(
+            'pk', '_email', 'user__user__email', 'plain_text', 'racy_content'
+        )[:chunk_size])
+        for pk, email, user_email, plain_text, racy_content in rows:
+            yield Recipient(pk, user_email if user_email is not None else email,
+                            plain_text, racy_content)
+        if len(rows) < chunk_size:
+            return
+        last_pk = rows[-1][0]
+    
 
 class Subscriber(models.Model):
     """
@@ -113,6 +139,98 @@ class Subscriber(models.Model):
         return "%s [%s]" % (base, self.receive)
     
 
+class SendRun(models.Model):
+    """
+    One run of a mailing command (send_issue_directly, say) for one mailing,
+    as identified by the `last_sent` string it marks subscribers with.
+    
+    If a run dies partway through, running the command again picks the same
+    SendRun back up and carries on from its SendRecords.
+    """
+    command  = models.CharField(max_length=40)
+    sent_str = models.CharField(max_length=12)
+    subject  = models.CharField(max_length=200, blank=True)
+    
+    total    = models.IntegerField(default=0,
+               help_text="How many subscribers the mailing is going out to.")
+    started  = models.DateTimeField()
+    resumed  = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        unique_together = ('command', 'sent_str')
+        ordering = ('-started',)
+    
+    def counts(self):
+        "Returns a dict of how many subscribers are in each state."
+        counts = dict((state, 0) for state, name in SendRecord.STATE_CHOICES)
+        rows = self.records.values('state').annotate(n=models.Count('id'))
+        counts.update((row['state'], row['n']) for row in rows)
+        return counts
+    
+    def __unicode__(self):
+        return "%s for %s" % (self.command, self.sent_str)
+    
+
+class SendRecordManager(models.Manager):
+    COLUMNS = ('run_id', 'subscriber_id', 'state', 'attempts', 'error', 'smtp_code',
+               'smtp_response', 'traceback', 'sent', 'seconds')
+    
+    def write(self, run, rows):
+        """
+        Saves a batch of records for `run`, each a tuple of values for
+        COLUMNS, with one query to clear out any older records for the
+        same subscribers (from before the run was resumed) and one
+        executemany() to insert the lot.
+        """
+        if not rows:
+            return
+        self.filter(run=run, subscriber__in=[row[1] for row in rows]).delete()
+        
+        qn = connection.ops.quote_name
+        sql = "INSERT INTO %s (%s) VALUES (%s)" % (
+            qn(self.model._meta.db_table),
+            ', '.join(qn(column) for column in self.COLUMNS),
+            ', '.join(['%s'] * len(self.COLUMNS)))
+        connection.cursor().executemany(sql, rows)
+        transaction.commit_unless_managed()
+    
+
+class SendRecord(models.Model):
+    """
+    What happened when a SendRun tried to email one subscriber: whether it
+    went through, how many tries it took, and the last thing that went
+    wrong (with the server's response, if it gave one).
+    
+    These are written in batches, straight through the database cursor,
+    so they don't go through save() and its signals.
+    """
+    STATE_CHOICES = (
+        ('s', 'Sent'),
+        ('f', 'Failed'),
+    )
+    run        = models.ForeignKey(SendRun, related_name='records')
+    subscriber = models.ForeignKey(Subscriber, related_name='send_records')
+    state      = models.CharField(max_length=1, choices=STATE_CHOICES)
+    attempts   = models.IntegerField(default=0)
+    
+    error         = models.CharField(max_length=40, blank=True)
+    smtp_code     = models.IntegerField(null=True, blank=True)
+    smtp_response = models.TextField(blank=True)
+    traceback     = models.TextField(blank=True)
+    
+    sent    = models.DateTimeField()
+    seconds = models.FloatField(help_text="Time from the first try to the last.")
+    
+    objects = SendRecordManager()
+    
+    class Meta:
+        unique_together = ('run', 'subscriber')
+    
+    def __unicode__(self):
+        return "%s: %s" % (self.subscriber_id, self.get_state_display())
+    
+
 
 # When a user's been registered, associate his subscriptions with him if he
 # already has some. Also, activate any subscriptions that haven't yet been
@@ -60,6 +60,7 @@ urlpatterns += patterns('comments.views',
     (r'^%(ymds)s/comment/$'         % reps, 'post_comment'),
     (r'^%(ymds)s/comment/captcha/$' % reps, 'show_captcha'),
     (r'^%(ymds)s/comments/(%(num)s/)?$'                         % reps, 'comments_for_article'),
+    (r'^%(ymds)s/comments/version/$'                            % reps, 'comments_version'),
     (r'^%(ymds)s/show-comment/%(num)s/$'                        % reps, 'get_comment_text'),
     (r'^%(ymds)s/vote-comment/%(num)s/(?P<val>up|down|clear)/$' % reps, 'vote_on_comment'),
     (r'^%(ymds)s/approve-comment/%(num)s/(?:%(val-b)s/)?$'      % reps, 'approve_comment'),
@@ -149,7 +150,8 @@ urlpatterns += patterns('jobs.views',
 
 urlpatterns += patterns('media.views',
     (r'^files/%(bucket)s/$'          % reps, 'bucket'),
-    (r'^files/%(bucket)s/%(slug)s/$' % reps, 'file')
+    (r'^files/%(bucket)s/%(slug)s/$' % reps, 'file'),
+    (r'^files/resized/(?P<spec>\w+)/(?P<pk>\d+)/$', 'resized', {}, 'resized-image'),
 )
 
 urlpatterns += patterns('django.contrib.auth.views',